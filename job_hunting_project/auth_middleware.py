@@ -3,6 +3,10 @@ from django.conf import settings
 from django.contrib import auth
 from supabase import create_client, Client
 
+from matcher.services import request_timing
+
+METRICS_PATH_PREFIX = '/metrics/'
+
 class SupabaseAuthMiddleware:
     """
     这个中间件负责处理基于 Supabase JWT 的用户认证。
@@ -21,6 +25,11 @@ class SupabaseAuthMiddleware:
         return create_client(url, key)
 
     def __call__(self, request):
+        # 0. Monitoring scrapes must not create an anonymous Supabase user each time
+        if request.path.startswith(METRICS_PATH_PREFIX):
+            request.supabase = self.supabase
+            return self.get_response(request)
+
         # 1. If user is already authenticated, skip
         if hasattr(request, 'user') and request.user.is_authenticated:
             # Even if authenticated, try to attach a Supabase client
@@ -39,7 +48,8 @@ class SupabaseAuthMiddleware:
         if token:
             try:
                 # Validate token and get user
-                user_response = self.supabase.auth.get_user(token)
+                with request_timing.measure(request_timing.CATEGORY_AUTH):
+                    user_response = self.supabase.auth.get_user(token)
                 if user_response and user_response.user:
                     # Use custom backend for authentication
                     user = auth.authenticate(request, supabase_user=user_response.user)
@@ -54,7 +64,8 @@ class SupabaseAuthMiddleware:
         if not user:
             try:
                 # Create anonymous user session
-                user_response = self.supabase.auth.sign_in_anonymously()
+                with request_timing.measure(request_timing.CATEGORY_AUTH):
+                    user_response = self.supabase.auth.sign_in_anonymously()
                 if user_response and user_response.session and user_response.user:
                     token = user_response.session.access_token
                     user = auth.authenticate(request, supabase_user=user_response.user)
@@ -93,6 +104,7 @@ class SupabaseAuthMiddleware:
         if not url or not key:
             raise Exception('Supabase URL/KEY (anon) not configured')
         
-        client = create_client(url, key)
-        client.auth.set_session(access_token=token, refresh_token="") # refresh token is optional
+        with request_timing.measure(request_timing.CATEGORY_AUTH):
+            client = create_client(url, key)
+            client.auth.set_session(access_token=token, refresh_token="") # refresh token is optional
         return client
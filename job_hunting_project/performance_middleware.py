@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template as DjangoBackendTemplate
+
+from matcher.services import request_timing
+
+
+class TimedTemplate(DjangoBackendTemplate):
+    """Django template whose render() counts towards the template category of request_timing."""
+
+    def render(self, context=None, request=None):
+        with request_timing.measure(request_timing.CATEGORY_TEMPLATE):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend with timed templates. Templates are rendered deep inside the
+    views, so PerformanceTimingMiddleware relies on this backend (see TEMPLATES) to time them.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class PerformanceTimingMiddleware:
+    """
+    Measures where the time of each request goes: SQL, Supabase REST calls, Supabase auth,
+    Gemini and template rendering (see matcher/services/request_timing.py). Adds a
+    Server-Timing header, logs requests slower than REQUEST_TIMING_SLOW_MS with the breakdown
+    and keeps rolling per-view samples for the /metrics/requests endpoint.
+    Should come first in MIDDLEWARE so that the auth middleware is measured too. Template
+    rendering is only measured with the TimedDjangoTemplates backend configured in TEMPLATES.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _execute_sql(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            request_timing.add(request_timing.CATEGORY_DB, time.perf_counter() - started)
+
+    def __call__(self, request):
+        if not settings.REQUEST_TIMING_ENABLED:
+            return self.get_response(request)
+
+        breakdown = request_timing.start()
+        try:
+            with connection.execute_wrapper(self._execute_sql):
+                response = self.get_response(request)
+        finally:
+            request_timing.stop()
+        total_seconds = breakdown.total_seconds()
+
+        response['Server-Timing'] = request_timing.server_timing_header(breakdown, total_seconds)
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else 'unresolved'
+        request_timing.record_view_sample(view_name, breakdown, total_seconds)
+        if total_seconds * 1000 >= settings.REQUEST_TIMING_SLOW_MS:
+            print(
+                f"WARNING: [timing] Slow request {request.method} {request.path} ({view_name}) "
+                f"took {total_seconds * 1000:.0f}ms: {request_timing.format_breakdown(breakdown, total_seconds)}"
+            )
+        return response
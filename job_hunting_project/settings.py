@@ -38,6 +38,100 @@ USE_AI_SIMULATION_ENV_VAR = os.getenv('USE_SIMULATION_ENV', 'True')  # Default t
 USE_AI_SIMULATION = USE_AI_SIMULATION_ENV_VAR.lower() != 'false'
 print(f"[SETTINGS.PY] USE_AI_SIMULATION_ENV_VAR: '{USE_AI_SIMULATION_ENV_VAR}'")
 print(f"[SETTINGS.PY] USE_AI_SIMULATION set to: {USE_AI_SIMULATION}")
+
+# Simulation backend (matcher/services/simulation_backend.py), used to load-test without spending tokens.
+# AI_SIMULATION_SEED makes simulated outputs reproducible. With a latency or an error/timeout rate
+# configured, simulated calls also take time and fail like real ones (through the resilience layer).
+AI_SIMULATION_SEED = os.getenv('AI_SIMULATION_SEED') or None
+AI_SIMULATION_LATENCY_P50_MS = float(os.getenv('AI_SIMULATION_LATENCY_P50_MS', '0')) # 0 disables latency injection
+AI_SIMULATION_LATENCY_P99_MS = float(os.getenv('AI_SIMULATION_LATENCY_P99_MS', '0'))
+AI_SIMULATION_OUTPUT_TOKENS_PER_SECOND = float(os.getenv('AI_SIMULATION_OUTPUT_TOKENS_PER_SECOND', '0'))
+AI_SIMULATION_RESPONSE_TOKENS_PER_PROMPT_TOKEN = float(os.getenv('AI_SIMULATION_RESPONSE_TOKENS_PER_PROMPT_TOKEN', '0'))
+AI_SIMULATION_ERROR_RATE = float(os.getenv('AI_SIMULATION_ERROR_RATE', '0'))
+AI_SIMULATION_TIMEOUT_RATE = float(os.getenv('AI_SIMULATION_TIMEOUT_RATE', '0'))
+AI_SIMULATION_TIMEOUT_SECONDS = float(os.getenv('AI_SIMULATION_TIMEOUT_SECONDS', '30'))
+
+# Base URL of the Generative Language API, e.g. http://127.0.0.1:8765 for the local stand-in
+# (`python manage.py gemini_standin`). Empty uses Google's endpoint. Setting it switches to the REST transport.
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT', '')
+
+# Gemini job matching
+# match_jobs splits the listings into chunks of at most GEMINI_MATCH_MAX_JOBS_PER_CHUNK jobs
+# and ~GEMINI_MATCH_CHUNK_TOKEN_BUDGET prompt tokens, scored concurrently by up to
+# GEMINI_MATCH_MAX_CONCURRENCY threads. Failed requests are retried by gemini_resilience
+# (GEMINI_MAX_RETRIES); an unparseable response is requested once more.
+GEMINI_MATCH_GAP_FILL_ROUNDS = int(os.getenv('GEMINI_MATCH_GAP_FILL_ROUNDS', '2')) # Follow-up requests for jobs the model skipped
+GEMINI_MATCH_CHUNK_TOKEN_BUDGET = int(os.getenv('GEMINI_MATCH_CHUNK_TOKEN_BUDGET', '20000'))
+GEMINI_MATCH_MAX_JOBS_PER_CHUNK = int(os.getenv('GEMINI_MATCH_MAX_JOBS_PER_CHUNK', '30'))
+GEMINI_MATCH_MAX_CONCURRENCY = int(os.getenv('GEMINI_MATCH_MAX_CONCURRENCY', '8'))
+# Stream match responses and persist each MatchedJob as soon as its JSON object is complete
+GEMINI_STREAM_MATCH_RESULTS = os.getenv('GEMINI_STREAM_MATCH_RESULTS', 'True').lower() != 'false'
+# Job descriptions are normalized and capped at this many characters in the match prompt
+GEMINI_MATCH_DESCRIPTION_MAX_CHARS = int(os.getenv('GEMINI_MATCH_DESCRIPTION_MAX_CHARS', '1500'))
+
+# Local pre-ranking: only the MATCH_PRERANK_TOP_K best listings reach the LLM matcher (0 disables it).
+# MATCH_PRERANK_METHOD is 'vectors' (job-vector store, cosine similarity) or 'bm25' (in-process BM25 index).
+MATCH_PRERANK_TOP_K = int(os.getenv('MATCH_PRERANK_TOP_K', '150'))
+MATCH_PRERANK_METHOD = os.getenv('MATCH_PRERANK_METHOD', 'vectors')
+JOB_PRERANK_INDEX_MAX_DOCUMENTS = int(os.getenv('JOB_PRERANK_INDEX_MAX_DOCUMENTS', '50000'))
+
+# Job-vector store (matcher/services/job_vectors.py): memory-mapped float32 vectors shared by all workers.
+# JOB_EMBEDDER is the import path of the embedder class; the default needs no model or network.
+JOB_VECTOR_STORE_DIR = os.getenv('JOB_VECTOR_STORE_DIR', os.path.join(BASE_DIR, 'var', 'job_vectors'))
+JOB_EMBEDDER = os.getenv('JOB_EMBEDDER', 'matcher.services.job_vectors.HashingEmbedder')
+JOB_EMBEDDING_DIMENSIONS = int(os.getenv('JOB_EMBEDDING_DIMENSIONS', '512'))
+
+# Match sessions run in the background. A queued/running session older than this is considered
+# abandoned (e.g. after a worker restart) and no longer blocks starting a new one.
+MATCH_SESSION_STALE_AFTER_SECONDS = int(os.getenv('MATCH_SESSION_STALE_AFTER_SECONDS', '900'))
+# Cover letters and tailored resumes are generated in the background, too; a pending/running
+# generation older than this is considered abandoned and may be started again.
+DOCUMENT_GENERATION_STALE_AFTER_SECONDS = int(os.getenv('DOCUMENT_GENERATION_STALE_AFTER_SECONDS', '300'))
+
+# Optional speculative pre-generation of documents for the best matches of a finished session
+# (matcher/services/pregeneration_service.py). Runs only on idle background capacity, within a
+# per-user daily token budget, and stops when the user starts a new session.
+DOCUMENT_PREGENERATION_ENABLED = os.getenv('DOCUMENT_PREGENERATION_ENABLED', 'False').lower() == 'true'
+DOCUMENT_PREGENERATION_TOP_N = int(os.getenv('DOCUMENT_PREGENERATION_TOP_N', '3'))
+DOCUMENT_PREGENERATION_MIN_SCORE = int(os.getenv('DOCUMENT_PREGENERATION_MIN_SCORE', '75'))
+# Comma-separated: cover_letter and/or custom_resume
+DOCUMENT_PREGENERATION_KINDS = [kind.strip() for kind in os.getenv('DOCUMENT_PREGENERATION_KINDS', 'cover_letter').split(',') if kind.strip()]
+DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET = int(os.getenv('DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET', '20000'))
+DOCUMENT_PREGENERATION_MAX_IDLE_WAIT_SECONDS = int(os.getenv('DOCUMENT_PREGENERATION_MAX_IDLE_WAIT_SECONDS', '600'))
+
+# Persistent Gemini response cache (stored in the database, shared by all workers)
+# Only tasks listed in AI_RESPONSE_CACHE_TASK_TTLS are cached, each with its own TTL in seconds.
+# Least recently used entries are evicted once AI_RESPONSE_CACHE_MAX_ENTRIES is exceeded.
+AI_RESPONSE_CACHE_ENABLED = os.getenv('AI_RESPONSE_CACHE_ENABLED', 'True').lower() != 'false'
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+AI_RESPONSE_CACHE_TASK_TTLS = {
+    'user profile extraction': 7 * 24 * 60 * 60,
+    'enhanced job matching': 24 * 60 * 60,
+    'cover letter generation': 24 * 60 * 60,
+    'custom resume generation': 24 * 60 * 60,
+}
+
+# In-process background executor (matcher/services/background.py)
+# BACKGROUND_TASKS_EAGER runs submitted work inline, which is what the tests use.
+BACKGROUND_TASK_WORKERS = int(os.getenv('BACKGROUND_TASK_WORKERS', '4'))
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER', 'False').lower() == 'true'
+
+# Resilience around Gemini calls (matcher/services/gemini_resilience.py)
+# A token bucket shared by all workers through the 'shared' cache limits the request rate,
+# retryable errors are retried with jittered exponential backoff, and a circuit breaker
+# fails fast (falling back to simulation) while the API keeps failing.
+GEMINI_RATE_LIMIT_PER_MINUTE = int(os.getenv('GEMINI_RATE_LIMIT_PER_MINUTE', '60'))
+GEMINI_RATE_LIMIT_BURST = int(os.getenv('GEMINI_RATE_LIMIT_BURST', '10'))
+GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv('GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS', '30'))
+# Concurrent Gemini calls across all workers, enforced with leases in the 'shared' cache.
+# A lease expires after GEMINI_IN_FLIGHT_LEASE_SECONDS (longer than any single request) if its holder dies.
+GEMINI_MAX_IN_FLIGHT = int(os.getenv('GEMINI_MAX_IN_FLIGHT', '8'))
+GEMINI_IN_FLIGHT_LEASE_SECONDS = float(os.getenv('GEMINI_IN_FLIGHT_LEASE_SECONDS', '300'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+GEMINI_RETRY_BASE_DELAY_SECONDS = float(os.getenv('GEMINI_RETRY_BASE_DELAY_SECONDS', '1.0'))
+GEMINI_RETRY_MAX_DELAY_SECONDS = float(os.getenv('GEMINI_RETRY_MAX_DELAY_SECONDS', '20'))
+GEMINI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('GEMINI_CIRCUIT_FAILURE_THRESHOLD', '5'))
+GEMINI_CIRCUIT_RESET_SECONDS = float(os.getenv('GEMINI_CIRCUIT_RESET_SECONDS', '60'))
 ALLOWED_HOSTS = ['*']
 
 
@@ -58,6 +152,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "job_hunting_project.performance_middleware.PerformanceTimingMiddleware",  # First, so it times everything below
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "allauth.account.middleware.AccountMiddleware",
@@ -75,7 +170,8 @@ ROOT_URLCONF = "job_hunting_project.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates whose rendering is timed by PerformanceTimingMiddleware
+        "BACKEND": "job_hunting_project.performance_middleware.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -166,6 +262,38 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
 
+# Large Supabase reads (job_listings) are fetched in keyset-paginated pages of SUPABASE_PAGE_SIZE rows;
+# a failed page is retried SUPABASE_PAGE_RETRIES times with exponential backoff
+SUPABASE_PAGE_SIZE = int(os.getenv('SUPABASE_PAGE_SIZE', '1000'))
+SUPABASE_PAGE_RETRIES = int(os.getenv('SUPABASE_PAGE_RETRIES', '2'))
+SUPABASE_PAGE_RETRY_BACKOFF_SECONDS = float(os.getenv('SUPABASE_PAGE_RETRY_BACKOFF_SECONDS', '0.5'))
+
+# Single-flight coalescing of identical Supabase queries (job_listing_service.single_flight). Concurrent callers in a
+# process share one upstream call; with SINGLE_FLIGHT_SHARED, workers also coordinate the small anomaly-analysis
+# queries through a lock in the 'shared' cache, the lock holder leaving its result there for
+# SINGLE_FLIGHT_RESULT_TTL_SECONDS (today's listings are only coalesced per process). Waiters poll after
+# SINGLE_FLIGHT_POLL_SECONDS, doubling the interval up to SINGLE_FLIGHT_MAX_POLL_SECONDS, and query Supabase
+# themselves after SINGLE_FLIGHT_WAIT_SECONDS.
+SINGLE_FLIGHT_SHARED = os.getenv('SINGLE_FLIGHT_SHARED', 'True').lower() != 'false'
+SINGLE_FLIGHT_RESULT_TTL_SECONDS = float(os.getenv('SINGLE_FLIGHT_RESULT_TTL_SECONDS', '5'))
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', '30'))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv('SINGLE_FLIGHT_POLL_SECONDS', '0.05'))
+SINGLE_FLIGHT_MAX_POLL_SECONDS = float(os.getenv('SINGLE_FLIGHT_MAX_POLL_SECONDS', '1'))
+
+# Local mirror of the Supabase job_listings table (matcher/services/job_sync_service.py).
+# With JOB_LISTINGS_SOURCE = 'mirror', match sessions read today's listings from the local JobListing
+# table once `manage.py sync_jobs` has run; 'supabase' queries Supabase on every match session.
+JOB_LISTINGS_SOURCE = os.getenv('JOB_LISTINGS_SOURCE', 'mirror')
+JOB_SYNC_PAGE_SIZE = int(os.getenv('JOB_SYNC_PAGE_SIZE', '1000'))
+# Incremental syncs re-read this many seconds before the watermark, for rows committed late
+JOB_SYNC_OVERLAP_SECONDS = int(os.getenv('JOB_SYNC_OVERLAP_SECONDS', '300'))
+# Reconcile runs (the first one, --full, and then every JOB_SYNC_FULL_RECONCILE_SECONDS) re-read the last
+# JOB_SYNC_RECONCILE_DAYS days to pick up edited rows and deactivate deleted ones
+JOB_SYNC_RECONCILE_DAYS = int(os.getenv('JOB_SYNC_RECONCILE_DAYS', '1'))
+JOB_SYNC_FULL_RECONCILE_SECONDS = int(os.getenv('JOB_SYNC_FULL_RECONCILE_SECONDS', '3600'))
+# Reads from a mirror older than this queue a background sync
+JOB_SYNC_MAX_STALENESS_SECONDS = int(os.getenv('JOB_SYNC_MAX_STALENESS_SECONDS', '900'))
+
 # Google OAuth Configuration for Supabase
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
@@ -204,9 +332,41 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # State that must be shared by all gunicorn workers (Gemini rate limiter, circuit breaker, locks).
+    # Create the table with `python manage.py createcachetable`; point it at Redis in production.
+    # MAX_ENTRIES stays well above the number of live keys, so culling never evicts breaker or lock state.
+    'shared': {
+        'BACKEND': os.getenv('SHARED_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION', 'matcher_shared_cache'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '10000'))},
+    },
+    # Per-job anomaly analysis rows (see below), kept apart so their volume cannot cull the 'shared' keys
+    'anomaly': {
+        'BACKEND': os.getenv('ANOMALY_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('ANOMALY_CACHE_LOCATION', 'matcher_anomaly_cache'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('ANOMALY_CACHE_MAX_ENTRIES', '50000'))},
+    },
 }
 
+# Cache of job_anomaly_analysis rows per job (matcher/services/anomaly_cache.py): shared by all workers through
+# the 'anomaly' cache, plus an in-process LRU of ANOMALY_CACHE_LOCAL_MAX_ENTRIES rows kept for up to
+# ANOMALY_CACHE_LOCAL_TTL_SECONDS. Jobs without an analysis are remembered for ANOMALY_CACHE_NEGATIVE_TTL_SECONDS.
+ANOMALY_CACHE_TTL_SECONDS = int(os.getenv('ANOMALY_CACHE_TTL_SECONDS', '21600'))
+ANOMALY_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv('ANOMALY_CACHE_NEGATIVE_TTL_SECONDS', '900'))
+ANOMALY_CACHE_LOCAL_TTL_SECONDS = int(os.getenv('ANOMALY_CACHE_LOCAL_TTL_SECONDS', '300'))
+ANOMALY_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv('ANOMALY_CACHE_LOCAL_MAX_ENTRIES', '5000'))
+
+# Per-request time breakdown (SQL, Supabase, auth, Gemini, templates) sent as a Server-Timing header.
+# Requests slower than REQUEST_TIMING_SLOW_MS are logged with the breakdown; the last REQUEST_TIMING_WINDOW
+# requests of every view feed the percentiles at /metrics/requests.
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True').lower() != 'false'
+REQUEST_TIMING_SLOW_MS = float(os.getenv('REQUEST_TIMING_SLOW_MS', '1000'))
+REQUEST_TIMING_WINDOW = int(os.getenv('REQUEST_TIMING_WINDOW', '500'))
+
+# Bearer token required by the /metrics/ endpoints. When unset, only staff users (or DEBUG) may read it.
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN', '')
+
 SITE_ID = 1
 
 LOGIN_URL = '/login/'
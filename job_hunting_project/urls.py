@@ -22,6 +22,7 @@ from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from django.contrib.auth import views as auth_views
 from matcher.views.auth_views import google_login, google_callback, process_oauth_tokens  # Import specific auth views
+from matcher.views.metrics_views import llm_metrics, request_timings
 
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')), #language switcher
@@ -33,6 +34,9 @@ urlpatterns = [
     path('auth/login/google/', google_login, name='google_login'),
     path('auth/callback/', google_callback, name='google_callback'),
     path('auth/process-oauth-tokens/', process_oauth_tokens, name='process_oauth_tokens'),
+    # Monitoring endpoints are scraped by machines, so they are not internationalized either
+    path('metrics/llm', llm_metrics, name='llm_metrics'),
+    path('metrics/requests', request_timings, name='request_timings'),
 ]
 
 urlpatterns += i18n_patterns(
@@ -0,0 +1,231 @@
+"""
+Benchmark suite behind `python manage.py bench`.
+
+Builds synthetic datasets in a throw-away test database, serves Supabase from the local
+stand-in (services/supabase_standin.py) and simulates Gemini, then times the hot paths
+through the full middleware stack with the test client. For every dataset size and path it
+reports p50/p95 latency, SQL query count and peak Python memory, so runs of different
+commits can be compared (`bench --output before.json`, then diff the JSON).
+"""
+import csv
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from io import StringIO
+from unittest.mock import patch
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import translation
+
+from .models import CoverLetter, CustomResume, JobListing, MatchedJob, MatchSession, SavedJob, UserProfile
+from .services.supabase_standin import generate_job_rows, running_standin
+
+PATHS = ('main_page', 'session_view', 'job_detail_page', 'my_applications_page', 'cover_letter_pdf', 'custom_resume_pdf')
+BULK_BATCH_SIZE = 2000
+BENCH_CV_TEXT = "Backend developer with 5 years of Python and Django experience, SQL, Docker and AWS."
+
+
+def percentile(sorted_values, quantile):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(quantile * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_jobs_csv(path, job_rows):
+    fields = ['id', 'company_name', 'job_title', 'description', 'application_url', 'location', 'industry', 'level']
+    with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(job_rows)
+
+
+def build_user_dataset(job_ids, sessions, matches_per_session, saved_jobs):
+    """A user with many match sessions and saved jobs (with documents) over the given job ids."""
+    user = get_user_model().objects.create_user(username='bench-user', password='bench-password')
+    UserProfile.objects.create(user=user, user_cv_text=BENCH_CV_TEXT, user_preferences_text="Berlin, remote")
+    match_sessions = MatchSession.objects.bulk_create([
+        MatchSession(user=user, skills_text=BENCH_CV_TEXT, status=MatchSession.STATUS_DONE, jobs_total=matches_per_session)
+        for _ in range(sessions)
+    ])
+    matched_jobs = []
+    for session_index, match_session in enumerate(match_sessions):
+        for offset in range(min(matches_per_session, len(job_ids))):
+            job_id = job_ids[(session_index * matches_per_session + offset) % len(job_ids)]
+            matched_jobs.append(MatchedJob(
+                match_session=match_session, job_listing_id=job_id, score=100 - offset % 100,
+                reason="Strong overlap with the candidate's Python and Django experience.",
+                insights="* Pro: Role matches. * Con: Location differs.", tips="* Highlight Django projects.",
+            ))
+    MatchedJob.objects.bulk_create(matched_jobs, batch_size=BULK_BATCH_SIZE)
+
+    statuses = [choice[0] for choice in SavedJob.STATUS_CHOICES]
+    saved = SavedJob.objects.bulk_create([
+        SavedJob(user=user, job_listing_id=job_id, status=statuses[index % len(statuses)])
+        for index, job_id in enumerate(job_ids[:saved_jobs])
+    ], batch_size=BULK_BATCH_SIZE)
+    document_text = "Dear hiring team,\n\n" + "I build reliable Django services. " * 40
+    CoverLetter.objects.bulk_create([CoverLetter(saved_job=saved_job, content=document_text) for saved_job in saved], batch_size=BULK_BATCH_SIZE)
+    CustomResume.objects.bulk_create([
+        CustomResume(user=user, job_listing_id=saved_job.job_listing_id, content=document_text) for saved_job in saved
+    ], batch_size=BULK_BATCH_SIZE)
+    return user, match_sessions[-1] if match_sessions else None
+
+
+def _path_urls(match_session, job_id):
+    with translation.override('en'):
+        return {
+            'main_page': reverse('matcher:main_page'),
+            'session_view': f"{reverse('matcher:main_page')}?session_id={match_session.id}",
+            'job_detail_page': reverse('matcher:job_detail_page', args=[job_id, match_session.id]),
+            'my_applications_page': reverse('matcher:my_applications_page'),
+            'cover_letter_pdf': reverse('matcher:download_cover_letter_pdf', args=[job_id]),
+            'custom_resume_pdf': reverse('matcher:download_custom_resume_pdf', args=[job_id]),
+        }
+
+
+def _consume(response):
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+
+
+def time_request(client, url, iterations, warmup):
+    """Latency percentiles, query count and peak traced memory of GET url."""
+    status_codes = set()
+    for _ in range(warmup):
+        _consume(client.get(url))
+    durations = []
+    queries = 0
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            _consume(response)
+            durations.append(time.perf_counter() - started)
+        status_codes.add(response.status_code)
+        queries = len(captured.captured_queries)
+
+    # Memory is traced in a separate request because tracing slows everything down
+    tracemalloc.start()
+    try:
+        _consume(client.get(url))
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    durations.sort()
+    return {
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 2),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 2),
+        'queries': queries,
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+        'status_codes': sorted(status_codes),
+    }
+
+
+def time_import_jobs(csv_path):
+    """import_jobs (including the vector index update) for a CSV, measured once, with memory tracing on."""
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            call_command('import_jobs', csv=csv_path, stdout=StringIO())
+            duration = time.perf_counter() - started
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': round(duration, 3),
+        'queries': len(captured.captured_queries),
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+    }
+
+
+def run_size(size, paths, iterations, warmup, sessions, matches_per_session, saved_jobs, work_dir, log):
+    job_rows, anomaly_rows = generate_job_rows(size, seed=size)
+    csv_path = os.path.join(work_dir, f'jobs_{size}.csv')
+    write_jobs_csv(csv_path, job_rows)
+
+    for model in (CoverLetter, CustomResume, SavedJob, MatchedJob, MatchSession, UserProfile):
+        model.objects.all().delete()
+    get_user_model().objects.all().delete()
+
+    log(f"[{size}] import_jobs")
+    result = {'import_jobs': time_import_jobs(csv_path)}
+    job_ids = list(JobListing.objects.order_by('id').values_list('id', flat=True))
+    user, match_session = build_user_dataset(job_ids, sessions, matches_per_session, saved_jobs)
+
+    with running_standin(tables={'job_listings': job_rows, 'job_anomaly_analysis': anomaly_rows}, quiet=True) as standin, \
+            patch.dict(os.environ, {'SUPABASE_URL': standin.url, 'SUPABASE_KEY': standin.anon_key}), \
+            override_settings(SUPABASE_URL=standin.url, SUPABASE_KEY=standin.anon_key):
+        client = Client()
+        client.force_login(user)
+        urls = _path_urls(match_session, job_ids[0])
+        for path_name in paths:
+            log(f"[{size}] {path_name}")
+            result[path_name] = time_request(client, urls[path_name], iterations, warmup)
+    return result
+
+
+def run_benchmarks(sizes, paths=PATHS, iterations=10, warmup=2, sessions=20, matches_per_session=50, saved_jobs=200, log=print):
+    """Runs the suite in a fresh test database and returns the JSON-serialisable report."""
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'sessions': sessions,
+            'matches_per_session': matches_per_session,
+            'saved_jobs': saved_jobs,
+        },
+        'results': {},
+    }
+    work_dir = tempfile.mkdtemp(prefix='jobbai-bench-')
+    setup_test_environment()
+    old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                USE_AI_SIMULATION=True,
+                JOB_VECTOR_STORE_DIR=os.path.join(work_dir, 'job_vectors'),
+                BACKGROUND_TASKS_EAGER=True,
+                REQUEST_TIMING_SLOW_MS=float('inf'),
+            ))
+            for size in sizes:
+                report['results'][str(size)] = run_size(
+                    size, paths, iterations, warmup, sessions, matches_per_session, saved_jobs, work_dir, log
+                )
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
@@ -2,22 +2,43 @@ from dotenv import load_dotenv
 import os
 import google.generativeai as genai
 import json
-import random
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from django.conf import settings # Import Django settings
+from django.db import connection
+
+from .services import ai_response_cache, gemini_resilience, llm_metrics, request_timing, simulation_backend
+from .services.job_ranking import shortlist_jobs
 
 # Configure the Gemini API client
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # print(f"DEBUG: GEMINI_API_KEY from env: '{GEMINI_API_KEY}'") # Keep this commented out for normal use
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
 model = None
 
+def _gemini_client_kwargs():
+    """genai.configure options; GEMINI_API_ENDPOINT points the REST client at another server (e.g. the local stand-in)."""
+    if not settings.GEMINI_API_ENDPOINT:
+        return {}
+    return {'transport': 'rest', 'client_options': {'api_endpoint': settings.GEMINI_API_ENDPOINT}}
+
+if settings.GEMINI_API_ENDPOINT and not GEMINI_API_KEY:
+    GEMINI_API_KEY = "stand-in" # Custom endpoints such as the local stand-in do not check the key
+
 # Centralized API configuration
 if not settings.USE_AI_SIMULATION:
     if GEMINI_API_KEY:
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
+            genai.configure(api_key=GEMINI_API_KEY, **_gemini_client_kwargs())
+            if settings.GEMINI_API_ENDPOINT:
+                print(f"INFO: Gemini API calls go to {settings.GEMINI_API_ENDPOINT}.")
             # Using a model that supports function calling or structured output is ideal.
             # 'gemini-1.5-flash-latest' is a good candidate for speed and capability.
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
+            model = genai.GenerativeModel(GEMINI_MODEL_NAME)
             print("INFO: Gemini API configured successfully for job matching.")
         except Exception as e:
             print(f"ERROR: Could not configure Gemini API: {e}. AI features will be effectively simulated.")
@@ -31,21 +52,80 @@ else:
 
 # --- Reusable Helper Functions ---
 
-def _get_processed_job_listings(job_listings, max_jobs_to_process, task_name_for_log="task"):
+def _get_processed_job_listings(job_listings, max_jobs_to_process, task_name_for_log="task", structured_user_profile=None):
     """
-    Slices the job_listings based on max_jobs_to_process.
-    Returns the processed list.
+    Reduces job_listings to at most max_jobs_to_process jobs.
+    With a structured_user_profile the best jobs are picked by local BM25 pre-ranking,
+    otherwise the list is sliced. Returns the processed list.
     """
     if max_jobs_to_process is not None and isinstance(max_jobs_to_process, int) and max_jobs_to_process > 0:
         print(f"INFO: Processing only the top {max_jobs_to_process} job listings for {task_name_for_log}.")
+        if structured_user_profile:
+            return shortlist_jobs(structured_user_profile, job_listings, max_jobs_to_process)
         return job_listings[:max_jobs_to_process]
     elif max_jobs_to_process is not None:
         print(f"WARNING: Invalid value for max_jobs_to_process ({max_jobs_to_process}) for {task_name_for_log}. Processing all jobs.")
     return job_listings
 
+# Sentences that carry no matching signal: equal-opportunity statements, privacy and legal footers, calls to action
+BOILERPLATE_SENTENCE_RE = re.compile(
+    r"equal opportunit|chancengleich|diversit|discriminat|diskriminier|datenschutz|privacy (?:policy|notice|statement)"
+    r"|data protection|gdpr|dsgvo|cookie|impressum|all rights reserved|alle rechte vorbehalten|©"
+    r"|apply now|jetzt bewerben|click here|hier klicken",
+    re.IGNORECASE
+)
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+WHITESPACE_RE = re.compile(r"\s+")
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+def dumps_compact_json(data):
+    """Minified JSON for prompts: no indentation, no spaces after separators, non-ASCII kept as is."""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+@lru_cache(maxsize=4096)
+def _compact_description(description, max_chars):
+    """
+    Normalizes a job description for the prompt: drops boilerplate sentences, collapses
+    whitespace and caps the length at a word boundary. Cached per description text.
+    """
+    if not description:
+        return ''
+    kept_sentences = []
+    for sentence in SENTENCE_SPLIT_RE.split(description):
+        sentence = WHITESPACE_RE.sub(' ', sentence).strip()
+        if sentence and not BOILERPLATE_SENTENCE_RE.search(sentence):
+            kept_sentences.append(sentence)
+    compacted = ' '.join(kept_sentences)
+    if len(compacted) > max_chars:
+        compacted = compacted[:max_chars].rsplit(' ', 1)[0] + '…'
+    return compacted
+
+def _get_prompt_description(job):
+    """Prefers the effective_description from anomaly analysis (already stripped of noise) over the raw description."""
+    anomaly_analysis = job.get('anomaly_analysis')
+    if isinstance(anomaly_analysis, dict) and anomaly_analysis.get('effective_description'):
+        return anomaly_analysis['effective_description']
+    return job.get('effective_description') or job.get('description') or ''
+
 def _prepare_job_data_for_prompt(processed_job_listings):
-    """Prepares the job data in the format expected by the API prompt."""
+    """Prepares the job data in the format expected by the API prompt, with compacted descriptions."""
+    max_chars = settings.GEMINI_MATCH_DESCRIPTION_MAX_CHARS
     return [
+        {
+            "id": str(job.get('id')),
+            "title": job.get('job_title'),
+            "company": job.get('company_name'),
+            "description": _compact_description(_get_prompt_description(job), max_chars),
+            "level": job.get('level', "Not specified"),
+            "location": job.get('location', "Not specified"),
+            "industry": job.get('industry', "Not specified")
+        }
+        for job in processed_job_listings
+    ]
+
+def _estimate_uncompacted_job_tokens(processed_job_listings):
+    """Token estimate of the job payload as it was sent before compaction (raw descriptions, indented JSON)."""
+    raw_jobs = [
         {
             "id": str(job.get('id')),
             "title": job.get('job_title'),
@@ -57,6 +137,35 @@ def _prepare_job_data_for_prompt(processed_job_listings):
         }
         for job in processed_job_listings
     ]
+    return _estimate_tokens(json.dumps(raw_jobs, indent=2))
+
+def _estimate_tokens(text):
+    """Rough token estimate (~4 characters per token), good enough for prompt budgeting."""
+    return len(text) // 4 + 1
+
+def _chunk_job_listings(job_listings, token_budget, max_jobs_per_chunk):
+    """
+    Splits job_listings into consecutive chunks whose prompt payload stays within
+    token_budget (estimated) and which hold at most max_jobs_per_chunk jobs.
+    A single job larger than the budget still gets a chunk of its own.
+    """
+    chunks = []
+    current_chunk = []
+    current_tokens = 0
+    for job in job_listings:
+        job_tokens = _estimate_tokens(dumps_compact_json(_prepare_job_data_for_prompt([job])[0]))
+        if current_chunk and (current_tokens + job_tokens > token_budget or len(current_chunk) >= max_jobs_per_chunk):
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_tokens = 0
+        current_chunk.append(job)
+        current_tokens += job_tokens
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+# A response that cannot be parsed is requested once more; failed requests are retried by gemini_resilience
+MAX_PARSE_ATTEMPTS = 2
 
 def _execute_ai_task(
     task_name,
@@ -66,72 +175,318 @@ def _execute_ai_task(
     response_parser_args: tuple, # Additional args for the parser besides api_response_text and api_response_object
     simulation_func,
     simulation_args: tuple,
-    pass_full_response_to_parser: bool = False
+    pass_full_response_to_parser: bool = False,
+    stream_item_callback=None,
+    return_outcome: bool = False
 ):
     """
     Core function to execute an AI task: either call Gemini API or run a simulation.
-    Handles prompt generation, API call, response parsing, and error fallback.
+    Handles prompt generation, API call and response parsing.
+    Retries of failed requests happen in gemini_resilience.call_gemini only; a response that
+    cannot be parsed is requested once more. If the task still fails, it falls back to the
+    simulation in simulation mode and raises GeminiUnavailableError otherwise, so callers can
+    record the failure instead of presenting simulated output as real.
+    Successfully parsed responses of cacheable tasks are served from / stored in ai_response_cache.
+    With a stream_item_callback the response is streamed, and every element of the returned
+    JSON array is passed to the callback as soon as it is complete (elements may repeat on a retry).
+    With return_outcome, (result, outcome) is returned, outcome being one of the llm_metrics OUTCOME_* values.
     """
-    if settings.USE_AI_SIMULATION or not model:
+    def finish(result, outcome):
+        llm_metrics.record_call(task_name, outcome)
+        return (result, outcome) if return_outcome else result
+
+    simulating = settings.USE_AI_SIMULATION or not model
+    if simulating:
         sim_reason = "USE_AI_SIMULATION is True" if settings.USE_AI_SIMULATION else "Gemini model not available"
         print(f"INFO: Using simulated {task_name} ({sim_reason}).")
-        # Ensure error_message is passed if it's an expected arg for the simulation_func
-        # For simplicity, we assume simulation_func can take an error_message as its last arg if needed.
-        # This might need adjustment based on specific simulation function signatures.
-        # Here, we rely on simulation_args to be structured correctly by the caller.
-        return simulation_func(*simulation_args)
-
-    api_response_text = None
-    api_response_object = None
-    try:
-        prompt = prompt_generator_func(*prompt_generator_args)
-        print(f"INFO: --- Sending prompt to Gemini for {task_name} ---")
-        # print(f"DEBUG Prompt for {task_name} (first 500 chars):\n{prompt[:500]}...")
-        
-        api_response_object = model.generate_content(prompt)
-        api_response_text = api_response_object.text
-        # print(f"DEBUG API Response Text for {task_name} (first 500 chars):\n{api_response_text[:500]}...")
-
-        # Pass (api_response_text, api_response_object, ...) to parser
-        parser_all_args = (api_response_text, api_response_object) + response_parser_args
-
-        return response_parser_func(*parser_all_args)
-
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Could not parse JSON from Gemini for {task_name}. Error: {e}. Raw response was: {api_response_text}")
-        # Fallback to simulation with error information
-        # Ensure the simulation_func can accept an error_message.
-        # Typically, simulation_args would already contain placeholders or default values for primary inputs.
-        # We append error_message, assuming it's the last parameter in simulation_func's signature if it handles errors.
-        error_sim_args = simulation_args + (f"API JSON parsing error: {e}",)
-        return simulation_func(*error_sim_args)
-    except Exception as e:
-        print(f"ERROR: Gemini API call or other processing failed for {task_name}: {e}")
-        # import traceback
-        # print(traceback.format_exc()) # For deeper debugging
-        error_sim_args = simulation_args + (f"API call/processing error: {e}",)
-        return simulation_func(*error_sim_args)
+        if not simulation_backend.is_active():
+            # Ensure error_message is passed if it's an expected arg for the simulation_func
+            # For simplicity, we assume simulation_func can take an error_message as its last arg if needed.
+            # This might need adjustment based on specific simulation function signatures.
+            # Here, we rely on simulation_args to be structured correctly by the caller.
+            with simulation_backend.seeded(task_name, prompt_generator_func(*prompt_generator_args)):
+                return finish(simulation_func(*simulation_args), llm_metrics.OUTCOME_SIMULATED)
+        # Otherwise the simulated call takes time and may fail like the real one (load testing)
+
+    last_error_message = None
+    fallback_reason = None
+    prompt = None
+    for attempt in range(1, MAX_PARSE_ATTEMPTS + 1):
+        api_response_text = None
+        api_response_object = None
+        parsing = False
+        try:
+            prompt = prompt_generator_func(*prompt_generator_args)
+
+            if simulating:
+                gemini_resilience.call_gemini(
+                    _instrumented_call(task_name, prompt, lambda: (simulation_backend.simulate_call(task_name, prompt), None)),
+                    task_name
+                )
+                with simulation_backend.seeded(task_name, prompt):
+                    return finish(simulation_func(*simulation_args), llm_metrics.OUTCOME_SIMULATED)
+
+            if attempt == 1:
+                cached_response_text = ai_response_cache.get_cached_response(task_name, GEMINI_MODEL_NAME, prompt)
+                if cached_response_text is not None:
+                    print(f"INFO: Using cached Gemini response for {task_name}.")
+                    try:
+                        parsed_result = response_parser_func(cached_response_text, None, *response_parser_args)
+                        llm_metrics.record_cache_hit(task_name)
+                        return finish(parsed_result, llm_metrics.OUTCOME_CACHED)
+                    except Exception as e:
+                        llm_metrics.record_parse_failure(task_name)
+                        print(f"WARNING: Cached response for {task_name} could not be parsed ({e}). Calling Gemini instead.")
+                        ai_response_cache.invalidate_response(task_name, GEMINI_MODEL_NAME, prompt)
+
+            print(f"INFO: --- Sending prompt to Gemini for {task_name} ---")
+            # print(f"DEBUG Prompt for {task_name} (first 500 chars):\n{prompt[:500]}...")
+
+            # Rate limiting, retries with backoff and the circuit breaker live in gemini_resilience
+            if stream_item_callback is not None:
+                api_call = lambda: _generate_content_streaming(prompt, stream_item_callback)
+            else:
+                api_call = lambda: _generate_content(prompt)
+            api_response_object, api_response_text = gemini_resilience.call_gemini(
+                _instrumented_call(task_name, prompt, api_call), task_name
+            )
+            # print(f"DEBUG API Response Text for {task_name} (first 500 chars):\n{api_response_text[:500]}...")
+
+            # Pass (api_response_text, api_response_object, ...) to parser
+            parser_all_args = (api_response_text, api_response_object) + response_parser_args
+
+            parsing = True
+            parsed_result = response_parser_func(*parser_all_args)
+            ai_response_cache.store_response(task_name, GEMINI_MODEL_NAME, prompt, api_response_text)
+            return finish(parsed_result, llm_metrics.OUTCOME_SUCCESS)
+
+        except (gemini_resilience.CircuitOpenError, gemini_resilience.RateLimitTimeout) as e:
+            # Upstream is unhealthy or saturated: another attempt now would not help
+            print(f"WARNING: Not calling Gemini for {task_name}: {e}")
+            last_error_message = f"API unavailable: {e}"
+            fallback_reason = llm_metrics.FALLBACK_API_UNAVAILABLE
+            break
+        except Exception as e:
+            if not parsing:
+                # call_gemini has already retried what was worth retrying
+                print(f"ERROR: Gemini API call failed for {task_name}: {e}")
+                last_error_message = f"API call error: {e}"
+                fallback_reason = llm_metrics.FALLBACK_API_ERROR
+                break
+            print(f"ERROR: Could not parse the Gemini response for {task_name}. Error: {e}. Raw response was: {api_response_text}")
+            llm_metrics.record_parse_failure(task_name)
+            last_error_message = f"API response parsing error: {e}"
+            fallback_reason = llm_metrics.FALLBACK_PARSE_ERROR
+
+        if attempt < MAX_PARSE_ATTEMPTS:
+            print(f"INFO: Requesting {task_name} once more after the unparseable response.")
+
+    llm_metrics.record_fallback(task_name, fallback_reason or llm_metrics.FALLBACK_API_ERROR)
+    if not simulating:
+        llm_metrics.record_call(task_name, llm_metrics.OUTCOME_UNAVAILABLE)
+        raise gemini_resilience.GeminiUnavailableError(
+            f"Gemini is temporarily unavailable for {task_name} ({last_error_message})",
+            systemic=fallback_reason == llm_metrics.FALLBACK_API_UNAVAILABLE
+        )
+
+    # Simulation mode: the simulated call failed like the real one would; answer with the simulation.
+    # We append error_message, assuming it's the last parameter in simulation_func's signature if it handles errors.
+    error_sim_args = simulation_args + (last_error_message,)
+    with simulation_backend.seeded(task_name, prompt):
+        return finish(simulation_func(*error_sim_args), llm_metrics.OUTCOME_FALLBACK)
+
+def _generate_content(prompt):
+    """Non-streaming Gemini request. Returns (response_object, response_text)."""
+    api_response_object = model.generate_content(prompt)
+    return api_response_object, api_response_object.text
+
+def _usage_token_counts(api_response_object, prompt, api_response_text):
+    """(prompt tokens, response tokens) as reported by the API, else estimated from the text."""
+    usage = getattr(api_response_object, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    response_tokens = getattr(usage, 'candidates_token_count', None)
+    if not isinstance(prompt_tokens, int) or not prompt_tokens:
+        prompt_tokens = _estimate_tokens(prompt or "")
+    if not isinstance(response_tokens, int) or not response_tokens:
+        response_tokens = _estimate_tokens(api_response_text or "")
+    return prompt_tokens, response_tokens
+
+def _instrumented_call(task_name, prompt, api_call):
+    """Wraps api_call so that every request it makes, retries included, is recorded in llm_metrics."""
+    def call():
+        started = time.perf_counter()
+        try:
+            api_response_object, api_response_text = api_call()
+        except Exception:
+            request_timing.add(request_timing.CATEGORY_LLM, time.perf_counter() - started)
+            llm_metrics.record_api_call(
+                task_name, time.perf_counter() - started, prompt_text=prompt, prompt_tokens=_estimate_tokens(prompt or "")
+            )
+            raise
+        request_timing.add(request_timing.CATEGORY_LLM, time.perf_counter() - started)
+        prompt_tokens, response_tokens = _usage_token_counts(api_response_object, prompt, api_response_text)
+        llm_metrics.record_api_call(
+            task_name, time.perf_counter() - started, prompt, api_response_text, prompt_tokens, response_tokens
+        )
+        return api_response_object, api_response_text
+    return call
+
+def _generate_content_streaming(prompt, stream_item_callback):
+    """
+    Streams a Gemini response, passing each completed JSON array element to stream_item_callback.
+    Returns (response_object, full_response_text).
+    """
+    parser = JsonArrayStreamParser()
+    text_parts = []
+    api_response_object = model.generate_content(prompt, stream=True)
+    for response_chunk in api_response_object:
+        chunk_text = response_chunk.text
+        text_parts.append(chunk_text)
+        for item in parser.feed(chunk_text):
+            stream_item_callback(item)
+    return api_response_object, "".join(text_parts)
 
 # --- JSON Parsing Utilities (kept as is, but could be integrated if only used once) ---
-def parse_gemini_batch_json_response(response_text):
-    """Attempts to parse a JSON array from Gemini's text response.
-       Handles cases where the JSON might be wrapped in backticks or have leading/trailing text.
+class JsonArrayStreamParser:
+    """
+    Incrementally extracts the objects of a top-level JSON array from text that arrives in
+    pieces, e.g. a streamed Gemini response. Text before the opening '[' (such as a ```json
+    fence) is ignored, and malformed elements are skipped and counted.
     """
-    # Find the start of the array and end of the array
-    start_index = response_text.find('[')
-    end_index = response_text.rfind(']')
 
-    if start_index != -1 and end_index != -1 and end_index > start_index:
-        json_str = response_text[start_index : end_index + 1]
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._array_started = False
+        self._array_finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self.malformed_count = 0
+
+    def feed(self, text):
+        """Adds text and returns the list of objects completed by it."""
+        completed_objects = []
+        if self._array_finished:
+            return completed_objects
+        self._buffer += text
+        buffer = self._buffer
+        index = self._position
+        while index < len(buffer):
+            char = buffer[index]
+            if not self._array_started:
+                self._array_started = char == '['
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._object_start = index
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # The closing bracket of the top-level array
+                    self._array_finished = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    self._emit(buffer[self._object_start:index + 1], completed_objects)
+                    self._object_start = None
+            index += 1
+
+        # Drop everything that can no longer be part of an unfinished object
+        keep_from = self._object_start if self._object_start is not None else index
+        self._buffer = buffer[keep_from:]
+        self._position = index - keep_from
+        if self._object_start is not None:
+            self._object_start = 0
+        return completed_objects
+
+    @property
+    def array_started(self):
+        return self._array_started
+
+    @property
+    def array_finished(self):
+        return self._array_finished
+
+    def _emit(self, object_text, completed_objects):
         try:
-            return json.loads(json_str)
+            parsed = json.loads(object_text)
         except json.JSONDecodeError as e:
-            print(f"JSONDecodeError for batch response: {e} in string: '{json_str}'")
-            raise # Re-raise the error to be caught by the caller
-    else:
+            # Trailing commas are the most common slip in model output; try once without them
+            try:
+                parsed = json.loads(TRAILING_COMMA_RE.sub(r'\1', object_text))
+            except json.JSONDecodeError:
+                self.malformed_count += 1
+                print(f"WARNING: Skipping malformed element in JSON array: {e}")
+                return
+        if isinstance(parsed, dict):
+            completed_objects.append(parsed)
+
+JsonSalvageResult = namedtuple('JsonSalvageResult', ['items', 'malformed_count', 'truncated', 'missing_ids'])
+
+def salvage_json_array(response_text, expected_ids=None):
+    """
+    Recovers every well-formed object from a JSON array in a model response, even if the
+    array is truncated or some elements are malformed. Well-formed responses take the plain
+    json.loads path. With expected_ids, missing_ids lists the ids (as strings) that no
+    recovered object carries in its 'id' field.
+    """
+    items = None
+    malformed_count = 0
+    truncated = False
+    start_index = response_text.find('[')
+    end_index = response_text.rfind(']')
+    if start_index != -1 and end_index > start_index:
+        try:
+            parsed = json.loads(response_text[start_index:end_index + 1])
+            if isinstance(parsed, list):
+                items = [item for item in parsed if isinstance(item, dict)]
+        except json.JSONDecodeError:
+            pass
+
+    if items is None:
+        parser = JsonArrayStreamParser()
+        items = parser.feed(response_text)
+        malformed_count = parser.malformed_count
+        truncated = parser.array_started and not parser.array_finished
+
+    missing_ids = []
+    if expected_ids is not None:
+        returned_ids = {str(item.get('id')) for item in items}
+        missing_ids = [str(job_id) for job_id in expected_ids if str(job_id) not in returned_ids]
+    return JsonSalvageResult(items, malformed_count, truncated, missing_ids)
+
+def parse_gemini_batch_json_response(response_text, expected_ids=None):
+    """Attempts to parse a JSON array from Gemini's text response.
+       Handles cases where the JSON might be wrapped in backticks or have leading/trailing text.
+       A truncated or partly malformed array yields the elements that could be recovered;
+       JSONDecodeError is raised only if nothing usable was found. With expected_ids, the
+       ids missing from the result are logged.
+    """
+    if response_text.find('[') == -1:
         print(f"Could not find valid JSON array in batch response: {response_text}")
         raise json.JSONDecodeError("No valid JSON array found in batch response string", response_text, 0)
 
+    result = salvage_json_array(response_text, expected_ids)
+    if result.malformed_count or result.truncated:
+        if not result.items:
+            print(f"JSONDecodeError for batch response: nothing recoverable in '{response_text}'")
+            raise json.JSONDecodeError("No well-formed elements in batch response array", response_text, 0)
+        print(f"WARNING: Salvaged {len(result.items)} element(s) from a damaged batch response "
+              f"({result.malformed_count} malformed, truncated: {result.truncated}).")
+    if result.missing_ids:
+        print(f"WARNING: Batch response has no result for {len(result.missing_ids)} id(s): {', '.join(result.missing_ids)}")
+    return result.items
+
 def parse_gemini_object_json_response(response_text):
     """
     Attempts to parse a single JSON object from Gemini's text response.
@@ -173,6 +528,9 @@ def parse_gemini_object_json_response(response_text):
 
 # --- User Profile Extraction ---
 
+# Bump whenever _generate_user_profile_prompt changes, so stored structured profiles are re-extracted.
+USER_PROFILE_PROMPT_VERSION = 1
+
 def _generate_user_profile_prompt(user_cv_text, user_preferences_text):
     return f"""
     You are an expert HR and career consultant. Analyze the provided User CV/Resume Text and User Preferences.
@@ -248,10 +606,11 @@ def simulate_extract_user_profile(user_cv_text, user_preferences_text, error_mes
         simulated_profile["error_during_api_call"] = error_message
     return simulated_profile
 
-def extract_user_profile(user_cv_text, user_preferences_text):
+def extract_user_profile(user_cv_text, user_preferences_text, return_outcome=False):
     """
     Uses Gemini API or simulation to extract a structured user profile 
     from CV text and user preferences.
+    With return_outcome, (profile, outcome) is returned (see _execute_ai_task).
     """
     return _execute_ai_task(
         task_name="user profile extraction",
@@ -261,7 +620,8 @@ def extract_user_profile(user_cv_text, user_preferences_text):
         response_parser_args=(), # No extra args for this parser
         simulation_func=simulate_extract_user_profile,
         simulation_args=(user_cv_text, user_preferences_text),
-        pass_full_response_to_parser=False # Not strictly needed for this one
+        pass_full_response_to_parser=False, # Not strictly needed for this one
+        return_outcome=return_outcome
     )
 
 # --- Legacy Job Matching (based on simple skills_text) --- REMOVED ---
@@ -269,7 +629,7 @@ def extract_user_profile(user_cv_text, user_preferences_text):
 # --- Enhanced Job Matching (based on Structured User Profile) --- START ---
 
 def _generate_match_jobs_prompt(structured_user_profile, jobs_json_string):
-    user_profile_json_string = json.dumps(structured_user_profile, indent=2)
+    user_profile_json_string = dumps_compact_json(structured_user_profile)
     return f"""
     You are a highly sophisticated AI job matching expert for the German market.
     You will receive a detailed structured user profile and a list of job listings.
@@ -311,40 +671,80 @@ def _generate_match_jobs_prompt(structured_user_profile, jobs_json_string):
     Be critical and realistic in your assessment.
     """
 
+def _build_match_from_api_item(item, original_job_dict):
+    """Turns one element of the match response into the match dict used by the views."""
+    return {
+        'job': original_job_dict,
+        'score': int(item.get('match_score', 0)),
+        'reason': str(item.get('match_reason', 'N/A')),
+        'insights': str(item.get('job_insights', 'N/A')),
+        'tips': str(item.get('application_tips', 'N/A'))
+    }
+
 def _parse_match_jobs_response(api_response_text, _api_response_object, original_processed_job_listings):
-    api_results_array = parse_gemini_batch_json_response(api_response_text)
+    api_results_array = parse_gemini_batch_json_response(
+        api_response_text, expected_ids=[job.get('id') for job in original_processed_job_listings]
+    )
+    jobs_by_id = {str(job.get('id')): job for job in original_processed_job_listings}
     
     processed_matches = []
+    matched_job_ids = set()
     for item in api_results_array:
         job_id_str = str(item.get('id'))
-        original_job_dict = next((job for job in original_processed_job_listings if str(job.get('id')) == job_id_str), None)
+        original_job_dict = jobs_by_id.get(job_id_str)
         
         if not original_job_dict:
             print(f"WARNING: Job ID {job_id_str} from API response not found in the processed job listings. Skipping.")
             continue
+        if job_id_str in matched_job_ids:
+            print(f"WARNING: Job ID {job_id_str} appears more than once in the API response. Keeping the first result.")
+            continue
 
-        processed_matches.append({
-            'job': original_job_dict,
-            'score': int(item.get('match_score', 0)),
-            'reason': str(item.get('match_reason', 'N/A')),
-            'insights': str(item.get('job_insights', 'N/A')),
-            'tips': str(item.get('application_tips', 'N/A'))
-        })
+        processed_matches.append(_build_match_from_api_item(item, original_job_dict))
+        matched_job_ids.add(job_id_str)
 
     processed_matches.sort(key=lambda x: x['score'], reverse=True)
     return processed_matches
 
+def _find_unmatched_jobs(job_listings, matches):
+    """Returns the jobs of job_listings that have no entry in matches, in their original order."""
+    matched_job_ids = {str(match['job'].get('id')) for match in matches}
+    return [job for job in job_listings if str(job.get('id')) not in matched_job_ids]
+
+class MatchCoverage:
+    """
+    Thread-safe tally of how completely the model answered a match_jobs call: how many jobs
+    the first request of each chunk covered, how many follow-up (gap-fill) requests were
+    needed and what they recovered, and how many jobs ended up simulated or missing.
+    """
+
+    FIELDS = ('jobs_requested', 'first_pass_returned', 'gap_fill_requests', 'gap_filled', 'simulated', 'missing')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, **counts):
+        with self._lock:
+            for field, value in counts.items():
+                self._counts[field] += value
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
 def simulate_match_jobs(structured_user_profile, job_listings, max_jobs_to_process=None, error_message=None):
     """Enhanced: Simulates job matching with a structured user profile."""
     print(f"INFO: Executing SIMULATED ENHANCED job matching. Profile summary: {structured_user_profile.get('summary', '')[:50]}...")
     
     # Use the helper for consistent job list processing
-    processed_job_listings = _get_processed_job_listings(job_listings, max_jobs_to_process, "enhanced simulation")
+    processed_job_listings = _get_processed_job_listings(job_listings, max_jobs_to_process, "enhanced simulation", structured_user_profile)
         
     matched_results = []
+    rng = simulation_backend.get_rng() # Seeded by AI_SIMULATION_SEED for reproducible runs
     
     for i, job in enumerate(processed_job_listings): # Use the (potentially sliced) list
-        score = random.randint(30, 95)
+        score = rng.randint(30, 95)
         reason_fragments = ["Simulated Enhanced Reason:"]
         insights_fragments = ["Simulated Insights:"]
         tips_fragments = ["Simulated Tips:"]
@@ -385,18 +785,18 @@ def simulate_match_jobs(structured_user_profile, job_listings, max_jobs_to_proce
                     {
                         "type": "Cross-Role",
                         "chunk": f"Simulated anomaly chunk for {job.get('job_title', 'this role')} - potential role mismatch detected.",
-                        "similarity_to_role": round(random.uniform(0.2, 0.4), 3),
-                        "similarity_to_global": round(random.uniform(0.3, 0.5), 3),
-                        "similarity_to_industry": round(random.uniform(0.2, 0.4), 3)
+                        "similarity_to_role": round(rng.uniform(0.2, 0.4), 3),
+                        "similarity_to_global": round(rng.uniform(0.3, 0.5), 3),
+                        "similarity_to_industry": round(rng.uniform(0.2, 0.4), 3)
                     },
                     {
                         "type": "Industry-Specific",
                         "chunk": f"Industry-specific anomaly for {job.get('industry', 'this industry')} - unusual requirements detected.",
-                        "similarity_to_role": round(random.uniform(0.3, 0.5), 3),
-                        "similarity_to_global": round(random.uniform(0.4, 0.6), 3),
-                        "similarity_to_industry": round(random.uniform(0.2, 0.3), 3)
+                        "similarity_to_role": round(rng.uniform(0.3, 0.5), 3),
+                        "similarity_to_global": round(rng.uniform(0.4, 0.6), 3),
+                        "similarity_to_industry": round(rng.uniform(0.2, 0.3), 3)
                     }
-                ] if random.choice([True, False]) else [],  # Sometimes no anomalies
+                ] if rng.choice([True, False]) else [],  # Sometimes no anomalies
                 "effective_description": f"Simulated effective description for {job.get('job_title', 'this position')} at {job.get('company_name', 'this company')}. This is a comprehensive role description with all relevant details."
             }
 
@@ -405,36 +805,194 @@ def simulate_match_jobs(structured_user_profile, job_listings, max_jobs_to_proce
             'score': score,
             'reason': " ".join(reason_fragments),
             'insights': " ".join(insights_fragments),
-            'tips': " ".join(tips_fragments)
+            'tips': " ".join(tips_fragments),
+            'is_simulated': True # Not a model score; never reused by incremental matching
         })
     matched_results.sort(key=lambda x: x['score'], reverse=True)
     return matched_results
 
-def match_jobs(structured_user_profile, job_listings, max_jobs_to_process=None):
-    """Enhanced: Uses Gemini API or simulation to match jobs based on a structured user profile."""
+def _request_job_matches(structured_user_profile, jobs, stream_item_callback=None, jobs_json_string=None):
+    """
+    One Gemini match request (or its simulation) for jobs.
+    Returns (matches, simulated), simulated being True if the matches came from the simulation.
+    """
+    if jobs_json_string is None:
+        jobs_json_string = dumps_compact_json(_prepare_job_data_for_prompt(jobs))
+    matches, outcome = _execute_ai_task(
+        task_name="enhanced job matching",
+        prompt_generator_func=_generate_match_jobs_prompt,
+        prompt_generator_args=(structured_user_profile, jobs_json_string),
+        response_parser_func=_parse_match_jobs_response,
+        response_parser_args=(jobs,), # Pass the original job dicts for reconstruction
+        simulation_func=simulate_match_jobs,
+        simulation_args=(structured_user_profile, jobs, None), # The jobs are already sized, no further slicing
+        pass_full_response_to_parser=False, # Parser doesn't need the full response object for this one
+        stream_item_callback=stream_item_callback,
+        return_outcome=True
+    )
+    return matches, outcome in (llm_metrics.OUTCOME_SIMULATED, llm_metrics.OUTCOME_FALLBACK)
+
+def _match_jobs_chunk(structured_user_profile, job_chunk, chunk_index, chunk_count, on_match=None, coverage=None):
+    """
+    Scores one chunk of job listings with a single Gemini call (or its simulation).
+    Jobs the model silently skipped are re-requested on their own, for at most
+    GEMINI_MATCH_GAP_FILL_ROUNDS follow-up calls, instead of resending the whole chunk.
+    With on_match, each match is passed to it exactly once, as early as possible: while the
+    response streams in, or after the call for cached and simulated results.
+    """
+    print(f"INFO: [match_jobs] Scoring chunk {chunk_index + 1}/{chunk_count} ({len(job_chunk)} jobs).")
+    jobs_data_for_prompt = _prepare_job_data_for_prompt(job_chunk)
+    jobs_json_string = dumps_compact_json(jobs_data_for_prompt)
+    uncompacted_tokens = _estimate_uncompacted_job_tokens(job_chunk)
+    compacted_tokens = _estimate_tokens(jobs_json_string)
+    print(f"INFO: [match_jobs] Prompt compaction for chunk {chunk_index + 1}: ~{uncompacted_tokens} -> ~{compacted_tokens} job tokens (saved ~{uncompacted_tokens - compacted_tokens}).")
+
+    stream_item_callback = None
+    emitted_job_ids = set()
+    if on_match is not None:
+        jobs_by_id = {str(job.get('id')): job for job in job_chunk}
+
+        def emit_match(match):
+            job_id_str = str(match['job'].get('id'))
+            if job_id_str not in emitted_job_ids:
+                emitted_job_ids.add(job_id_str)
+                on_match(match)
+
+        if settings.GEMINI_STREAM_MATCH_RESULTS:
+            def stream_item_callback(item):
+                original_job_dict = jobs_by_id.get(str(item.get('id')))
+                if original_job_dict is not None:
+                    try:
+                        emit_match(_build_match_from_api_item(item, original_job_dict))
+                    except (TypeError, ValueError) as e:
+                        print(f"WARNING: Skipping streamed match for job {item.get('id')}: {e}")
+
+    chunk_matches, simulated = _request_job_matches(structured_user_profile, job_chunk, stream_item_callback, jobs_json_string)
+    unmatched_jobs = _find_unmatched_jobs(job_chunk, chunk_matches)
+    first_pass_returned = len(job_chunk) - len(unmatched_jobs)
+    # Simulated matches (simulation mode, or its fallback after a failed call) are not model answers
+    simulated_count = first_pass_returned if simulated else 0
+    if simulated:
+        first_pass_returned = 0
+
+    gap_fill_requests = 0
+    gap_filled = 0
+    while unmatched_jobs and gap_fill_requests < settings.GEMINI_MATCH_GAP_FILL_ROUNDS:
+        gap_fill_requests += 1
+        print(f"INFO: [match_jobs] Chunk {chunk_index + 1}: re-requesting {len(unmatched_jobs)} job(s) missing from the response (round {gap_fill_requests}).")
+        try:
+            gap_matches, simulated = _request_job_matches(structured_user_profile, unmatched_jobs, stream_item_callback)
+        except gemini_resilience.GeminiUnavailableError as e:
+            # The chunk itself was scored; the skipped jobs are reported as missing
+            print(f"WARNING: [match_jobs] Chunk {chunk_index + 1}: gap-fill request failed: {e}")
+            break
+        chunk_matches.extend(gap_matches)
+        still_unmatched_jobs = _find_unmatched_jobs(job_chunk, chunk_matches)
+        recovered = len(unmatched_jobs) - len(still_unmatched_jobs)
+        if simulated:
+            simulated_count += recovered
+        else:
+            gap_filled += recovered
+        unmatched_jobs = still_unmatched_jobs
+
+    if gap_fill_requests:
+        chunk_matches.sort(key=lambda x: x['score'], reverse=True)
+    if unmatched_jobs:
+        print(f"WARNING: [match_jobs] Chunk {chunk_index + 1}: no result for {len(unmatched_jobs)} job(s) after {gap_fill_requests} gap-fill round(s).")
+    if coverage is not None:
+        coverage.add(
+            jobs_requested=len(job_chunk),
+            first_pass_returned=first_pass_returned,
+            gap_fill_requests=gap_fill_requests,
+            gap_filled=gap_filled,
+            simulated=simulated_count,
+            missing=len(unmatched_jobs)
+        )
+
+    if on_match is not None:
+        # Cached and simulated results (or anything the stream missed) are emitted now
+        for match in chunk_matches:
+            emit_match(match)
+    return chunk_matches
+
+def _match_jobs_chunk_in_thread(*args):
+    """Runs _match_jobs_chunk on a pool thread and releases that thread's DB connection (used by the response cache)."""
+    try:
+        return _match_jobs_chunk(*args)
+    finally:
+        connection.close()
+
+def match_jobs(structured_user_profile, job_listings, max_jobs_to_process=None, on_match=None, coverage=None):
+    """
+    Enhanced: Uses Gemini API or simulation to match jobs based on a structured user profile.
+    The listings are split into token-bounded chunks which are scored concurrently on a
+    bounded thread pool and merged into one list ranked by score.
+    on_match, if given, is called with every match as soon as it is available (possibly from
+    a pool thread), so callers can persist results before the whole call has finished.
+    coverage, a MatchCoverage, collects how completely the model answered.
+    A chunk that Gemini could not answer is reported as missing while the other chunks are
+    kept; GeminiUnavailableError is raised only if Gemini is down altogether or no chunk succeeded.
+    """
     print(f"INFO: [match_jobs] Top of function. settings.USE_AI_SIMULATION: {settings.USE_AI_SIMULATION}, Model: {model is not None}")
 
     # Get the (potentially sliced) list of jobs to process
-    processed_job_listings = _get_processed_job_listings(job_listings, max_jobs_to_process, "enhanced job matching")
+    processed_job_listings = _get_processed_job_listings(job_listings, max_jobs_to_process, "enhanced job matching", structured_user_profile)
     
     if not processed_job_listings: # If no jobs to process, return empty list
         print("INFO: [match_jobs] No job listings to process after applying max_jobs_to_process filter.")
         return []
 
-    # Prepare job data specifically for the prompt
-    jobs_data_for_prompt = _prepare_job_data_for_prompt(processed_job_listings)
-    jobs_json_string = json.dumps(jobs_data_for_prompt, indent=2)
-
-    return _execute_ai_task(
-        task_name="enhanced job matching",
-        prompt_generator_func=_generate_match_jobs_prompt,
-        prompt_generator_args=(structured_user_profile, jobs_json_string),
-        response_parser_func=_parse_match_jobs_response,
-        response_parser_args=(processed_job_listings,), # Pass the original (but potentially sliced) job dicts for reconstruction
-        simulation_func=simulate_match_jobs,
-        simulation_args=(structured_user_profile, job_listings, max_jobs_to_process), # Simulation will internally call _get_processed_job_listings
-        pass_full_response_to_parser=False # Parser doesn't need the full response object for this one
+    job_chunks = _chunk_job_listings(
+        processed_job_listings,
+        settings.GEMINI_MATCH_CHUNK_TOKEN_BUDGET,
+        settings.GEMINI_MATCH_MAX_JOBS_PER_CHUNK
     )
+    chunk_count = len(job_chunks)
+    print(f"INFO: [match_jobs] Split {len(processed_job_listings)} jobs into {chunk_count} chunk(s).")
+
+    if chunk_count == 1:
+        return _match_jobs_chunk(structured_user_profile, job_chunks[0], 0, 1, on_match, coverage)
+
+    matched_results = []
+    chunk_error = None
+    failed_chunk_count = 0
+    max_workers = min(chunk_count, settings.GEMINI_MATCH_MAX_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="match_jobs") as executor:
+        futures = [
+            executor.submit(_match_jobs_chunk_in_thread, structured_user_profile, job_chunk, chunk_index, chunk_count, on_match, coverage)
+            for chunk_index, job_chunk in enumerate(job_chunks)
+        ]
+        for job_chunk, future in zip(job_chunks, futures):
+            try:
+                matched_results.extend(future.result())
+            except gemini_resilience.GeminiUnavailableError as e:
+                if e.systemic:
+                    # Gemini is down for all chunks alike: do not wait for (or start) the rest
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    raise
+                # Only this chunk failed (e.g. a rejected request or an unparseable response)
+                print(f"WARNING: [match_jobs] Chunk failed: {e}. Reporting its {len(job_chunk)} job(s) as missing.")
+                chunk_error = e
+                failed_chunk_count += 1
+                if coverage is not None:
+                    coverage.add(jobs_requested=len(job_chunk), missing=len(job_chunk))
+            except Exception as e:
+                # A broken chunk must not take the other chunks down with it.
+                print(f"ERROR: [match_jobs] Chunk failed unexpectedly: {e}. Simulating it on its own.")
+                simulated_matches = simulate_match_jobs(structured_user_profile, job_chunk, None, f"Chunk processing error: {e}")
+                if coverage is not None:
+                    coverage.add(jobs_requested=len(job_chunk), simulated=len(job_chunk))
+                if on_match is not None:
+                    # The failed chunk may have emitted some of its jobs already; duplicates are the caller's to ignore
+                    for match in simulated_matches:
+                        on_match(match)
+                matched_results.extend(simulated_matches)
+
+    if failed_chunk_count == chunk_count:
+        raise chunk_error
+    matched_results.sort(key=lambda x: x['score'], reverse=True)
+    return matched_results
 # --- Enhanced Job Matching (based on Structured User Profile) --- END ---
 
 # --- Cover Letter Generation ---
@@ -462,6 +1020,10 @@ def simulate_generate_cover_letter(skills_text, job, error_message=None):
     """Simulates cover letter generation."""
     print(f"INFO: Executing SIMULATED cover letter generation for job: {job['job_title']}")
     sim_text = f"(Simulated Cover Letter for {job['job_title']} at {job['company_name']}) Based on your skills in {skills_text[:50]}..., this job seems like a good fit because... (simulated reason)."
+    # Load tests can make the response size scale with the prompt
+    filler = simulation_backend.filler_text(simulation_backend.current_response_tokens())
+    if filler:
+        sim_text += "\n\n" + filler
     if error_message:
         sim_text += f" (SimError: {error_message})"
     return sim_text
@@ -513,6 +1075,9 @@ def _parse_custom_resume_response(api_response_text, api_response_object=None):
 def simulate_generate_custom_resume(user_cv_text, job, error_message=None):
     print(f"INFO: Executing SIMULATED custom resume generation for job: {job.get('job_title')}")
     sim_text = f"(Simulated Custom Resume for {job.get('job_title')} at {job.get('company_name')})\n" + user_cv_text[:500] + "...\n[Resume optimized for target job. Simulated output.]"
+    filler = simulation_backend.filler_text(simulation_backend.current_response_tokens())
+    if filler:
+        sim_text += "\n\n" + filler
     if error_message:
         sim_text += f" (SimError: {error_message})"
     return sim_text
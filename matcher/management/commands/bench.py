@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.benchmarks import PATHS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the hot views and import_jobs on synthetic datasets (in a throw-away test database, '
+        'with Supabase and Gemini stubbed locally) and reports p50/p95 latency, query counts and peak memory as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='Comma-separated JobListing counts, e.g. 1000,10000,100000')
+        parser.add_argument('--paths', default=','.join(PATHS), help=f'Comma-separated subset of: {", ".join(PATHS)}')
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--sessions', type=int, default=20, help='Match sessions of the benchmark user')
+        parser.add_argument('--matches-per-session', type=int, default=50)
+        parser.add_argument('--saved-jobs', type=int, default=200, help='Saved jobs (each with a cover letter and resume)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError(f"--sizes must be comma-separated integers, got '{options['sizes']}'")
+        paths = [path.strip() for path in options['paths'].split(',') if path.strip()]
+        unknown_paths = set(paths) - set(PATHS)
+        if unknown_paths:
+            raise CommandError(f"Unknown paths: {', '.join(sorted(unknown_paths))}")
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        report = run_benchmarks(
+            sizes,
+            paths=paths,
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            sessions=options['sessions'],
+            matches_per_session=options['matches_per_session'],
+            saved_jobs=options['saved_jobs'],
+            log=lambda message: self.stderr.write(message),
+        )
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(report_json + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(report_json)
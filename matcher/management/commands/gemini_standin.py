@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.services.gemini_standin import GeminiStandInServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts a local stand-in for the Gemini generateContent/streamGenerateContent REST API. '
+        'Run the app with GEMINI_API_ENDPOINT=http://HOST:PORT and USE_SIMULATION_ENV=False to use it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay-ms', type=float, default=0, help='Delay before every response')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Uniform random delay added to --delay-ms')
+        parser.add_argument('--stream-chunks', type=int, default=4, help='Pieces a streamed response is split into')
+        parser.add_argument('--chunk-delay-ms', type=float, default=0, help='Delay between streamed pieces')
+        parser.add_argument(
+            '--canned', help='JSON file with a list of {"match": "prompt substring", "response": "text"} rules'
+        )
+        parser.add_argument('--quiet', action='store_true', help='Do not log every request')
+
+    def handle(self, *args, **options):
+        canned_rules = []
+        if options['canned']:
+            try:
+                with open(options['canned'], encoding='utf-8') as canned_file:
+                    canned_rules = json.load(canned_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read canned responses from {options['canned']}: {e}")
+
+        server = GeminiStandInServer(
+            (options['host'], options['port']),
+            delay_ms=options['delay_ms'],
+            jitter_ms=options['jitter_ms'],
+            stream_chunks=options['stream_chunks'],
+            chunk_delay_ms=options['chunk_delay_ms'],
+            canned_rules=canned_rules,
+            quiet=options['quiet'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Gemini stand-in listening on {server.endpoint}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Served {server.request_count} requests.')
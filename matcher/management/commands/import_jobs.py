@@ -1,4 +1,5 @@
 import csv
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.utils.dateparse import parse_datetime
 from django.conf import settings
@@ -8,8 +9,11 @@ import os
 class Command(BaseCommand):
     help = 'Imports job listings from job_listings_rows.csv into the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', dest='csv_file_path', help='CSV file to import (default: job_listings_rows.csv in the project root)')
+
     def handle(self, *args, **options):
-        csv_file_path = os.path.join(settings.BASE_DIR, 'job_listings_rows.csv')
+        csv_file_path = options.get('csv_file_path') or os.path.join(settings.BASE_DIR, 'job_listings_rows.csv')
 
         if not os.path.exists(csv_file_path):
             self.stdout.write(self.style.ERROR(f'CSV file not found at: {csv_file_path}'))
@@ -79,6 +83,9 @@ class Command(BaseCommand):
                     )
                     count += 1
             self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} job listings.'))
+
+            # Keep the semantic pre-ranking store in step with the imported listings
+            call_command('index_job_vectors', stdout=self.stdout)
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f'ERROR: CSV file not found at {csv_file_path}'))
         except Exception as e:
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from matcher.models import JobListing
+from matcher.services import job_vectors
+from matcher.utils import JOB_CONTENT_HASH_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Embeds new or changed job listings into the local job-vector store and drops vectors of deleted jobs'
+
+    def handle(self, *args, **options):
+        store = job_vectors.get_shared_store()
+        job_ids = set()
+        embedded = 0
+        batch = []
+        for job in JobListing.objects.only('id', *JOB_CONTENT_HASH_FIELDS).iterator(chunk_size=1000):
+            job_ids.add(str(job.id))
+            batch.append(job)
+            if len(batch) >= 1000:
+                embedded += store.upsert(batch)
+                batch = []
+        if batch:
+            embedded += store.upsert(batch)
+        removed = store.remove(set(store.job_ids()) - job_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Embedded {embedded} job listings, removed {removed} stale vectors; the store holds {len(store)} jobs.'
+        ))
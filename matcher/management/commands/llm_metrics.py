@@ -0,0 +1,36 @@
+import json
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.services import llm_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints a summary of the LLM call metrics (calls, latency percentiles, tokens, parse failures, '
+        'cache hits, fallbacks) of a running server, read from its /metrics/llm endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/metrics/llm', help='Metrics endpoint of the server')
+        parser.add_argument('--token', default=settings.METRICS_AUTH_TOKEN, help='Defaults to METRICS_AUTH_TOKEN')
+        parser.add_argument('--prometheus', action='store_true', help='Print the Prometheus text instead of a table')
+
+    def handle(self, *args, **options):
+        separator = '&' if '?' in options['url'] else '?'
+        request = Request(f"{options['url']}{separator}format=json")
+        if options['token']:
+            request.add_header('Authorization', f"Bearer {options['token']}")
+        try:
+            with urlopen(request, timeout=10) as response:
+                metrics = json.loads(response.read())
+        except (URLError, ValueError) as e:
+            raise CommandError(f"Could not read metrics from {options['url']}: {e}")
+
+        if options['prometheus']:
+            self.stdout.write(llm_metrics.render_prometheus(metrics), ending='')
+        else:
+            self.stdout.write(llm_metrics.format_summary(metrics))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.services.supabase_standin import DEFAULT_JWT_SECRET, SupabaseStandInServer, generate_job_rows, load_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts a local stand-in for the Supabase REST (job_listings, job_anomaly_analysis) and auth '
+        '(anonymous sign-in, get_user) endpoints. Run the app with the SUPABASE_URL and SUPABASE_KEY it prints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=54321)
+        parser.add_argument(
+            '--seed', action='append', default=[], metavar='TABLE=PATH',
+            help='Load a table from a CSV or JSON file; may be repeated'
+        )
+        parser.add_argument(
+            '--generate-jobs', type=int, default=0,
+            help='Add this many synthetic job_listings created today, each with a job_anomaly_analysis row'
+        )
+        parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+        parser.add_argument('--latency-per-row-us', type=float, default=0, help='Extra delay per row in the queried table')
+        parser.add_argument('--jwt-secret', default=DEFAULT_JWT_SECRET)
+        parser.add_argument('--quiet', action='store_true', help='Do not log every request')
+
+    def handle(self, *args, **options):
+        tables = {'job_listings': [], 'job_anomaly_analysis': []}
+        for seed in options['seed']:
+            table, separator, path = seed.partition('=')
+            if not separator:
+                raise CommandError(f"--seed expects TABLE=PATH, got '{seed}'")
+            try:
+                tables.setdefault(table, []).extend(load_rows(path))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not load {table} from {path}: {e}")
+        if options['generate_jobs']:
+            job_rows, anomaly_rows = generate_job_rows(options['generate_jobs'])
+            tables['job_listings'].extend(job_rows)
+            tables['job_anomaly_analysis'].extend(anomaly_rows)
+
+        server = SupabaseStandInServer(
+            (options['host'], options['port']),
+            tables=tables,
+            latency_ms=options['latency_ms'],
+            latency_per_row_us=options['latency_per_row_us'],
+            jwt_secret=options['jwt_secret'],
+            quiet=options['quiet'],
+        )
+        for table, rows in tables.items():
+            self.stdout.write(f'  {table}: {len(rows)} rows')
+        self.stdout.write(self.style.SUCCESS(f'Supabase stand-in listening on {server.url}'))
+        self.stdout.write(f'  SUPABASE_URL={server.url}')
+        self.stdout.write(f'  SUPABASE_KEY={server.anon_key}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Served {server.request_count} requests.')
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matcher.services.job_sync_service import sync_job_listings
+
+
+class Command(BaseCommand):
+    help = (
+        'Syncs the Supabase job_listings table into the local JobListing mirror: only rows created after '
+        'the stored watermark, bulk-upserted by content hash, with periodic reconciles for edits and deletions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Reconcile the whole JOB_SYNC_RECONCILE_DAYS window')
+        parser.add_argument('--every', type=int, default=0, metavar='SECONDS', help='Keep running, syncing every SECONDS')
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            try:
+                result = sync_job_listings(full=full)
+            except Exception as e:
+                if not options['every']:
+                    raise
+                self.stderr.write(self.style.ERROR(f"Sync failed: {e}"))
+            else:
+                if result is None:
+                    self.stdout.write(self.style.WARNING('Another sync is running; skipped.'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{result['mode'].capitalize()} sync: {result['fetched']} fetched, {result['created']} created, "
+                        f"{result['updated']} updated, {result['unchanged']} unchanged, {result['deactivated']} deactivated."
+                    ))
+            if not options['every']:
+                return
+            full = False
+            time.sleep(options['every'])
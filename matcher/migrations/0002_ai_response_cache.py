@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AIResponseCacheEntry",
+            fields=[
+                (
+                    "cache_key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("task_name", models.CharField(db_index=True, max_length=100)),
+                ("model_name", models.CharField(max_length=100)),
+                ("response_text", models.TextField()),
+                ("hit_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                ("last_accessed_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.DeleteModel(
+            name="JobAnomalyAnalysis",
+        ),
+    ]
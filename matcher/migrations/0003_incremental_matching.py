@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0002_ai_response_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchedjob",
+            name="job_content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="matchsession",
+            name="profile_fingerprint",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+    ]
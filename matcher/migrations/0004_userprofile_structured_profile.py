@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0003_incremental_matching"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="structured_profile_fingerprint",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="structured_profile_json",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="structured_profile_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
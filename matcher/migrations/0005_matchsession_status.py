@@ -0,0 +1,57 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+def mark_existing_sessions_done(apps, schema_editor):
+    # Sessions created before background matching were always complete when saved.
+    MatchSession = apps.get_model("matcher", "MatchSession")
+    MatchSession.objects.update(status="done", completed_at=models.F("matched_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0004_userprofile_structured_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchsession",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="matchsession",
+            name="error_message",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="matchsession",
+            name="jobs_total",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="matchsession",
+            name="progress_message",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="matchsession",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="queued",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(
+            mark_existing_sessions_done, reverse_code=migrations.RunPython.noop
+        ),
+    ]
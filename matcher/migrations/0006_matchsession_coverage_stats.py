@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0005_matchsession_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchsession",
+            name="coverage_stats",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
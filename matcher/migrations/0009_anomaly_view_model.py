@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0008_job_listing_mirror"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnomalyViewModel",
+            fields=[
+                (
+                    "job_id",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("schema_version", models.PositiveSmallIntegerField()),
+                ("source_hash", models.CharField(max_length=64)),
+                ("data", models.JSONField(blank=True, null=True)),
+                ("compiled_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
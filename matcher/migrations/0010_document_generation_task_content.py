@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0009_anomaly_view_model"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentgenerationtask",
+            name="content",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
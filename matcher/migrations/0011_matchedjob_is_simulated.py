@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0010_document_generation_task_content"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchedjob",
+            name="is_simulated",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -23,6 +23,11 @@ class UserProfile(models.Model):
     cv_file = models.FileField(upload_to=user_cv_path, blank=True, null=True)
     user_preferences_text = models.TextField(blank=True, null=True)
     user_email = models.EmailField(blank=True, null=True) 
+    # Cached output of gemini_utils.extract_user_profile, valid while structured_profile_fingerprint
+    # matches the hash of (user_cv_text, user_preferences_text, prompt version)
+    structured_profile_json = models.JSONField(null=True, blank=True)
+    structured_profile_fingerprint = models.CharField(max_length=64, blank=True, default='')
+    structured_profile_updated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -46,24 +51,55 @@ class JobListing(models.Model):
     status = models.CharField(max_length=50, null=True, blank=True) 
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    # Local mirror of the Supabase job_listings table (see services/job_sync_service.py)
+    source_created_at = models.DateTimeField(null=True, blank=True, db_index=True) # created_at in Supabase
+    content_hash = models.CharField(max_length=64, blank=True, default='') # compute_job_content_hash at the last sync
+    is_active = models.BooleanField(default=True, db_index=True) # False once the listing was deleted upstream
+    synced_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.job_title} at {self.company_name}"
 
 class MatchSession(models.Model):
     """Stores a specific matching session, including the skills input used."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    IN_PROGRESS_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     skills_text = models.TextField()
     user_preferences_text = models.TextField(null=True, blank=True)
     structured_user_profile_json = models.JSONField(null=True, blank=True)
+    # Hash of structured_user_profile_json, used to reuse scores of unchanged jobs across sessions
+    profile_fingerprint = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Matching runs in the background; clients poll the status endpoint until it is done or failed
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    progress_message = models.CharField(max_length=255, blank=True, default='')
+    jobs_total = models.IntegerField(default=0) # Number of jobs being matched in this session
+    # How completely the model answered (see gemini_utils.MatchCoverage), recorded when matching finishes
+    coverage_stats = models.JSONField(null=True, blank=True)
+    error_message = models.TextField(blank=True, null=True)
     matched_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
     # session_key is obsolete and has been removed.
 
     def __str__(self):
         preferences_snippet = self.user_preferences_text[:30] + "..." if self.user_preferences_text else "No preferences"
         return f"Match on {self.matched_at.strftime('%Y-%m-%d %H:%M')} | CV: {self.skills_text[:30]}... | Prefs: {preferences_snippet}"
 
+    @property
+    def is_in_progress(self):
+        return self.status in self.IN_PROGRESS_STATUSES
+
     def get_structured_profile(self):
         if self.structured_user_profile_json:
             if isinstance(self.structured_user_profile_json, str):
@@ -82,6 +118,8 @@ class MatchedJob(models.Model):
     reason = models.TextField(blank=True, null=True) # Reason from Gemini
     insights = models.TextField(blank=True, null=True) # New field for 'job_insights'
     tips = models.TextField(blank=True, null=True) # New field for 'application_tips'
+    job_content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True) # Hash of the job content that was scored
+    is_simulated = models.BooleanField(default=False) # Score came from the simulation (or its fallback), not from Gemini
 
     class Meta:
         # Ensure a job is only listed once per match session
@@ -137,6 +175,103 @@ class CustomResume(models.Model):
     def __str__(self):
         return f"Custom Resume for {self.job_listing.job_title} by {self.user.username}"
 
+class DocumentGenerationTask(models.Model):
+    """
+    Background generation of a cover letter or tailored resume for one (user, job) pair.
+    There is at most one task per pair and kind; concurrent requests attach to it.
+    """
+    KIND_COVER_LETTER = 'cover_letter'
+    KIND_CUSTOM_RESUME = 'custom_resume'
+    KIND_CHOICES = [
+        (KIND_COVER_LETTER, 'Cover Letter'),
+        (KIND_CUSTOM_RESUME, 'Custom Resume'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    IN_PROGRESS_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    job_listing = models.ForeignKey(JobListing, on_delete=models.CASCADE, related_name='document_generation_tasks')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error_message = models.TextField(blank=True, null=True)
+    # Pre-generated cover letter for a job the user has not opened yet (no SavedJob to attach
+    # it to); moved into a CoverLetter by attach_pregenerated_documents
+    content = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'job_listing', 'kind')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.job_listing_id} by {self.user_id} ({self.status})"
+
+    @property
+    def is_in_progress(self):
+        return self.status in self.IN_PROGRESS_STATUSES
+
+class PregenerationBudget(models.Model):
+    """Estimated tokens spent on document pre-generation for one user on one day (see services/pregeneration_service.py)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='pregeneration_budgets')
+    day = models.DateField()
+    tokens_spent = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'day')
+
+    def __str__(self):
+        return f"{self.tokens_spent} pre-generation tokens of user {self.user_id} on {self.day}"
+
+class AIResponseCacheEntry(models.Model):
+    """Raw Gemini response cached under a hash of (task name, model name, prompt)."""
+    cache_key = models.CharField(max_length=64, primary_key=True) # sha256 hex digest
+    task_name = models.CharField(max_length=100, db_index=True)
+    model_name = models.CharField(max_length=100)
+    response_text = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    last_accessed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Cached {self.task_name} response ({self.cache_key[:12]}...)"
+
+class SyncState(models.Model):
+    """Progress of an incremental sync from Supabase, e.g. the created_at watermark of job_listings."""
+    name = models.CharField(max_length=100, primary_key=True)
+    watermark = models.DateTimeField(null=True, blank=True) # Newest source created_at seen so far
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True) # Last reconcile of updates and deletions
+    last_result = models.JSONField(null=True, blank=True) # Counters of the last run
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sync state of {self.name} (watermark {self.watermark})"
+
+class AnomalyViewModel(models.Model):
+    """
+    Render-ready anomaly analysis of a job, compiled once from its Supabase job_anomaly_analysis
+    row (see services/anomaly_view_models.py) so that views do no JSON parsing.
+    """
+    job_id = models.CharField(max_length=50, primary_key=True)
+    schema_version = models.PositiveSmallIntegerField() # Layout of data; older versions are recompiled
+    source_hash = models.CharField(max_length=64) # sha256 of the analysis_data it was compiled from
+    data = models.JSONField(null=True, blank=True) # top_similar_roles, top_anomalies, ...; null if the source was invalid
+    compiled_at = models.DateTimeField(db_index=True) # Last time the source was checked against Supabase
+
+    def __str__(self):
+        return f"Anomaly view model of {self.job_id} (schema v{self.schema_version})"
+
 # class JobAnomalyAnalysis(models.Model):
 #     job_listing = models.OneToOneField(
 #         JobListing,
@@ -0,0 +1,115 @@
+"""
+Persistent, content-addressed cache for Gemini responses.
+
+Entries live in the database (AIResponseCacheEntry), so they survive restarts and are
+shared by every gunicorn worker. Only tasks listed in settings.AI_RESPONSE_CACHE_TASK_TTLS
+are cached. Cache failures never break the AI call; they are logged and treated as misses.
+"""
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import AIResponseCacheEntry
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0})
+
+
+def _record(task_name, counter, amount=1):
+    with _stats_lock:
+        _stats[task_name][counter] += amount
+
+
+def get_cache_stats():
+    """Returns this process's hit/miss/store/eviction counters per task name."""
+    with _stats_lock:
+        return {task_name: dict(counters) for task_name, counters in _stats.items()}
+
+
+def get_task_ttl(task_name):
+    """Returns the TTL in seconds for task_name, or None if the task is not cached."""
+    if not settings.AI_RESPONSE_CACHE_ENABLED:
+        return None
+    return settings.AI_RESPONSE_CACHE_TASK_TTLS.get(task_name)
+
+
+def make_cache_key(task_name, model_name, prompt):
+    digest = hashlib.sha256()
+    for part in (task_name, model_name, prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def get_cached_response(task_name, model_name, prompt):
+    """Returns the cached response text for this prompt, or None on a miss."""
+    if get_task_ttl(task_name) is None:
+        return None
+    cache_key = make_cache_key(task_name, model_name, prompt)
+    now = timezone.now()
+    try:
+        entry = AIResponseCacheEntry.objects.filter(cache_key=cache_key).only('response_text', 'expires_at').first()
+        if entry is None or entry.expires_at <= now:
+            if entry is not None:
+                AIResponseCacheEntry.objects.filter(cache_key=cache_key).delete()
+            _record(task_name, 'misses')
+            return None
+        AIResponseCacheEntry.objects.filter(cache_key=cache_key).update(
+            hit_count=F('hit_count') + 1,
+            last_accessed_at=now
+        )
+    except Exception as e:
+        print(f"WARNING: AI response cache lookup failed for {task_name}: {e}")
+        _record(task_name, 'misses')
+        return None
+    _record(task_name, 'hits')
+    return entry.response_text
+
+
+def store_response(task_name, model_name, prompt, response_text):
+    """Stores a successfully parsed response and evicts least recently used entries if needed."""
+    ttl = get_task_ttl(task_name)
+    if ttl is None or not response_text:
+        return
+    now = timezone.now()
+    try:
+        AIResponseCacheEntry.objects.update_or_create(
+            cache_key=make_cache_key(task_name, model_name, prompt),
+            defaults={
+                'task_name': task_name,
+                'model_name': model_name,
+                'response_text': response_text,
+                'expires_at': now + timedelta(seconds=ttl),
+                'last_accessed_at': now,
+            }
+        )
+        _record(task_name, 'stores')
+        _evict_if_needed(task_name)
+    except Exception as e:
+        print(f"WARNING: Could not store AI response in cache for {task_name}: {e}")
+
+
+def invalidate_response(task_name, model_name, prompt):
+    """Drops a cached response, e.g. when it can no longer be parsed."""
+    try:
+        AIResponseCacheEntry.objects.filter(cache_key=make_cache_key(task_name, model_name, prompt)).delete()
+    except Exception as e:
+        print(f"WARNING: Could not invalidate cached AI response for {task_name}: {e}")
+
+
+def _evict_if_needed(task_name):
+    max_entries = settings.AI_RESPONSE_CACHE_MAX_ENTRIES
+    AIResponseCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+    overflow = AIResponseCacheEntry.objects.count() - max_entries
+    if overflow <= 0:
+        return
+    stale_keys = list(
+        AIResponseCacheEntry.objects.order_by('last_accessed_at').values_list('cache_key', flat=True)[:overflow]
+    )
+    deleted, _ = AIResponseCacheEntry.objects.filter(cache_key__in=stale_keys).delete()
+    _record(task_name, 'evictions', deleted)
@@ -0,0 +1,125 @@
+"""
+Per-job cache in front of the job_anomaly_analysis lookups of the session and job detail views.
+
+Analysis rows rarely change, so they are kept for ANOMALY_CACHE_TTL_SECONDS in the 'anomaly'
+cache (shared by all workers, but separate from the 'shared' cache so it cannot crowd out its
+breaker and lock state), so a row fetched by one worker serves all of them, and for at most
+ANOMALY_CACHE_LOCAL_TTL_SECONDS in a bounded in-process LRU (ANOMALY_CACHE_LOCAL_MAX_ENTRIES)
+that saves the shared-cache round trip on hot jobs. Jobs without an analysis are cached as negative
+entries for ANOMALY_CACHE_NEGATIVE_TTL_SECONDS. A lookup for many IDs only sends the IDs
+missing from both tiers to Supabase, in one query. Failed queries are not cached.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .job_listing_service import query_anomaly_analysis_for_jobs
+
+ANOMALY_CACHE_ALIAS = 'anomaly'
+CACHE_KEY_PREFIX = 'anomaly_analysis:'
+# Stored for jobs that have no analysis row, so that they are not looked up on every view
+NO_ANALYSIS = '__no_analysis__'
+
+
+class LocalTTLCache:
+    """Thread-safe LRU of at most max_entries values, each expiring after its own TTL."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, values, timeout):
+        expires_at = time.monotonic() + timeout
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_local_cache = LocalTTLCache(settings.ANOMALY_CACHE_LOCAL_MAX_ENTRIES)
+
+
+def _cache_key(job_id):
+    return f"{CACHE_KEY_PREFIX}{job_id}"
+
+
+def _store(values, timeout):
+    if values and timeout > 0:
+        _local_cache.set_many(values, min(timeout, settings.ANOMALY_CACHE_LOCAL_TTL_SECONDS))
+        caches[ANOMALY_CACHE_ALIAS].set_many(values, timeout=timeout)
+
+
+def get_anomaly_analysis_for_jobs(supabase, job_ids):
+    """
+    Drop-in replacement for fetch_anomaly_analysis_for_jobs_from_supabase:
+    job_listing_id -> job_anomaly_analysis row, for the jobs that have one.
+    """
+    keys = {_cache_key(job_id): str(job_id) for job_id in dict.fromkeys(job_ids)}
+    cached = _local_cache.get_many(keys)
+    shared_misses = [key for key in keys if key not in cached]
+    if shared_misses:
+        shared_hits = caches[ANOMALY_CACHE_ALIAS].get_many(shared_misses)
+        if shared_hits:
+            _local_cache.set_many(shared_hits, settings.ANOMALY_CACHE_LOCAL_TTL_SECONDS)
+            cached.update(shared_hits)
+
+    missing_job_ids = [job_id for key, job_id in keys.items() if key not in cached]
+    if missing_job_ids and supabase:
+        try:
+            fetched = query_anomaly_analysis_for_jobs(supabase, missing_job_ids)
+        except Exception as e:
+            print(f"ERROR: Could not fetch anomaly analysis from Supabase for jobs {missing_job_ids}: {e}")
+            fetched = None
+        if fetched is not None:
+            found = {_cache_key(job_id): fetched[job_id] for job_id in missing_job_ids if job_id in fetched}
+            not_found = {_cache_key(job_id): NO_ANALYSIS for job_id in missing_job_ids if job_id not in fetched}
+            _store(found, settings.ANOMALY_CACHE_TTL_SECONDS)
+            _store(not_found, settings.ANOMALY_CACHE_NEGATIVE_TTL_SECONDS)
+            cached.update(found)
+    elif missing_job_ids:
+        print("ERROR: Supabase client not available in get_anomaly_analysis_for_jobs.")
+
+    return {keys[key]: row for key, row in cached.items() if row != NO_ANALYSIS}
+
+
+def invalidate_anomaly_analysis(job_ids):
+    keys = [_cache_key(job_id) for job_id in job_ids]
+    _local_cache.delete_many(keys)
+    caches[ANOMALY_CACHE_ALIAS].delete_many(keys)
+
+
+def clear_local_cache():
+    _local_cache.clear()
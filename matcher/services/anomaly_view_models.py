@@ -0,0 +1,95 @@
+"""
+Render-ready anomaly analysis per job.
+
+The raw job_anomaly_analysis rows hold nested (often doubly JSON-encoded) data that
+utils.parse_anomaly_analysis turns into top similar roles, top anomalies and the baseline
+composition. That is done once per row here, when sync_jobs pulls new listings or when a view
+first meets a job, and the result is stored on AnomalyViewModel with a schema version. Views
+read the stored structures; rows compiled by an older ANOMALY_VIEW_MODEL_SCHEMA_VERSION, or
+checked longer than ANOMALY_CACHE_TTL_SECONDS ago, are fetched (through anomaly_cache) and
+recompiled only if their source changed.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import AnomalyViewModel
+from ..utils import parse_anomaly_analysis
+from .anomaly_cache import get_anomaly_analysis_for_jobs
+from .job_listing_service import query_anomaly_analysis_for_jobs
+
+# Bump when the output of compile_anomaly_analysis changes shape
+ANOMALY_VIEW_MODEL_SCHEMA_VERSION = 1
+# Job IDs per Supabase query when refreshing after a sync (keeps the in.() filter URL short)
+REFRESH_BATCH_SIZE = 100
+
+
+def compute_analysis_hash(analysis_data):
+    canonical = json.dumps(analysis_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def compile_anomaly_analysis(analysis_data):
+    return parse_anomaly_analysis(analysis_data)
+
+
+def compile_anomaly_rows(analysis_rows, now=None):
+    """
+    Compiles job_listing_id -> job_anomaly_analysis row into AnomalyViewModel rows, reusing the
+    stored result where schema version and source hash still match. Returns job_id -> view model.
+    """
+    now = now or timezone.now()
+    sources = {
+        str(job_id): row['analysis_data'] for job_id, row in analysis_rows.items() if row and 'analysis_data' in row
+    }
+    existing = {
+        view_model.job_id: view_model for view_model in AnomalyViewModel.objects.filter(
+            job_id__in=list(sources), schema_version=ANOMALY_VIEW_MODEL_SCHEMA_VERSION
+        )
+    }
+    view_models = []
+    for job_id, analysis_data in sources.items():
+        source_hash = compute_analysis_hash(analysis_data)
+        previous = existing.get(job_id)
+        data = previous.data if previous and previous.source_hash == source_hash else compile_anomaly_analysis(analysis_data)
+        view_models.append(AnomalyViewModel(
+            job_id=job_id,
+            schema_version=ANOMALY_VIEW_MODEL_SCHEMA_VERSION,
+            source_hash=source_hash,
+            data=data,
+            compiled_at=now,
+        ))
+    if view_models:
+        AnomalyViewModel.objects.bulk_create(
+            view_models,
+            update_conflicts=True,
+            unique_fields=['job_id'],
+            update_fields=['schema_version', 'source_hash', 'data', 'compiled_at'],
+        )
+    return {view_model.job_id: view_model.data for view_model in view_models}
+
+
+def get_anomaly_view_models(supabase, job_ids):
+    """job_id -> compiled anomaly analysis (see parse_anomaly_analysis) for the jobs that have one."""
+    job_ids = [str(job_id) for job_id in dict.fromkeys(job_ids)]
+    fresh_after = timezone.now() - timedelta(seconds=settings.ANOMALY_CACHE_TTL_SECONDS)
+    view_models = dict(AnomalyViewModel.objects.filter(
+        job_id__in=job_ids, schema_version=ANOMALY_VIEW_MODEL_SCHEMA_VERSION, compiled_at__gte=fresh_after
+    ).values_list('job_id', 'data'))
+    missing_job_ids = [job_id for job_id in job_ids if job_id not in view_models]
+    if missing_job_ids:
+        view_models.update(compile_anomaly_rows(get_anomaly_analysis_for_jobs(supabase, missing_job_ids)))
+    return view_models
+
+
+def refresh_anomaly_view_models(supabase, job_ids):
+    """Fetches and compiles the analysis of job_ids straight from Supabase, e.g. after a sync. Returns the count."""
+    job_ids = [str(job_id) for job_id in job_ids]
+    compiled = 0
+    for start in range(0, len(job_ids), REFRESH_BATCH_SIZE):
+        analysis_rows = query_anomaly_analysis_for_jobs(supabase, job_ids[start:start + REFRESH_BATCH_SIZE])
+        compiled += len(compile_anomaly_rows(analysis_rows))
+    return compiled
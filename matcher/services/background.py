@@ -0,0 +1,110 @@
+"""
+Small in-process background executor for work that must not block a request,
+such as LLM calls whose result is only needed later.
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+_executor = None
+_low_priority_executor = None
+_executor_lock = threading.Lock()
+_active_tasks = 0  # Submitted to _executor and not finished yet
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_WORKERS,
+                thread_name_prefix='matcher_background'
+            )
+        return _executor
+
+
+def _get_low_priority_executor():
+    global _low_priority_executor
+    with _executor_lock:
+        if _low_priority_executor is None:
+            _low_priority_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='matcher_low_priority')
+        return _low_priority_executor
+
+
+def _change_active_tasks(delta):
+    global _active_tasks
+    with _executor_lock:
+        _active_tasks += delta
+
+
+def is_idle():
+    """True if no regular background task is queued or running in this process."""
+    with _executor_lock:
+        return _active_tasks == 0
+
+
+def _run_task(func, args, kwargs, counted=False):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        print(f"ERROR: Background task {func.__name__} failed: {e}")
+        print(traceback.format_exc())
+        raise
+    finally:
+        if counted:
+            _change_active_tasks(-1)
+        # Each pool thread holds its own DB connection; release it after every task.
+        connection.close()
+
+
+def _run_inline(func, args, kwargs):
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        print(f"ERROR: Background task {func.__name__} failed: {e}")
+        future.set_exception(e)
+    return future
+
+
+def submit(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on the background executor and returns a Future.
+    With settings.BACKGROUND_TASKS_EAGER the function runs inline instead.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        return _run_inline(func, args, kwargs)
+    _change_active_tasks(1)
+    try:
+        return _get_executor().submit(_run_task, func, args, kwargs, True)
+    except Exception:
+        _change_active_tasks(-1)
+        raise
+
+
+def submit_low_priority(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on a single low-priority thread, one task at a time, and returns
+    a Future. Such tasks should call is_idle() (or wait_until_idle()) before each expensive step
+    so they only use capacity that user-facing work does not need.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        return _run_inline(func, args, kwargs)
+    return _get_low_priority_executor().submit(_run_task, func, args, kwargs)
+
+
+def wait_until_idle(timeout, should_stop=None, poll_interval=1.0):
+    """
+    Blocks until is_idle(). Returns False if timeout seconds passed first or should_stop()
+    returned True while waiting.
+    """
+    deadline = time.monotonic() + timeout
+    while not is_idle():
+        if (should_stop is not None and should_stop()) or time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+    return True
@@ -0,0 +1,179 @@
+"""
+Background generation of cover letters and tailored resumes.
+
+Generation is keyed by (user, job, kind): request_document_generation either starts a
+DocumentGenerationTask on the background executor or, if one is already pending or running
+for the same pair, attaches to it, so double-clicks and crawlers never pay for the same
+document twice. The pages render a pending state and poll the status endpoint.
+
+Pre-generated cover letters (see pregeneration_service) for jobs the user has not opened yet
+are kept on their task instead of creating a SavedJob; attach_pregenerated_documents moves
+them into a CoverLetter once the user opens the job.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .. import gemini_utils
+from ..models import CoverLetter, CustomResume, DocumentGenerationTask, SavedJob, UserProfile
+from . import background
+from .gemini_resilience import GeminiUnavailableError
+
+# Prefixes gemini_utils uses for text that is an error message rather than a document
+GENERATION_ERROR_PREFIXES = ("(Error generating", "Could not generate", "Please enter your skills")
+GENERATION_FAILED_MESSAGE = "Generation failed unexpectedly. Please try again."
+
+
+def job_listing_to_dict(job):
+    return {
+        'id': job.id,
+        'company_name': job.company_name,
+        'job_title': job.job_title,
+        'description': job.description,
+        'application_url': job.application_url,
+        'location': job.location,
+        'industry': job.industry,
+        'flexibility': job.flexibility,
+        'salary_range': job.salary_range,
+        'level': job.level,
+    }
+
+
+def get_document_content(user, job_listing, kind):
+    """Returns the stored document text for (user, job, kind), or None."""
+    if kind == DocumentGenerationTask.KIND_COVER_LETTER:
+        cover_letter = CoverLetter.objects.filter(saved_job__user=user, saved_job__job_listing=job_listing).first()
+        if cover_letter:
+            return cover_letter.content
+        return DocumentGenerationTask.objects.filter(
+            user=user, job_listing=job_listing, kind=kind, content__isnull=False
+        ).values_list('content', flat=True).first()
+    custom_resume = CustomResume.objects.filter(user=user, job_listing=job_listing).first()
+    return custom_resume.content if custom_resume else None
+
+
+def _save_document(task, content, pregenerated=False):
+    if task.kind != DocumentGenerationTask.KIND_COVER_LETTER:
+        CustomResume.objects.update_or_create(user=task.user, job_listing=task.job_listing, defaults={'content': content})
+        return
+    saved_job = SavedJob.objects.filter(user=task.user, job_listing=task.job_listing).first()
+    if saved_job is None and pregenerated:
+        # The user has not opened this job; do not list it under their applications
+        task.content = content
+        return
+    if saved_job is None:
+        saved_job, _ = SavedJob.objects.get_or_create(
+            user=task.user,
+            job_listing=task.job_listing,
+            defaults={'status': 'viewed'}
+        )
+    CoverLetter.objects.update_or_create(saved_job=saved_job, defaults={'content': content})
+    task.content = None
+
+
+def attach_pregenerated_documents(saved_job):
+    """Moves a cover letter pre-generated for saved_job's job into a CoverLetter, unless it has one."""
+    task = DocumentGenerationTask.objects.filter(
+        user_id=saved_job.user_id,
+        job_listing_id=saved_job.job_listing_id,
+        kind=DocumentGenerationTask.KIND_COVER_LETTER,
+        content__isnull=False
+    ).first()
+    if task is None:
+        return False
+    CoverLetter.objects.get_or_create(saved_job=saved_job, defaults={'content': task.content})
+    DocumentGenerationTask.objects.filter(pk=task.pk).update(content=None)
+    return True
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=settings.DOCUMENT_GENERATION_STALE_AFTER_SECONDS)
+
+
+def get_task(user, job_listing, kind):
+    return DocumentGenerationTask.objects.filter(user=user, job_listing=job_listing, kind=kind).first()
+
+
+def is_task_active(task):
+    """True if task is pending or running and has not been abandoned (e.g. by a worker restart)."""
+    return task is not None and task.is_in_progress and task.updated_at >= _stale_cutoff()
+
+
+def _enqueue(task):
+    transaction.on_commit(lambda: background.submit(run_document_generation, task.id))
+
+
+def claim_document_generation(user, job_listing, kind):
+    """
+    Marks the generation for (user, job, kind) as pending unless one is already in flight.
+    Returns (task, claimed); only a caller that got claimed=True may run the task.
+    """
+    task, created = DocumentGenerationTask.objects.get_or_create(user=user, job_listing=job_listing, kind=kind)
+    if created:
+        return task, True
+
+    # Conditional update: only one request can move an idle (or abandoned) task back to pending
+    now = timezone.now()
+    claimed = DocumentGenerationTask.objects.filter(pk=task.pk).exclude(
+        status__in=DocumentGenerationTask.IN_PROGRESS_STATUSES,
+        updated_at__gte=_stale_cutoff()
+    ).update(status=DocumentGenerationTask.STATUS_PENDING, error_message=None, completed_at=None, updated_at=now)
+    task.refresh_from_db()
+    return task, bool(claimed)
+
+
+def request_document_generation(user, job_listing, kind):
+    """
+    Starts generating the document for (user, job, kind) in the background, or attaches to
+    the generation already in flight for that pair. Returns the DocumentGenerationTask.
+    """
+    task, claimed = claim_document_generation(user, job_listing, kind)
+    if claimed:
+        print(f"INFO: [documents] Starting {kind} generation for job {job_listing.id}, user {user.id}.")
+        _enqueue(task)
+    else:
+        print(f"INFO: [documents] Attaching to in-flight {kind} generation for job {job_listing.id}, user {user.id}.")
+    return task
+
+
+def _finish_task(task, status, error_message=None):
+    task.status = status
+    task.error_message = error_message
+    task.completed_at = timezone.now()
+    task.save(update_fields=['status', 'error_message', 'content', 'completed_at', 'updated_at'])
+
+
+def run_document_generation(task_id, pregenerated=False):
+    """
+    Generates and stores the document of a pending task. Never raises; failures are recorded on the task.
+    pregenerated marks speculative runs, which do not create a SavedJob for the job.
+    """
+    task = DocumentGenerationTask.objects.select_related('user', 'job_listing').get(id=task_id)
+    task.status = DocumentGenerationTask.STATUS_RUNNING
+    task.save(update_fields=['status', 'updated_at'])
+    try:
+        user_profile, _ = UserProfile.objects.get_or_create(user=task.user)
+        user_cv_text = user_profile.user_cv_text or ""
+        if not user_cv_text:
+            _finish_task(task, DocumentGenerationTask.STATUS_FAILED, "Please complete your CV in your profile before generating documents.")
+            return
+
+        job_dict = job_listing_to_dict(task.job_listing)
+        if task.kind == DocumentGenerationTask.KIND_COVER_LETTER:
+            content = gemini_utils.generate_cover_letter(user_cv_text, job_dict)
+        else:
+            content = gemini_utils.generate_custom_resume(user_cv_text, job_dict)
+
+        if not content or content.startswith(GENERATION_ERROR_PREFIXES):
+            _finish_task(task, DocumentGenerationTask.STATUS_FAILED, content or GENERATION_FAILED_MESSAGE)
+            return
+        _save_document(task, content, pregenerated)
+        _finish_task(task, DocumentGenerationTask.STATUS_DONE)
+    except GeminiUnavailableError as e:
+        print(f"WARNING: [documents] {task.kind} generation task {task_id} failed: {e}")
+        _finish_task(task, DocumentGenerationTask.STATUS_FAILED, GeminiUnavailableError.user_message)
+    except Exception as e:
+        print(f"ERROR: [documents] {task.kind} generation task {task_id} failed: {e}")
+        _finish_task(task, DocumentGenerationTask.STATUS_FAILED, GENERATION_FAILED_MESSAGE)
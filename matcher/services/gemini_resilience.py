@@ -0,0 +1,359 @@
+"""
+Resilience layer around model.generate_content.
+
+- A token bucket limits the request rate. Its state lives in the 'shared' cache, so the
+  limit holds across all worker processes and threads.
+- Retryable errors (quota, overload, timeouts) are retried with jittered exponential backoff.
+- A circuit breaker, also kept in the shared cache, fails fast while the API keeps failing,
+  so callers fail immediately instead of piling up retries. After the reset period a single
+  trial call is let through (half-open); the others keep failing fast until it succeeds.
+- Expiring slot leases in the shared cache cap the number of in-flight Gemini calls across
+  all worker processes.
+
+If the shared cache is unavailable the limiter, breaker and in-flight cap fail open: calls still go out.
+"""
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    RETRYABLE_EXCEPTIONS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        ConnectionError,
+        TimeoutError,
+    )
+except ImportError:  # pragma: no cover - google-api-core ships with google-generativeai
+    RETRYABLE_EXCEPTIONS = (ConnectionError, TimeoutError)
+
+SHARED_CACHE_ALIAS = 'shared'
+
+
+class GeminiUnavailableError(Exception):
+    """
+    Raised by gemini_utils when a task could not be answered by Gemini (outside simulation mode).
+    systemic is True when Gemini is unavailable for every request (circuit open, rate limit
+    exhausted), and False when only this request failed (e.g. a rejected or unparseable response).
+    """
+
+    user_message = "The AI service is temporarily unavailable. Please try again in a few minutes."
+
+    def __init__(self, message="", systemic=True):
+        super().__init__(message)
+        self.systemic = systemic
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no rate limit token became available within the allowed wait."""
+
+
+class SharedLockTimeout(Exception):
+    """Raised when a _SharedLock could not be acquired within its timeout."""
+
+
+class _SharedLock:
+    """
+    Best-effort cross-process lock built on the atomic cache.add(). The key holds a token unique
+    to the holder and expires after timeout, so a crashed holder cannot block the others forever.
+    Raises SharedLockTimeout if the lock is still held by someone else after timeout.
+    """
+
+    def __init__(self, cache, key, timeout=5):
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+        self.token = None
+
+    def __enter__(self):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.timeout
+        while not self.cache.add(self.key, token, timeout=self.timeout):
+            if time.monotonic() >= deadline:
+                raise SharedLockTimeout(f"Lock {self.key} still held after {self.timeout}s")
+            time.sleep(0.005)
+        self.token = token
+        return self
+
+    def __exit__(self, *exc_info):
+        token, self.token = self.token, None
+        # If our key expired meanwhile, the lock may belong to another process now: leave it alone
+        if token is not None and self.cache.get(self.key) == token:
+            self.cache.delete(self.key)
+
+
+class SharedTokenBucket:
+    """Token bucket whose state is shared by all processes through a cache backend."""
+
+    def __init__(self, name, rate_per_second, capacity, cache_alias=SHARED_CACHE_ALIAS):
+        self.name = name
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.cache_alias = cache_alias
+        self._local_lock = threading.Lock()
+
+    def _try_take(self):
+        """Takes a token if one is available. Returns 0 on success, else the seconds to wait."""
+        cache = caches[self.cache_alias]
+        state_key = f"token_bucket:{self.name}"
+        with self._local_lock, _SharedLock(cache, f"{state_key}:lock"):
+            now = time.time()
+            tokens, updated_at = cache.get(state_key) or (float(self.capacity), now)
+            tokens = min(float(self.capacity), tokens + (now - updated_at) * self.rate_per_second)
+            if tokens >= 1:
+                cache.set(state_key, (tokens - 1, now), timeout=3600)
+                return 0
+            cache.set(state_key, (tokens, now), timeout=3600)
+            return (1 - tokens) / self.rate_per_second
+
+    def acquire(self, max_wait_seconds):
+        """Blocks until a token is taken. Returns False if that would take longer than max_wait_seconds."""
+        if self.rate_per_second <= 0:
+            return True
+        deadline = time.monotonic() + max_wait_seconds
+        while True:
+            try:
+                wait_seconds = self._try_take()
+            except SharedLockTimeout as e:
+                # The state is busy rather than broken: keep waiting for a token, but never unlocked
+                print(f"WARNING: Rate limiter {self.name} is contended ({e}).")
+                wait_seconds = 0.05
+                if time.monotonic() + wait_seconds > deadline:
+                    return False
+                time.sleep(wait_seconds)
+                continue
+            except Exception as e:
+                print(f"WARNING: Rate limiter {self.name} unavailable ({e}); not limiting this call.")
+                return True
+            if wait_seconds == 0:
+                return True
+            if time.monotonic() + wait_seconds > deadline:
+                return False
+            time.sleep(wait_seconds)
+
+
+class SharedSlotPool:
+    """
+    Caps concurrent work across processes with a fixed number of slot keys in a cache backend.
+    A slot is leased with the atomic cache.add() and expires after lease_seconds, so a crashed
+    holder frees its slot eventually.
+    """
+
+    def __init__(self, name, slots, lease_seconds, cache_alias=SHARED_CACHE_ALIAS):
+        self.name = name
+        self.slots = slots
+        self.lease_seconds = lease_seconds
+        self.cache_alias = cache_alias
+
+    def _slot_key(self, index):
+        return f"slot_pool:{self.name}:{index}"
+
+    def _try_lease(self, token):
+        cache = caches[self.cache_alias]
+        # Start at a random slot so that waiting callers do not all contend for slot 0
+        first = random.randrange(self.slots)
+        for offset in range(self.slots):
+            key = self._slot_key((first + offset) % self.slots)
+            if cache.add(key, token, timeout=self.lease_seconds):
+                return key
+        return None
+
+    def acquire(self, max_wait_seconds):
+        """
+        Leases a free slot, waiting up to max_wait_seconds. Returns the lease to pass to release(),
+        or None if no slot became free in time.
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + max_wait_seconds
+        poll_seconds = 0.01
+        while True:
+            try:
+                key = self._try_lease(token)
+            except Exception as e:
+                print(f"WARNING: Slot pool {self.name} unavailable ({e}); not limiting this call.")
+                return (None, token)
+            if key is not None:
+                return (key, token)
+            remaining_seconds = deadline - time.monotonic()
+            if remaining_seconds <= 0:
+                return None
+            time.sleep(min(poll_seconds, remaining_seconds))
+            poll_seconds = min(poll_seconds * 2, 0.2)
+
+    def release(self, lease):
+        key, token = lease
+        if key is None:
+            return
+        try:
+            cache = caches[self.cache_alias]
+            # An expired lease may have been handed to another caller since
+            if cache.get(key) == token:
+                cache.delete(key)
+        except Exception as e:
+            print(f"WARNING: Could not release slot {key} of pool {self.name}: {e}")
+
+
+class SharedCircuitBreaker:
+    """Opens after failure_threshold consecutive failures and lets one trial call through after reset_seconds."""
+
+    def __init__(self, name, failure_threshold, reset_seconds, cache_alias=SHARED_CACHE_ALIAS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.cache_alias = cache_alias
+        self.state_key = f"circuit_breaker:{name}"
+        self.probe_key = f"circuit_breaker:{name}:probe"
+
+    def _get_state(self):
+        try:
+            return caches[self.cache_alias].get(self.state_key) or {'failures': 0, 'opened_until': 0}
+        except Exception as e:
+            print(f"WARNING: Circuit breaker {self.name} unavailable ({e}); treating it as closed.")
+            return {'failures': 0, 'opened_until': 0}
+
+    def _set_state(self, state):
+        try:
+            caches[self.cache_alias].set(self.state_key, state, timeout=24 * 60 * 60)
+        except Exception as e:
+            print(f"WARNING: Could not update circuit breaker {self.name}: {e}")
+
+    def is_open(self):
+        return self._get_state()['opened_until'] > time.time()
+
+    def _take_probe(self):
+        try:
+            # Only one caller (across processes) gets the trial slot; it expires if that caller dies
+            return caches[self.cache_alias].add(self.probe_key, time.time(), timeout=self.reset_seconds)
+        except Exception as e:
+            print(f"WARNING: Circuit breaker {self.name} unavailable ({e}); allowing a trial call.")
+            return True
+
+    def release_probe(self):
+        try:
+            caches[self.cache_alias].delete(self.probe_key)
+        except Exception as e:
+            print(f"WARNING: Could not release the trial slot of circuit breaker {self.name}: {e}")
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError while the breaker is open. Once reset_seconds have passed it is
+        half-open: the caller that takes the trial slot may call (True is returned) and records
+        the outcome; everybody else keeps failing fast until then.
+        """
+        opened_until = self._get_state()['opened_until']
+        if not opened_until:
+            return False
+        if opened_until > time.time():
+            raise CircuitOpenError(
+                f"Circuit breaker '{self.name}' is open for another {opened_until - time.time():.0f}s"
+            )
+        if not self._take_probe():
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is half-open and waiting for its trial call")
+        print(f"INFO: Circuit breaker '{self.name}' is half-open; making a trial call.")
+        return True
+
+    def record_success(self):
+        if self._get_state()['failures']:
+            self._set_state({'failures': 0, 'opened_until': 0})
+            self.release_probe()
+
+    def record_failure(self):
+        state = self._get_state()
+        failures = state['failures'] + 1
+        opened_until = state['opened_until']
+        if failures >= self.failure_threshold:
+            opened_until = time.time() + self.reset_seconds
+            print(f"WARNING: Circuit breaker '{self.name}' opened after {failures} consecutive failures.")
+        self._set_state({'failures': failures, 'opened_until': opened_until})
+        if failures >= self.failure_threshold:
+            self.release_probe()
+
+
+_components_lock = threading.Lock()
+_components = {}
+
+
+def _get_components():
+    with _components_lock:
+        if not _components:
+            _components['rate_limiter'] = SharedTokenBucket(
+                'gemini',
+                rate_per_second=settings.GEMINI_RATE_LIMIT_PER_MINUTE / 60.0,
+                capacity=settings.GEMINI_RATE_LIMIT_BURST
+            )
+            _components['circuit_breaker'] = SharedCircuitBreaker(
+                'gemini',
+                failure_threshold=settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+                reset_seconds=settings.GEMINI_CIRCUIT_RESET_SECONDS
+            )
+            _components['in_flight'] = SharedSlotPool(
+                'gemini_in_flight',
+                slots=settings.GEMINI_MAX_IN_FLIGHT,
+                lease_seconds=settings.GEMINI_IN_FLIGHT_LEASE_SECONDS
+            )
+        return _components
+
+
+def get_circuit_breaker():
+    return _get_components()['circuit_breaker']
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry number (1-based)."""
+    ceiling = min(settings.GEMINI_RETRY_MAX_DELAY_SECONDS, settings.GEMINI_RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+def call_gemini(api_call, task_name="task"):
+    """
+    Runs api_call() (a Gemini request) under the rate limiter, in-flight cap, retry policy
+    and circuit breaker. Raises CircuitOpenError, RateLimitTimeout or the last API error.
+    """
+    components = _get_components()
+    rate_limiter = components['rate_limiter']
+    circuit_breaker = components['circuit_breaker']
+    in_flight = components['in_flight']
+
+    retry = 0
+    while True:
+        probing = circuit_breaker.before_call()
+        if not rate_limiter.acquire(settings.GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS):
+            if probing:
+                circuit_breaker.release_probe()
+            raise RateLimitTimeout(f"No Gemini rate limit token for {task_name} within {settings.GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS}s")
+        lease = in_flight.acquire(settings.GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS)
+        if lease is None:
+            if probing:
+                circuit_breaker.release_probe()
+            raise RateLimitTimeout(f"No free Gemini in-flight slot for {task_name} within {settings.GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS}s")
+        try:
+            result = api_call()
+        except RETRYABLE_EXCEPTIONS as e:
+            circuit_breaker.record_failure()
+            retry += 1
+            if retry > settings.GEMINI_MAX_RETRIES:
+                raise
+            delay = backoff_delay(retry)
+            print(f"WARNING: Retryable Gemini error for {task_name} ({e}). Retry {retry}/{settings.GEMINI_MAX_RETRIES} in {delay:.1f}s.")
+        except Exception:
+            # Not a sign of an outage; let the next caller make the trial call
+            if probing:
+                circuit_breaker.release_probe()
+            raise
+        else:
+            circuit_breaker.record_success()
+            return result
+        finally:
+            in_flight.release(lease)
+        time.sleep(delay)
@@ -0,0 +1,172 @@
+"""
+Local stand-in for the subset of the Generative Language REST API that gemini_utils uses
+(models/*:generateContent and models/*:streamGenerateContent), for end-to-end benchmarks
+without network access. Point the app at it with GEMINI_API_ENDPOINT (see settings).
+
+Responses are canned (first rule whose substring occurs in the prompt) or generated from
+templates that fit each prompt of gemini_utils: a match result per job id for match prompts,
+a structured profile for profile extraction, and text for cover letters and resumes.
+Unlike simulation mode, the real client code path runs: HTTP, JSON (de)serialisation,
+keep-alive connections and streamed responses.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .. import gemini_utils
+
+GENERATE_PATH_RE = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+JOBS_ARRAY_START_RE = re.compile(r'\[\s*\{\s*"id"\s*:')
+FINISH_REASON_STOP = 1
+
+
+def _match_response(jobs):
+    results = []
+    for job in jobs:
+        job_id = str(job.get('id'))
+        score = 40 + zlib.crc32(job_id.encode('utf-8')) % 60
+        results.append({
+            "id": job_id,
+            "match_score": score,
+            "match_reason": f"Stand-in assessment of {job.get('title', 'this role')} at {job.get('company', 'this company')}.",
+            "job_insights": "* Pro: Stand-in insight. * Con: Stand-in concern.",
+            "application_tips": "* Stand-in tip: tailor your CV summary to the role.",
+        })
+    return json.dumps(results, indent=2)
+
+
+def generate_response_text(prompt):
+    """Template-generated response text for a prompt built by gemini_utils."""
+    jobs_start = JOBS_ARRAY_START_RE.search(prompt)
+    if jobs_start:
+        try:
+            jobs, _ = json.JSONDecoder().raw_decode(prompt, jobs_start.start())
+            return _match_response(jobs)
+        except json.JSONDecodeError:
+            pass
+    if '"key_skills"' in prompt and '"summary"' in prompt:
+        profile = gemini_utils.simulate_extract_user_profile("", "")
+        return "```json\n" + json.dumps(profile, indent=2) + "\n```"
+    if 'cover letter' in prompt.lower():
+        return "I am excited to apply for this role, where my experience maps directly onto your requirements (stand-in response)."
+    if 'resume' in prompt.lower():
+        return "Stand-in optimized resume.\n\nEXPERIENCE\n- Delivered relevant projects for the target role.\n\nSKILLS\n- Python, Django"
+    return "Stand-in response."
+
+
+class GeminiStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay_ms=0, jitter_ms=0, stream_chunks=4, chunk_delay_ms=0, canned_rules=None, quiet=False):
+        super().__init__(address, GeminiStandInHandler)
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.stream_chunks = max(1, stream_chunks)
+        self.chunk_delay_ms = chunk_delay_ms
+        self.canned_rules = canned_rules or []
+        self.quiet = quiet
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._rng = random.Random()
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def response_text_for(self, prompt):
+        for rule in self.canned_rules:
+            if rule.get('match', '') in prompt:
+                return rule['response']
+        return generate_response_text(prompt)
+
+    def sleep_response_delay(self):
+        delay_ms = self.delay_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+
+def _response_payload(text, prompt):
+    prompt_tokens = gemini_utils._estimate_tokens(prompt)
+    output_tokens = gemini_utils._estimate_tokens(text)
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": FINISH_REASON_STOP,
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+
+class GeminiStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so client connection reuse is exercised
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        route = GENERATE_PATH_RE.match(path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        if not route:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {path}", "status": "NOT_FOUND"}})
+            return
+        try:
+            body = json.loads(raw_body or b'{}')
+            prompt = "".join(
+                part.get('text', '')
+                for content in body.get('contents', [])
+                for part in content.get('parts', [])
+            )
+        except (ValueError, AttributeError) as e:
+            self._send_json(400, {"error": {"code": 400, "message": f"Invalid request body: {e}", "status": "INVALID_ARGUMENT"}})
+            return
+
+        self.server.count_request()
+        text = self.server.response_text_for(prompt)
+        self.server.sleep_response_delay()
+        if route.group('method') == 'generateContent':
+            self._send_json(200, _response_payload(text, prompt))
+            return
+
+        # streamGenerateContent: a JSON array of partial responses, sent with chunked encoding
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        piece_size = max(1, -(-len(text) // self.server.stream_chunks))
+        pieces = [text[i:i + piece_size] for i in range(0, len(text), piece_size)] or [""]
+        for index, piece in enumerate(pieces):
+            if index and self.server.chunk_delay_ms:
+                time.sleep(self.server.chunk_delay_ms / 1000.0)
+            prefix = "[" if index == 0 else ","
+            self._write_chunk((prefix + json.dumps(_response_payload(piece, prompt))).encode('utf-8'))
+        self._write_chunk(b"]")
+        self._write_chunk(b"")
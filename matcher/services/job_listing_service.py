@@ -1,8 +1,157 @@
 from supabase import Client
+import hashlib
 import os
-from datetime import datetime, date, time
+import threading
+import uuid
+from time import monotonic, sleep
+from datetime import datetime, date, time, timedelta
 
-def fetch_todays_job_listings_from_supabase(supabase: Client):
+from django.conf import settings
+from django.core.cache import caches
+
+from .gemini_resilience import SHARED_CACHE_ALIAS
+from .request_timing import CATEGORY_SUPABASE, measure
+
+# Columns of job_listings rows that the matcher and the local JobListing mirror use
+JOB_LISTING_COLUMNS = (
+    'id', 'created_at', 'company_name', 'job_title', 'description', 'translated_description', 'application_url',
+    'location', 'industry', 'flexibility', 'salary_range', 'level', 'source',
+)
+KEYSET_COLUMNS = ('created_at', 'id')
+
+_in_flight_lock = threading.Lock()
+_in_flight = {}  # single-flight key -> _InFlightCall
+_NO_RESULT = object()
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _shared_single_flight(key, func):
+    """
+    Across workers: the worker that takes the shared-cache lock runs func and leaves its result
+    in the shared cache for SINGLE_FLIGHT_RESULT_TTL_SECONDS; the others poll for that result,
+    backing off from SINGLE_FLIGHT_POLL_SECONDS to SINGLE_FLIGHT_MAX_POLL_SECONDS between polls.
+    If the lock holder fails or takes longer than SINGLE_FLIGHT_WAIT_SECONDS, they run func themselves.
+    """
+    cache = caches[SHARED_CACHE_ALIAS]
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    result_key, lock_key = f"single_flight_result:{digest}", f"single_flight_lock:{digest}"
+    lock_token = uuid.uuid4().hex
+    deadline = monotonic() + settings.SINGLE_FLIGHT_WAIT_SECONDS
+    poll_seconds = settings.SINGLE_FLIGHT_POLL_SECONDS
+    while True:
+        result = cache.get(result_key, _NO_RESULT)
+        if result is not _NO_RESULT:
+            return result
+        if cache.add(lock_key, lock_token, timeout=settings.SINGLE_FLIGHT_WAIT_SECONDS):
+            try:
+                result = func()
+                cache.set(result_key, result, timeout=settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS)
+                return result
+            finally:
+                if cache.get(lock_key) == lock_token:
+                    cache.delete(lock_key)
+        remaining_seconds = deadline - monotonic()
+        if remaining_seconds <= 0:
+            print(f"WARNING: Gave up waiting for another worker's Supabase query ({key}); querying directly.")
+            return func()
+        sleep(min(poll_seconds, remaining_seconds))
+        poll_seconds = min(poll_seconds * 2, settings.SINGLE_FLIGHT_MAX_POLL_SECONDS)
+
+
+def single_flight(key, func, shared=False):
+    """
+    Runs func() once for all concurrent callers with the same key and hands each of them its
+    result (or exception). Within a process, callers wait for the thread already running it.
+    With shared (and SINGLE_FLIGHT_SHARED), workers also coordinate through a lock in the shared
+    cache, which receives a pickled copy of the result: only use it for small results.
+    """
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _in_flight[key] = _InFlightCall()
+    if not is_leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _shared_single_flight(key, func) if shared and settings.SINGLE_FLIGHT_SHARED else func()
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call.done.set()
+
+
+def _quote_filter_value(value):
+    # PostgREST needs values with reserved characters (':' and '+' in timestamps) in double quotes
+    return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _execute_page_with_retry(query, retries, backoff_seconds):
+    for attempt in range(retries + 1):
+        try:
+            with measure(CATEGORY_SUPABASE):
+                return query.execute().data or []
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff_seconds * (2 ** attempt)
+            print(f"WARNING: Supabase page fetch failed ({e}); retrying in {delay:.1f}s ({attempt + 1}/{retries}).")
+            sleep(delay)
+
+
+def iter_job_listing_pages(supabase: Client, columns=JOB_LISTING_COLUMNS, created_from=None, created_before=None, page_size=None):
+    """
+    Yields job_listings rows page by page, in (created_at, id) order, with created_at in
+    [created_from, created_before). Pages are read with keyset pagination on (created_at, id)
+    rather than offsets, so each page is an index range scan and rows inserted meanwhile do not
+    shift later pages. Only the given columns are selected (created_at and id are always added).
+    A failed page is retried SUPABASE_PAGE_RETRIES times before the error propagates.
+    """
+    page_size = page_size or settings.SUPABASE_PAGE_SIZE
+    select_columns = list(columns) + [column for column in KEYSET_COLUMNS if column not in columns]
+    last_row = None
+    while True:
+        query = supabase.table('job_listings').select(','.join(select_columns))
+        if created_from is not None:
+            query = query.gte('created_at', created_from.isoformat())
+        if created_before is not None:
+            query = query.lt('created_at', created_before.isoformat())
+        if last_row is not None:
+            # Compare with the created_at string as returned, so the keyset matches it exactly
+            last_created_at = _quote_filter_value(last_row['created_at'])
+            query = query.or_(
+                f"created_at.gt.{last_created_at},"
+                f"and(created_at.eq.{last_created_at},id.gt.{_quote_filter_value(last_row['id'])})"
+            )
+        query = query.order('created_at').order('id').limit(page_size)
+        page = _execute_page_with_retry(query, settings.SUPABASE_PAGE_RETRIES, settings.SUPABASE_PAGE_RETRY_BACKOFF_SECONDS)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_row = page[-1]
+
+
+def iter_job_listings(supabase: Client, columns=JOB_LISTING_COLUMNS, created_from=None, created_before=None, page_size=None):
+    """Like iter_job_listing_pages, one row at a time; memory stays bounded by the page size."""
+    for page in iter_job_listing_pages(supabase, columns, created_from, created_before, page_size):
+        yield from page
+
+
+def fetch_todays_job_listings_from_supabase(supabase: Client, columns=JOB_LISTING_COLUMNS):
     """
     Fetches job listings from Supabase that were created today.
     """
@@ -10,20 +159,37 @@ def fetch_todays_job_listings_from_supabase(supabase: Client):
         print("ERROR: Supabase client not available in fetch_todays_job_listings_from_supabase.")
         return []
     try:
-        today = date.today()
-        start_of_day = datetime.combine(today, time.min).isoformat()
-        end_of_day = datetime.combine(today, time.max).isoformat()
-
-        # Assuming the table is named 'job_listings'
-        response = supabase.table('job_listings').select('*').gte('created_at', start_of_day).lte('created_at', end_of_day).execute()
-        
-        if response.data:
-            return response.data
-        return []
+        start_of_day = datetime.combine(date.today(), time.min)
+        # Identical at the morning peak, when many users start a match at the same time. Only
+        # coalesced within the process: a whole day's listings are too big to hand over in the cache.
+        with measure(CATEGORY_SUPABASE):
+            return single_flight(
+                f"todays_job_listings:{start_of_day.date().isoformat()}:{','.join(columns)}",
+                lambda: list(iter_job_listings(supabase, columns, start_of_day, start_of_day + timedelta(days=1))),
+            )
     except Exception as e:
         print(f"ERROR: Could not fetch today's job listings from Supabase: {e}")
         return []
 
+def query_anomaly_analysis_for_jobs(supabase: Client, job_ids: list):
+    """
+    job_listing_id -> job_anomaly_analysis row for the given job IDs. Unlike
+    fetch_anomaly_analysis_for_jobs_from_supabase, errors propagate to the caller.
+    """
+    # The job_ids are UUIDs, so they should be strings
+    str_job_ids = sorted({str(job_id) for job_id in job_ids})
+
+    def query():
+        # Assuming the table is named 'job_anomaly_analysis'
+        response = supabase.table('job_anomaly_analysis').select('*').in_('job_listing_id', str_job_ids).execute()
+        # Return a map of job_id -> anomaly_data
+        return {item['job_listing_id']: item for item in response.data or []}
+
+    # Concurrent views of the same session ask for the same set of jobs
+    with measure(CATEGORY_SUPABASE):
+        return single_flight(f"job_anomaly_analysis:{','.join(str_job_ids)}", query, shared=True)
+
+
 def fetch_anomaly_analysis_for_jobs_from_supabase(supabase: Client, job_ids: list):
     """
     Fetches anomaly analysis for a list of job IDs from Supabase.
@@ -33,16 +199,7 @@ def fetch_anomaly_analysis_for_jobs_from_supabase(supabase: Client, job_ids: lis
             print("ERROR: Supabase client not available in fetch_anomaly_analysis_for_jobs_from_supabase.")
         return {}
     try:
-        # The job_ids are UUIDs, so they should be strings
-        str_job_ids = [str(job_id) for job_id in job_ids]
-        
-        # Assuming the table is named 'job_anomaly_analysis'
-        response = supabase.table('job_anomaly_analysis').select('*').in_('job_listing_id', str_job_ids).execute()
-        
-        if response.data:
-            # Return a map of job_id -> anomaly_data
-            return {item['job_listing_id']: item for item in response.data}
-        return {}
+        return query_anomaly_analysis_for_jobs(supabase, job_ids)
     except Exception as e:
         print(f"ERROR: Could not fetch anomaly analysis from Supabase for jobs {job_ids}: {e}")
         return {}
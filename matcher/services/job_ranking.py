@@ -0,0 +1,206 @@
+"""
+Local lexical pre-ranking (BM25) of job listings against a structured user profile.
+
+An inverted index over job title, description, industry and location is kept in process and
+updated incrementally: only jobs that are new or whose content changed are (re)indexed.
+Scoring only touches the postings of the query terms, so shortlisting thousands of jobs
+takes milliseconds and decides which jobs are worth sending to the LLM matcher.
+"""
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+from ..utils import JOB_CONTENT_HASH_FIELDS
+
+# Keeps tokens such as "c++", "c#" and "node.js" intact
+TOKEN_RE = re.compile(r"[a-z0-9äöüß][a-z0-9äöüß+#.]*")
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has have in is it of on or our the to we with you your will
+    der die das und ist im in mit für von zu den des ein eine einer wir sie auf als bei oder
+""".split())
+
+# Field weights for the weighted (BM25F-style) term frequencies
+FIELD_WEIGHTS = {
+    'job_title': 3.0,
+    'industry': 1.5,
+    'location': 1.0,
+    'description': 1.0,
+}
+
+# Query weights per structured profile section
+PROFILE_QUERY_WEIGHTS = {
+    'desired_roles': 2.0,
+    'key_skills': 1.0,
+    'location_preferences': 1.0,
+}
+
+
+def tokenize(text):
+    if not text:
+        return []
+    tokens = []
+    for token in TOKEN_RE.findall(str(text).lower()):
+        token = token.rstrip('.')
+        if token and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def _content_signature(job):
+    # In-process change detection only, so Python's (cached) string hashing is enough here
+    return hash(tuple(job.get(field) for field in JOB_CONTENT_HASH_FIELDS))
+
+
+def build_profile_query(structured_user_profile):
+    """Returns {term: weight} built from key_skills, desired_roles and location_preferences."""
+    structured_user_profile = structured_user_profile or {}
+    preferences = structured_user_profile.get('preferences') or {}
+    sections = {
+        'key_skills': structured_user_profile.get('key_skills'),
+        'desired_roles': preferences.get('desired_roles'),
+        'location_preferences': preferences.get('location_preferences'),
+    }
+    query = defaultdict(float)
+    for section, values in sections.items():
+        if isinstance(values, str):
+            values = [values]
+        for value in values or []:
+            for term in tokenize(value):
+                query[term] += PROFILE_QUERY_WEIGHTS[section]
+    return dict(query)
+
+
+class BM25JobIndex:
+    """Incrementally maintained BM25 inverted index over job listing dicts."""
+
+    def __init__(self, k1=1.2, b=0.75, max_documents=None):
+        self.k1 = k1
+        self.b = b
+        self.max_documents = max_documents
+        self._postings = defaultdict(dict)  # term -> {job_id: weighted term frequency}
+        self._documents = OrderedDict()  # job_id -> (content_hash, {term: weighted tf}, length)
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add_jobs(self, job_listings):
+        """Indexes new jobs and re-indexes jobs whose content changed. Returns how many were (re)indexed."""
+        indexed = 0
+        with self._lock:
+            for job in job_listings:
+                job_id = str(job.get('id'))
+                content_hash = _content_signature(job)
+                existing = self._documents.get(job_id)
+                if existing is not None and existing[0] == content_hash:
+                    continue
+                if existing is not None:
+                    self._remove(job_id)
+                self._add(job_id, content_hash, job)
+                indexed += 1
+            self._evict_overflow()
+        return indexed
+
+    def remove_jobs(self, job_ids):
+        with self._lock:
+            for job_id in job_ids:
+                if str(job_id) in self._documents:
+                    self._remove(str(job_id))
+
+    def _add(self, job_id, content_hash, job):
+        term_frequencies = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(job.get(field)):
+                term_frequencies[term] += weight
+        length = sum(term_frequencies.values())
+        for term, frequency in term_frequencies.items():
+            self._postings[term][job_id] = frequency
+        self._documents[job_id] = (content_hash, dict(term_frequencies), length)
+        self._total_length += length
+
+    def _remove(self, job_id):
+        _, term_frequencies, length = self._documents.pop(job_id)
+        for term in term_frequencies:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(job_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= length
+
+    def _evict_overflow(self):
+        if not self.max_documents:
+            return
+        while len(self._documents) > self.max_documents:
+            oldest_job_id = next(iter(self._documents))
+            self._remove(oldest_job_id)
+
+    def score(self, query, candidate_ids=None):
+        """Returns {job_id: BM25 score} for documents matching at least one query term."""
+        scores = defaultdict(float)
+        with self._lock:
+            document_count = len(self._documents)
+            if not document_count:
+                return {}
+            average_length = (self._total_length / document_count) or 1.0
+            for term, query_weight in query.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                document_frequency = len(postings)
+                idf = math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                for job_id, frequency in postings.items():
+                    if candidate_ids is not None and job_id not in candidate_ids:
+                        continue
+                    length = self._documents[job_id][2]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[job_id] += query_weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return dict(scores)
+
+    def top_k(self, structured_user_profile, job_listings, k):
+        """
+        Indexes job_listings (incrementally) and returns the k best of them for the profile.
+        Ties, including jobs without any matching term, keep their original order.
+        """
+        self.add_jobs(job_listings)
+        candidate_ids = {str(job.get('id')) for job in job_listings}
+        scores = self.score(build_profile_query(structured_user_profile), candidate_ids)
+        ranked = sorted(
+            enumerate(job_listings),
+            key=lambda item: (-scores.get(str(item[1].get('id')), 0.0), item[0])
+        )
+        return [job for _, job in ranked[:k]]
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_shared_index():
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = BM25JobIndex(max_documents=settings.JOB_PRERANK_INDEX_MAX_DOCUMENTS)
+        return _shared_index
+
+
+def shortlist_jobs(structured_user_profile, job_listings, top_k):
+    """
+    Returns the top_k job_listings for the profile, or all of them if top_k is not a positive int.
+    settings.MATCH_PRERANK_METHOD picks the ranker: 'vectors' (embedding similarity, see
+    job_vectors) or 'bm25'.
+    """
+    if not isinstance(top_k, int) or top_k <= 0 or len(job_listings) <= top_k:
+        return list(job_listings)
+    if settings.MATCH_PRERANK_METHOD == 'vectors':
+        from . import job_vectors  # job_vectors reuses this module's tokenizer
+        shortlist = job_vectors.top_k_jobs(structured_user_profile, job_listings, top_k)
+        print(f"INFO: [pre-ranking] Shortlisted {len(shortlist)} of {len(job_listings)} jobs by embedding similarity.")
+        return shortlist
+    shortlist = get_shared_index().top_k(structured_user_profile, job_listings, top_k)
+    print(f"INFO: [pre-ranking] Shortlisted {len(shortlist)} of {len(job_listings)} jobs with BM25.")
+    return shortlist
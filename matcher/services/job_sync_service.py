@@ -0,0 +1,247 @@
+"""
+Local mirror of the Supabase job_listings table.
+
+sync_job_listings pulls only rows created after the stored watermark (minus a small overlap
+for rows committed late), compares them with the local JobListing rows by content hash and
+bulk-upserts the new and changed ones page by page. Every JOB_SYNC_FULL_RECONCILE_SECONDS a reconcile
+pass re-reads the last JOB_SYNC_RECONCILE_DAYS days to pick up edits of older rows and to
+deactivate listings deleted upstream (they are kept locally, as matches and saved jobs
+reference them). Match sessions then read today's listings from the local table
+(get_todays_job_listings) instead of querying Supabase on the hot path.
+
+Run it with `python manage.py sync_jobs` (once, or periodically with --every). When the
+mirror is older than JOB_SYNC_MAX_STALENESS_SECONDS, reads also queue a background sync.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from supabase import create_client
+
+from ..models import JobListing, SyncState
+from ..utils import compute_job_content_hash
+from . import background
+from .anomaly_view_models import refresh_anomaly_view_models
+from .gemini_resilience import SHARED_CACHE_ALIAS
+from .job_listing_service import JOB_LISTING_COLUMNS, fetch_todays_job_listings_from_supabase, iter_job_listing_pages
+
+SYNC_NAME_JOB_LISTINGS = 'job_listings'
+SYNC_LOCK_KEY = 'job_sync_lock:job_listings'
+SYNC_LOCK_TIMEOUT_SECONDS = 15 * 60
+BULK_BATCH_SIZE = 1000
+
+# Synced JobListing field (same name as the Supabase column) -> default when missing
+SYNCED_FIELDS = {
+    'company_name': 'N/A',
+    'job_title': 'N/A',
+    'description': None,
+    'translated_description': None,
+    'application_url': None,
+    'location': None,
+    'industry': 'Unknown',
+    'flexibility': None,
+    'salary_range': None,
+    'level': None,
+    'source': None,
+}
+UPSERT_UPDATE_FIELDS = list(SYNCED_FIELDS) + ['source_created_at', 'content_hash', 'is_active', 'synced_at']
+
+
+def create_sync_client():
+    """Supabase client for syncing; prefers the service role key so row-level security does not hide rows."""
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_KEY)
+
+
+def _parse_source_datetime(value):
+    if not value:
+        return None
+    parsed = parse_datetime(str(value))
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+    return parsed
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_default_timezone())
+
+
+def job_listing_from_row(row, now=None):
+    """Unsaved JobListing built from a Supabase job_listings row."""
+    now = now or timezone.now()
+    job_listing = JobListing(
+        id=str(row['id']),
+        source_created_at=_parse_source_datetime(row.get('created_at')),
+        content_hash=compute_job_content_hash(row),
+        is_active=True,
+        synced_at=now,
+    )
+    for field, default in SYNCED_FIELDS.items():
+        value = row.get(field)
+        setattr(job_listing, field, value if value not in (None, '') else default)
+    return job_listing
+
+
+def upsert_job_rows(rows, now=None):
+    """
+    Bulk-upserts Supabase rows into JobListing, skipping rows whose content hash is unchanged.
+    Returns (created_ids, updated_ids).
+    """
+    now = now or timezone.now()
+    rows_by_id = {str(row['id']): row for row in rows if row.get('id')}
+    existing = {}
+    row_ids = list(rows_by_id)
+    for start in range(0, len(row_ids), BULK_BATCH_SIZE):
+        for job_id, content_hash, is_active, source_created_at in JobListing.objects.filter(
+            id__in=row_ids[start:start + BULK_BATCH_SIZE]
+        ).values_list('id', 'content_hash', 'is_active', 'source_created_at'):
+            existing[job_id] = (content_hash, is_active, source_created_at)
+
+    created_ids, updated_ids, changed = [], [], []
+    for job_id, row in rows_by_id.items():
+        job_listing = job_listing_from_row(row, now)
+        previous = existing.get(job_id)
+        if previous == (job_listing.content_hash, True, job_listing.source_created_at):
+            continue
+        (updated_ids if previous else created_ids).append(job_id)
+        changed.append(job_listing)
+    if changed:
+        JobListing.objects.bulk_create(
+            changed,
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=UPSERT_UPDATE_FIELDS,
+        )
+    return created_ids, updated_ids
+
+
+def deactivate_missing_listings(seen_ids, window_start, now=None):
+    """Marks active local listings created since window_start that Supabase no longer has as inactive."""
+    now = now or timezone.now()
+    local_ids = set(JobListing.objects.filter(
+        is_active=True, source_created_at__gte=window_start
+    ).values_list('id', flat=True))
+    missing_ids = sorted(local_ids - set(seen_ids))
+    for start in range(0, len(missing_ids), BULK_BATCH_SIZE):
+        JobListing.objects.filter(id__in=missing_ids[start:start + BULK_BATCH_SIZE]).update(is_active=False, synced_at=now)
+    return missing_ids
+
+
+def _update_vector_index(created_ids, updated_ids, deactivated_ids):
+    # Imported lazily: numpy is only needed once the mirror has rows to embed
+    try:
+        from . import job_vectors
+        changed_ids = created_ids + updated_ids
+        if changed_ids:
+            job_vectors.index_jobs(list(JobListing.objects.filter(id__in=changed_ids)))
+        if deactivated_ids:
+            job_vectors.get_shared_store().remove(deactivated_ids)
+    except Exception as e:
+        print(f"WARNING: [job sync] Could not update the job-vector store: {e}")
+
+
+def _refresh_anomaly_view_models(supabase, job_ids):
+    try:
+        return refresh_anomaly_view_models(supabase, job_ids)
+    except Exception as e:
+        print(f"WARNING: [job sync] Could not compile the anomaly analysis of synced jobs: {e}")
+        return 0
+
+
+def sync_job_listings(supabase=None, full=False):
+    """
+    Pulls new (and, on reconcile runs, changed and deleted) job listings into the local mirror.
+    Returns the counters of the run, or None if another sync is already running.
+    """
+    cache = caches[SHARED_CACHE_ALIAS]
+    if not cache.add(SYNC_LOCK_KEY, timezone.now().isoformat(), timeout=SYNC_LOCK_TIMEOUT_SECONDS):
+        print("INFO: [job sync] Another sync is running; skipping.")
+        return None
+    try:
+        supabase = supabase or create_sync_client()
+        now = timezone.now()
+        state, _ = SyncState.objects.get_or_create(name=SYNC_NAME_JOB_LISTINGS)
+        reconcile_start = _start_of_day(timezone.localdate() - timedelta(days=settings.JOB_SYNC_RECONCILE_DAYS - 1))
+        reconcile = (
+            full
+            or state.watermark is None
+            or state.last_full_sync_at is None
+            or (now - state.last_full_sync_at).total_seconds() >= settings.JOB_SYNC_FULL_RECONCILE_SECONDS
+        )
+        if reconcile:
+            since = reconcile_start
+        else:
+            since = state.watermark - timedelta(seconds=settings.JOB_SYNC_OVERLAP_SECONDS)
+
+        # Pages are upserted as they arrive, so memory is bounded by JOB_SYNC_PAGE_SIZE on busy days
+        fetched, created_ids, updated_ids, seen_ids = 0, [], [], []
+        for page in iter_job_listing_pages(supabase, JOB_LISTING_COLUMNS, created_from=since, page_size=settings.JOB_SYNC_PAGE_SIZE):
+            page_created_ids, page_updated_ids = upsert_job_rows(page, now)
+            created_ids += page_created_ids
+            updated_ids += page_updated_ids
+            seen_ids += [str(row['id']) for row in page if row.get('id')]
+            fetched += len(page)
+            page_watermark = _parse_source_datetime(page[-1].get('created_at'))
+            if page_watermark and (state.watermark is None or page_watermark > state.watermark):
+                state.watermark = page_watermark
+        deactivated_ids = deactivate_missing_listings(seen_ids, reconcile_start, now) if reconcile else []
+        _update_vector_index(created_ids, updated_ids, deactivated_ids)
+        anomaly_view_models = _refresh_anomaly_view_models(supabase, created_ids + updated_ids)
+
+        result = {
+            'mode': 'reconcile' if reconcile else 'incremental',
+            'fetched': fetched,
+            'created': len(created_ids),
+            'updated': len(updated_ids),
+            'unchanged': fetched - len(created_ids) - len(updated_ids),
+            'deactivated': len(deactivated_ids),
+            'anomaly_view_models': anomaly_view_models,
+        }
+        state.last_run_at = now
+        if reconcile:
+            state.last_full_sync_at = now
+        state.last_result = result
+        state.save()
+        print(f"INFO: [job sync] {result}")
+        return result
+    finally:
+        cache.delete(SYNC_LOCK_KEY)
+
+
+def is_mirror_ready():
+    return SyncState.objects.filter(name=SYNC_NAME_JOB_LISTINGS, last_run_at__isnull=False).exists()
+
+
+def _schedule_sync_if_stale():
+    state = SyncState.objects.filter(name=SYNC_NAME_JOB_LISTINGS).only('last_run_at').first()
+    if state and state.last_run_at and (timezone.now() - state.last_run_at).total_seconds() > settings.JOB_SYNC_MAX_STALENESS_SECONDS:
+        print("INFO: [job sync] Mirror is stale; queueing a background sync.")
+        background.submit_low_priority(sync_job_listings)
+
+
+def job_listing_to_row(job):
+    """JobListing -> the dict shape of a Supabase job_listings row, as the matcher expects it."""
+    row = {field: getattr(job, field) for field in SYNCED_FIELDS}
+    row['id'] = job.id
+    row['created_at'] = job.source_created_at.isoformat() if job.source_created_at else None
+    return row
+
+
+def get_todays_job_listings(supabase=None):
+    """
+    Today's job listings as row dicts: from the local mirror when JOB_LISTINGS_SOURCE is
+    'mirror' and it has been synced, otherwise (or before the first sync) from Supabase,
+    using create_sync_client() when no client is given.
+    """
+    if settings.JOB_LISTINGS_SOURCE != 'mirror' or not is_mirror_ready():
+        return fetch_todays_job_listings_from_supabase(supabase or create_sync_client())
+    _schedule_sync_if_stale()
+    start_of_today = _start_of_day(timezone.localdate())
+    todays_jobs = JobListing.objects.filter(
+        is_active=True,
+        source_created_at__gte=start_of_today,
+        source_created_at__lt=start_of_today + timedelta(days=1),
+    ).order_by('source_created_at', 'id')
+    return [job_listing_to_row(job) for job in todays_jobs]
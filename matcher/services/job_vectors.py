@@ -0,0 +1,335 @@
+"""
+Local job-vector store for semantic pre-ranking without an LLM round-trip.
+
+Job title, description and industry are embedded by a pluggable embedder (settings.JOB_EMBEDDER,
+an import path; the default HashingEmbedder needs no model or network) when jobs are imported
+or first seen. Vectors are L2-normalised float32 rows of a memory-mapped matrix on disk, with a
+JSON id map next to it, so every worker process shares one store and only new or changed jobs
+are embedded. Ranking is a single matrix-vector product (cosine similarity) plus a partial sort.
+"""
+import json
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ..utils import JOB_CONTENT_HASH_FIELDS, compute_job_content_hash
+from .job_ranking import _content_signature, tokenize
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+VECTORS_FILENAME = 'vectors.f32'
+ID_MAP_FILENAME = 'ids.json'
+LOCK_FILENAME = '.lock'
+MIN_CAPACITY = 1024
+
+# Token repetitions per field when building the text that represents a job
+JOB_TEXT_FIELD_REPEATS = (
+    ('job_title', 3),
+    ('industry', 1),
+    ('description', 1),
+)
+
+
+class HashingEmbedder:
+    """
+    Offline default embedder: signed feature hashing of unigrams and bigrams with sublinear
+    term frequencies. crc32 keeps the hashing stable across processes and restarts.
+    """
+
+    name = 'hashing-v1'
+
+    def __init__(self, dimensions=512):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        for feature, count in features.items():
+            digest = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimensions] += sign * (1.0 + math.log(count))
+        return vector
+
+    def embed_documents(self, texts):
+        return np.vstack([self._embed(text) for text in texts]) if texts else np.zeros((0, self.dimensions), dtype=np.float32)
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def get_embedder():
+    embedder_class = import_string(settings.JOB_EMBEDDER)
+    return embedder_class(dimensions=settings.JOB_EMBEDDING_DIMENSIONS)
+
+
+def job_embedding_text(job):
+    """Text that represents a job listing dict (or JobListing) for embedding."""
+    parts = []
+    for field, repeats in JOB_TEXT_FIELD_REPEATS:
+        value = job.get(field) if isinstance(job, dict) else getattr(job, field, None)
+        if value:
+            parts.extend([str(value)] * repeats)
+    return "\n".join(parts)
+
+
+def profile_embedding_text(structured_user_profile):
+    """Text that represents what the user is looking for: desired roles (weighted) and key skills."""
+    structured_user_profile = structured_user_profile or {}
+    preferences = structured_user_profile.get('preferences') or {}
+    parts = []
+    for section, repeats in ((preferences.get('desired_roles'), 2), (structured_user_profile.get('key_skills'), 1)):
+        if isinstance(section, str):
+            section = [section]
+        for value in section or []:
+            parts.extend([str(value)] * repeats)
+    return "\n".join(parts)
+
+
+def _normalise_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class JobVectorStore:
+    """
+    Memory-mapped float32 matrix of job vectors plus an id map, stored in directory.
+    Writers take an exclusive file lock; readers reload the id map when another
+    process has changed it.
+    """
+
+    def __init__(self, directory, embedder):
+        self.directory = directory
+        self.embedder = embedder
+        self.dimensions = embedder.dimensions
+        self._lock = threading.RLock()
+        self._ids = []  # row -> job id, None for free rows
+        self._hashes = []  # row -> content hash
+        self._rows = {}  # job id -> row
+        self._capacity = 0
+        self._matrix = None
+        self._id_map_mtime = None
+        # job id -> in-process content signature of the version last stored, to skip sha256 hashing of unchanged jobs
+        self._verified_signatures = {}
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, VECTORS_FILENAME)
+
+    @property
+    def _id_map_path(self):
+        return os.path.join(self.directory, ID_MAP_FILENAME)
+
+    def __len__(self):
+        with self._lock:
+            self._reload_if_changed()
+            return len(self._rows)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialises writers across processes."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILENAME), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self._id_map_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._id_map_mtime:
+            return
+        with open(self._id_map_path, encoding='utf-8') as id_map_file:
+            id_map = json.load(id_map_file)
+        if id_map.get('embedder') != self.embedder.name or id_map.get('dimensions') != self.dimensions:
+            # Vectors from another embedder are not comparable; start over
+            print(f"INFO: [job vectors] Embedder changed to {self.embedder.name}; rebuilding the vector store.")
+            self._ids, self._hashes, self._rows, self._capacity, self._matrix = [], [], {}, 0, None
+            self._id_map_mtime = mtime
+            return
+        self._ids = id_map['ids']
+        self._hashes = id_map['hashes']
+        self._rows = {job_id: row for row, job_id in enumerate(self._ids) if job_id is not None}
+        self._capacity = id_map['capacity']
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(self._capacity, self.dimensions))
+        self._id_map_mtime = mtime
+
+    def _ensure_capacity(self, row_count):
+        if row_count <= self._capacity:
+            return
+        new_capacity = max(MIN_CAPACITY, self._capacity * 2)
+        while new_capacity < row_count:
+            new_capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+        with open(self._vectors_path, 'ab') as vectors_file:
+            vectors_file.truncate(new_capacity * self.dimensions * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(new_capacity, self.dimensions))
+        self._capacity = new_capacity
+
+    def _write_id_map(self):
+        temporary_path = f"{self._id_map_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as id_map_file:
+            json.dump({
+                'embedder': self.embedder.name,
+                'dimensions': self.dimensions,
+                'capacity': self._capacity,
+                'ids': self._ids,
+                'hashes': self._hashes,
+            }, id_map_file, separators=(',', ':'))
+        os.replace(temporary_path, self._id_map_path)
+        self._id_map_mtime = os.stat(self._id_map_path).st_mtime_ns
+
+    def job_ids(self):
+        with self._lock:
+            self._reload_if_changed()
+            return list(self._rows)
+
+    def missing_jobs(self, job_listings):
+        """The job_listings that have no vector yet. Takes no file lock and writes nothing."""
+        with self._lock:
+            self._reload_if_changed()
+            return [
+                job for job in job_listings
+                if str(job.get('id') if isinstance(job, dict) else job.id) not in self._rows
+            ]
+
+    def upsert(self, job_listings):
+        """Embeds and stores new jobs and jobs whose content changed. Returns how many were embedded."""
+        with self._lock, self._file_lock():
+            self._reload_if_changed()
+            pending = {}
+            for job in job_listings:
+                job_id = str(job.get('id') if isinstance(job, dict) else job.id)
+                job_fields = job if isinstance(job, dict) else {field: getattr(job, field, None) for field in JOB_CONTENT_HASH_FIELDS}
+                signature = _content_signature(job_fields)
+                row = self._rows.get(job_id)
+                if row is not None and self._verified_signatures.get(job_id) == signature:
+                    continue
+                content_hash = compute_job_content_hash(job)
+                if row is None or self._hashes[row] != content_hash:
+                    pending[job_id] = (job, content_hash)
+                self._verified_signatures[job_id] = signature
+            if not pending:
+                return 0
+
+            vectors = _normalise_rows(self.embedder.embed_documents([job_embedding_text(job) for job, _ in pending.values()]))
+            free_rows = iter([row for row, job_id in enumerate(self._ids) if job_id is None])
+            for (job_id, (_, content_hash)), vector in zip(pending.items(), vectors):
+                row = self._rows.get(job_id)
+                if row is None:
+                    row = next(free_rows, None)
+                if row is None:
+                    row = len(self._ids)
+                    self._ensure_capacity(row + 1)
+                    self._ids.append(job_id)
+                    self._hashes.append(content_hash)
+                else:
+                    self._ids[row] = job_id
+                    self._hashes[row] = content_hash
+                self._matrix[row] = vector
+                self._rows[job_id] = row
+            self._matrix.flush()
+            self._write_id_map()
+            return len(pending)
+
+    def remove(self, job_ids):
+        with self._lock, self._file_lock():
+            self._reload_if_changed()
+            removed = 0
+            for job_id in job_ids:
+                row = self._rows.pop(str(job_id), None)
+                self._verified_signatures.pop(str(job_id), None)
+                if row is None:
+                    continue
+                self._ids[row] = None
+                self._hashes[row] = None
+                self._matrix[row] = 0.0
+                removed += 1
+            if removed:
+                self._matrix.flush()
+                self._write_id_map()
+            return removed
+
+    def search(self, query_vector, k, candidate_ids=None):
+        """Returns up to k (job_id, cosine similarity) pairs, best first, optionally restricted to candidate_ids."""
+        with self._lock:
+            self._reload_if_changed()
+            if self._matrix is None or not self._rows or k <= 0:
+                return []
+            norm = float(np.linalg.norm(query_vector))
+            if norm == 0:
+                return []
+            query_vector = np.asarray(query_vector, dtype=np.float32) / norm
+            if candidate_ids is None:
+                rows = np.fromiter(self._rows.values(), dtype=np.int64)
+            else:
+                rows = np.fromiter((self._rows[job_id] for job_id in candidate_ids if job_id in self._rows), dtype=np.int64)
+            if not len(rows):
+                return []
+            scores = self._matrix[rows] @ query_vector
+            k = min(k, len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [(self._ids[rows[index]], float(scores[index])) for index in best]
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = JobVectorStore(settings.JOB_VECTOR_STORE_DIR, get_embedder())
+        return _shared_store
+
+
+def index_jobs(job_listings):
+    """Embeds new or changed job listings (dicts or JobListing objects) into the shared store."""
+    embedded = get_shared_store().upsert(job_listings)
+    if embedded:
+        print(f"INFO: [job vectors] Embedded {embedded} new or changed job listings.")
+    return embedded
+
+
+def top_k_jobs(structured_user_profile, job_listings, k):
+    """
+    Returns the k job_listings most similar to the profile, embedding any listing the store
+    has not seen yet. Listings without similarity (e.g. an empty profile) keep their order.
+    Vectors of changed listings are refreshed by the job sync, not here, so a session whose
+    listings are all stored neither locks nor rewrites the store.
+    """
+    store = get_shared_store()
+    missing_jobs = store.missing_jobs(job_listings)
+    if missing_jobs:
+        index_jobs(missing_jobs)
+    query_vector = store.embedder.embed_query(profile_embedding_text(structured_user_profile))
+    candidate_ids = [str(job.get('id')) for job in job_listings]
+    ranked_ids = [job_id for job_id, _ in store.search(query_vector, k, candidate_ids)]
+    jobs_by_id = {str(job.get('id')): job for job in job_listings}
+    shortlist = [jobs_by_id[job_id] for job_id in ranked_ids]
+    if len(shortlist) < k:
+        chosen = set(ranked_ids)
+        shortlist.extend(job for job in job_listings if str(job.get('id')) not in chosen)
+        shortlist = shortlist[:k]
+    return shortlist
@@ -0,0 +1,190 @@
+"""
+In-process metrics for LLM calls made through gemini_utils._execute_ai_task, per task name:
+call counts by outcome, a latency histogram, prompt/response characters and tokens, parse
+failures, cache hits and failed calls (fallbacks) by reason.
+
+The registry is per process (every gunicorn worker keeps its own). It is exposed as
+Prometheus text at /metrics/llm (JSON with ?format=json) and summarised by
+`python manage.py llm_metrics`.
+"""
+import threading
+from collections import defaultdict
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+OUTCOME_SUCCESS = 'success'  # Parsed response from the API
+OUTCOME_CACHED = 'cached'  # Served from ai_response_cache
+OUTCOME_SIMULATED = 'simulated'  # Simulation mode, by configuration
+OUTCOME_FALLBACK = 'fallback'  # Simulation mode: the simulated API call failed; the simulation answered instead
+OUTCOME_UNAVAILABLE = 'unavailable'  # API failed; GeminiUnavailableError was raised to the caller
+
+FALLBACK_PARSE_ERROR = 'parse_error'
+FALLBACK_API_UNAVAILABLE = 'api_unavailable'  # Circuit open or rate limit wait exceeded
+FALLBACK_API_ERROR = 'api_error'
+
+COUNTER_FIELDS = (
+    'prompt_chars', 'response_chars', 'prompt_tokens', 'response_tokens', 'api_calls', 'parse_failures', 'cache_hits',
+)
+
+_lock = threading.Lock()
+
+
+def _new_task_metrics():
+    return {
+        'calls': defaultdict(int),  # outcome -> count
+        'fallbacks': defaultdict(int),  # reason -> count
+        'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'latency_sum': 0.0,
+        'latency_count': 0,
+        **{field: 0 for field in COUNTER_FIELDS},
+    }
+
+
+_metrics = defaultdict(_new_task_metrics)
+
+
+def reset_metrics():
+    with _lock:
+        _metrics.clear()
+
+
+def record_call(task_name, outcome):
+    with _lock:
+        _metrics[task_name]['calls'][outcome] += 1
+
+
+def record_fallback(task_name, reason):
+    with _lock:
+        _metrics[task_name]['fallbacks'][reason] += 1
+
+
+def record_parse_failure(task_name):
+    with _lock:
+        _metrics[task_name]['parse_failures'] += 1
+
+
+def record_cache_hit(task_name):
+    with _lock:
+        _metrics[task_name]['cache_hits'] += 1
+
+
+def record_api_call(task_name, latency_seconds, prompt_text='', response_text='', prompt_tokens=0, response_tokens=0):
+    """One request to the model (or the simulated model), successful or not."""
+    bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS) if latency_seconds <= bound), len(LATENCY_BUCKETS))
+    with _lock:
+        task_metrics = _metrics[task_name]
+        task_metrics['api_calls'] += 1
+        task_metrics['latency_buckets'][bucket] += 1
+        task_metrics['latency_sum'] += latency_seconds
+        task_metrics['latency_count'] += 1
+        task_metrics['prompt_chars'] += len(prompt_text or '')
+        task_metrics['response_chars'] += len(response_text or '')
+        task_metrics['prompt_tokens'] += prompt_tokens
+        task_metrics['response_tokens'] += response_tokens
+
+
+def get_metrics():
+    """Snapshot of the registry: {task_name: {...}} with plain dicts and lists."""
+    with _lock:
+        return {
+            task_name: {
+                **task_metrics,
+                'calls': dict(task_metrics['calls']),
+                'fallbacks': dict(task_metrics['fallbacks']),
+                'latency_buckets': list(task_metrics['latency_buckets']),
+            }
+            for task_name, task_metrics in _metrics.items()
+        }
+
+
+def latency_quantile(task_metrics, quantile):
+    """Estimates a latency quantile from the histogram (upper bound of the bucket it falls in)."""
+    count = task_metrics['latency_count']
+    if not count:
+        return None
+    rank = quantile * count
+    cumulative = 0
+    for index, bucket_count in enumerate(task_metrics['latency_buckets']):
+        cumulative += bucket_count
+        if cumulative >= rank:
+            return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float('inf')
+    return float('inf')
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(metrics=None):
+    """Prometheus text exposition format (version 0.0.4) of the registry."""
+    metrics = get_metrics() if metrics is None else metrics
+    lines = []
+
+    def family(name, metric_type, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    family('llm_task_calls_total', 'counter', 'LLM task executions by outcome.')
+    for task_name, task_metrics in sorted(metrics.items()):
+        for outcome, count in sorted(task_metrics['calls'].items()):
+            lines.append(f'llm_task_calls_total{{task="{_escape_label(task_name)}",outcome="{outcome}"}} {count}')
+
+    family('llm_task_fallbacks_total', 'counter', 'Failed LLM tasks (raised, or answered by the simulation in simulation mode), by reason.')
+    for task_name, task_metrics in sorted(metrics.items()):
+        for reason, count in sorted(task_metrics['fallbacks'].items()):
+            lines.append(f'llm_task_fallbacks_total{{task="{_escape_label(task_name)}",reason="{reason}"}} {count}')
+
+    for field, help_text in (
+        ('api_calls', 'Requests sent to the model, including retries.'),
+        ('parse_failures', 'Model responses that could not be parsed.'),
+        ('cache_hits', 'Responses served from the AI response cache.'),
+        ('prompt_chars', 'Characters sent in prompts.'),
+        ('response_chars', 'Characters received in responses.'),
+        ('prompt_tokens', 'Prompt tokens (reported by the API, else estimated).'),
+        ('response_tokens', 'Response tokens (reported by the API, else estimated).'),
+    ):
+        name = f'llm_task_{field}_total'
+        family(name, 'counter', help_text)
+        for task_name, task_metrics in sorted(metrics.items()):
+            lines.append(f'{name}{{task="{_escape_label(task_name)}"}} {task_metrics[field]}')
+
+    family('llm_api_call_duration_seconds', 'histogram', 'Latency of requests to the model.')
+    for task_name, task_metrics in sorted(metrics.items()):
+        label = f'task="{_escape_label(task_name)}"'
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), task_metrics['latency_buckets']):
+            cumulative += bucket_count
+            lines.append(f'llm_api_call_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'llm_api_call_duration_seconds_sum{{{label}}} {task_metrics["latency_sum"]:.6f}')
+        lines.append(f'llm_api_call_duration_seconds_count{{{label}}} {task_metrics["latency_count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def format_summary(metrics=None):
+    """Human-readable table of the registry, one row per task."""
+    metrics = get_metrics() if metrics is None else metrics
+    if not metrics:
+        return "No LLM calls recorded."
+    header = f"{'task':<32} {'calls':>6} {'api':>5} {'p50 s':>6} {'p95 s':>6} {'avg s':>6} {'prompt tok':>10} {'resp tok':>9} {'parse err':>9} {'cache':>6}  fallbacks"
+    rows = [header, '-' * len(header)]
+    for task_name, task_metrics in sorted(metrics.items()):
+        latency_count = task_metrics['latency_count']
+        p50, p95 = latency_quantile(task_metrics, 0.5), latency_quantile(task_metrics, 0.95)
+        average = task_metrics['latency_sum'] / latency_count if latency_count else None
+        fallbacks = ", ".join(f"{reason}={count}" for reason, count in sorted(task_metrics['fallbacks'].items())) or "-"
+        rows.append(
+            f"{task_name[:32]:<32} {sum(task_metrics['calls'].values()):>6} {task_metrics['api_calls']:>5} "
+            f"{_format_seconds(p50):>6} {_format_seconds(p95):>6} {_format_seconds(average):>6} "
+            f"{task_metrics['prompt_tokens']:>10} {task_metrics['response_tokens']:>9} "
+            f"{task_metrics['parse_failures']:>9} {task_metrics['cache_hits']:>6}  {fallbacks}"
+        )
+    return "\n".join(rows)
+
+
+def _format_seconds(value):
+    if value is None:
+        return "-"
+    if value == float('inf'):
+        return f">{LATENCY_BUCKETS[-1]:g}"
+    return f"{value:.2f}"
@@ -0,0 +1,212 @@
+"""
+Background execution of match sessions.
+
+start_new_match_session only creates a queued MatchSession and hands it to the background
+executor; run_match_session does the profile extraction, the listing fetch and the LLM
+matching, and records status and progress on the session for the polling endpoint.
+"""
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .. import gemini_utils
+from ..models import MatchSession, MatchedJob, UserProfile
+from ..utils import compute_job_content_hash, compute_structured_profile_fingerprint
+from . import background, pregeneration_service
+from .gemini_resilience import GeminiUnavailableError
+from .job_ranking import shortlist_jobs
+from .job_sync_service import get_todays_job_listings, upsert_job_rows
+from .profile_service import get_structured_profile
+
+NO_LISTINGS_MESSAGE = "There are no new job listings to match against today. Please try again later."
+
+
+def _update_session(match_session, **fields):
+    for field, value in fields.items():
+        setattr(match_session, field, value)
+    match_session.save(update_fields=list(fields.keys()))
+
+
+def enqueue_match_session(match_session):
+    """
+    Schedules run_match_session for a freshly created (queued) session. The request's Supabase
+    client is not passed on: its user token may expire before the session runs.
+    """
+    return background.submit(run_match_session, match_session.id)
+
+
+def run_match_session(match_session_id, supabase=None):
+    """
+    Runs the full matching pipeline for a queued session. Never raises; failures are recorded on the session.
+    Without a supabase client, one is built from settings if the listings have to come from Supabase.
+    """
+    match_session = MatchSession.objects.select_related('user').get(id=match_session_id)
+    _update_session(match_session, status=MatchSession.STATUS_RUNNING, progress_message="Analysing your profile...")
+    try:
+        user_profile = UserProfile.objects.get(user=match_session.user)
+        # Reuses the stored structured profile unless the CV or preferences changed
+        structured_profile_dict = get_structured_profile(user_profile)
+
+        _update_session(match_session, progress_message="Fetching today's job listings...")
+        job_listings_for_api = get_todays_job_listings(supabase)
+        if not job_listings_for_api:
+            _update_session(
+                match_session,
+                status=MatchSession.STATUS_FAILED,
+                error_message=NO_LISTINGS_MESSAGE,
+                progress_message='',
+                completed_at=timezone.now()
+            )
+            return
+
+        # Only the best listings by the local pre-ranker (MATCH_PRERANK_METHOD: job vectors or BM25) are worth the LLM's token budget
+        job_listings_for_api = shortlist_jobs(structured_profile_dict, job_listings_for_api, settings.MATCH_PRERANK_TOP_K)
+        profile_fingerprint = compute_structured_profile_fingerprint(structured_profile_dict)
+        _update_session(
+            match_session,
+            structured_user_profile_json=structured_profile_dict,
+            profile_fingerprint=profile_fingerprint,
+            jobs_total=len(job_listings_for_api),
+            progress_message=f"Matching {len(job_listings_for_api)} jobs against your profile..."
+        )
+
+        # Every match is written as soon as it is known, so the session page fills in while matching runs
+        saved_job_ids = set()
+        save_lock = threading.Lock()
+
+        def save_match(match_item):
+            job_id_str = str(match_item['job'].get('id'))
+            with save_lock:
+                if job_id_str in saved_job_ids:
+                    return
+                save_job_matches_to_db([match_item], match_session)
+                saved_job_ids.add(job_id_str)
+
+        coverage = gemini_utils.MatchCoverage()
+        job_matches_from_api = match_jobs_incrementally(
+            match_session.user, structured_profile_dict, profile_fingerprint, job_listings_for_api,
+            on_match=save_match, coverage=coverage
+        )
+        for match_item in job_matches_from_api:
+            save_match(match_item)
+        _update_session(
+            match_session,
+            status=MatchSession.STATUS_DONE,
+            progress_message='',
+            coverage_stats=coverage.as_dict(),
+            completed_at=timezone.now()
+        )
+        # Optionally prepares cover letters for the top matches while the user reads the results
+        pregeneration_service.schedule_pregeneration(match_session)
+    except GeminiUnavailableError as e:
+        print(f"WARNING: Match session {match_session_id} failed: {e}")
+        _update_session(
+            match_session,
+            status=MatchSession.STATUS_FAILED,
+            error_message=GeminiUnavailableError.user_message,
+            progress_message='',
+            completed_at=timezone.now()
+        )
+    except Exception as e:
+        print(f"ERROR: Match session {match_session_id} failed: {e}")
+        print(traceback.format_exc())
+        _update_session(
+            match_session,
+            status=MatchSession.STATUS_FAILED,
+            error_message="Matching failed unexpectedly. Please try again.",
+            progress_message='',
+            completed_at=timezone.now()
+        )
+
+
+def match_jobs_incrementally(user, structured_profile_dict, profile_fingerprint, job_listings, on_match=None, coverage=None):
+    """
+    Matches job_listings against the structured profile, reusing the scores of jobs
+    the user already had scored for the same profile fingerprint and unchanged job content.
+    Simulated scores are never reused, so those jobs are scored again.
+    Only new or changed jobs are sent to gemini_utils.match_jobs.
+    on_match is called with each match as soon as it is available (reused ones first).
+    coverage (a gemini_utils.MatchCoverage) is passed on to match_jobs.
+    """
+    job_hashes = {str(job.get('id')): compute_job_content_hash(job) for job in job_listings}
+
+    reusable_matches = {}
+    if profile_fingerprint:
+        previous_matches = MatchedJob.objects.filter(
+            match_session__user=user,
+            match_session__profile_fingerprint=profile_fingerprint,
+            job_listing_id__in=list(job_hashes.keys()),
+        ).exclude(job_content_hash='').exclude(is_simulated=True).order_by('match_session__matched_at')
+        for matched_job in previous_matches:
+            # Later sessions overwrite earlier ones, so the most recent score wins
+            if job_hashes.get(str(matched_job.job_listing_id)) == matched_job.job_content_hash:
+                reusable_matches[str(matched_job.job_listing_id)] = matched_job
+
+    carried_forward = []
+    jobs_to_score = []
+    for job in job_listings:
+        matched_job = reusable_matches.get(str(job.get('id')))
+        if matched_job is None:
+            jobs_to_score.append(job)
+            continue
+        carried_forward.append({
+            'job': job,
+            'score': matched_job.score,
+            'reason': matched_job.reason,
+            'insights': matched_job.insights,
+            'tips': matched_job.tips
+        })
+
+    print(f"INFO: [incremental matching] Reusing {len(carried_forward)} scored jobs, sending {len(jobs_to_score)} new or changed jobs to the matcher.")
+    if on_match is not None:
+        for match_item in carried_forward:
+            on_match(match_item)
+    # match_jobs scores the listings in concurrent, token-bounded chunks
+    new_matches = []
+    if jobs_to_score:
+        match_kwargs = {}
+        if on_match is not None:
+            match_kwargs['on_match'] = on_match
+        if coverage is not None:
+            match_kwargs['coverage'] = coverage
+        new_matches = gemini_utils.match_jobs(structured_profile_dict, jobs_to_score, **match_kwargs)
+
+    all_matches = carried_forward + new_matches
+    all_matches.sort(key=lambda x: x['score'], reverse=True)
+    return all_matches
+
+
+def save_job_matches_to_db(job_matches_from_api, match_session):
+    """Save job matches to database"""
+    match_items = []
+    for match_item in job_matches_from_api:
+        job_data_from_api = match_item['job']
+        if not job_data_from_api or 'id' not in job_data_from_api:
+            print(f"Skipping match item due to missing job data or ID: {match_item}")
+            continue
+        match_items.append(match_item)
+
+    with transaction.atomic():
+        # Listings read from the local mirror are unchanged and not written again; listings read
+        # from Supabase are created, or refreshed if their content hash differs from the local row
+        created_ids, updated_ids = upsert_job_rows([match_item['job'] for match_item in match_items])
+        if created_ids or updated_ids:
+            print(f"Stored local JobListings from Supabase data: {len(created_ids)} created, {len(updated_ids)} refreshed.")
+
+        for match_item in match_items:
+            job_data_from_api = match_item['job']
+            MatchedJob.objects.update_or_create(
+                match_session=match_session,
+                job_listing_id=str(job_data_from_api['id']),
+                defaults={
+                    'score': match_item['score'],
+                    'reason': match_item['reason'],
+                    'insights': match_item.get('insights'),
+                    'tips': match_item.get('tips'),
+                    'job_content_hash': compute_job_content_hash(job_data_from_api),
+                    'is_simulated': bool(match_item.get('is_simulated')),
+                }
+            )
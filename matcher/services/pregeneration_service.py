@@ -0,0 +1,106 @@
+"""
+Speculative pre-generation of documents for the best matches of a finished session.
+
+Most users open their top matches and ask for a cover letter right away. When enabled, a
+low-priority background pass generates cover letters (and optionally tailored resumes) for
+the DOCUMENT_PREGENERATION_TOP_N highest-scoring matches above DOCUMENT_PREGENERATION_MIN_SCORE,
+so those documents open instantly. The pass only runs while the regular background executor
+is idle, spends at most DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET estimated tokens per user
+and day, and stops as soon as the user starts a newer match session.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .. import gemini_utils
+from ..models import DocumentGenerationTask, MatchedJob, MatchSession, PregenerationBudget, UserProfile
+from . import background, document_generation_service
+
+# Rough output sizes used to estimate the token cost of a generation before running it
+OUTPUT_TOKEN_ESTIMATES = {
+    DocumentGenerationTask.KIND_COVER_LETTER: 200,
+    DocumentGenerationTask.KIND_CUSTOM_RESUME: 1500,
+}
+PROMPT_GENERATORS = {
+    DocumentGenerationTask.KIND_COVER_LETTER: gemini_utils._generate_cover_letter_prompt,
+    DocumentGenerationTask.KIND_CUSTOM_RESUME: gemini_utils._generate_custom_resume_prompt,
+}
+
+
+def schedule_pregeneration(match_session):
+    """Queues the pre-generation pass for a finished session if the feature is enabled."""
+    if not settings.DOCUMENT_PREGENERATION_ENABLED:
+        return None
+    return background.submit_low_priority(run_pregeneration, match_session.id)
+
+
+def get_tokens_spent_today(user_id):
+    budget = PregenerationBudget.objects.filter(user_id=user_id, day=timezone.localdate()).first()
+    return budget.tokens_spent if budget else 0
+
+
+def _reserve_tokens(user_id, tokens):
+    """
+    Books tokens against the user's daily pre-generation budget. Returns False if they do not fit.
+    Booking is a single conditional UPDATE of the user's budget row, so concurrent passes
+    (in any process) cannot both spend the same remaining budget.
+    """
+    remaining_before = settings.DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET - tokens
+    if remaining_before < 0:
+        return False
+    budget, _ = PregenerationBudget.objects.get_or_create(user_id=user_id, day=timezone.localdate())
+    booked = PregenerationBudget.objects.filter(pk=budget.pk, tokens_spent__lte=remaining_before).update(
+        tokens_spent=F('tokens_spent') + tokens
+    )
+    return booked == 1
+
+
+def estimate_generation_tokens(kind, user_cv_text, job_dict):
+    prompt = PROMPT_GENERATORS[kind](user_cv_text, job_dict)
+    return gemini_utils._estimate_tokens(prompt) + OUTPUT_TOKEN_ESTIMATES[kind]
+
+
+def is_superseded(match_session):
+    """True once the user has started a newer match session."""
+    return MatchSession.objects.filter(user_id=match_session.user_id, matched_at__gt=match_session.matched_at).exists()
+
+
+def run_pregeneration(match_session_id):
+    """Generates the documents for the session's top matches, one at a time, on idle capacity."""
+    match_session = MatchSession.objects.get(id=match_session_id)
+    if match_session.user_id is None:
+        return 0
+    user_profile = UserProfile.objects.filter(user_id=match_session.user_id).select_related('user').first()
+    if not user_profile or not user_profile.user_cv_text:
+        return 0
+
+    top_matches = MatchedJob.objects.filter(
+        match_session=match_session,
+        score__gte=settings.DOCUMENT_PREGENERATION_MIN_SCORE
+    ).select_related('job_listing').order_by('-score')[:settings.DOCUMENT_PREGENERATION_TOP_N]
+
+    generated = 0
+    for matched_job in top_matches:
+        job = matched_job.job_listing
+        for kind in settings.DOCUMENT_PREGENERATION_KINDS:
+            if not background.wait_until_idle(
+                settings.DOCUMENT_PREGENERATION_MAX_IDLE_WAIT_SECONDS,
+                should_stop=lambda: is_superseded(match_session)
+            ) or is_superseded(match_session):
+                print(f"INFO: [pre-generation] Stopping for session {match_session_id}: superseded or no idle capacity.")
+                return generated
+            if document_generation_service.get_document_content(user_profile.user, job, kind) is not None:
+                continue
+
+            estimated_tokens = estimate_generation_tokens(kind, user_profile.user_cv_text, document_generation_service.job_listing_to_dict(job))
+            if not _reserve_tokens(match_session.user_id, estimated_tokens):
+                print(f"INFO: [pre-generation] Daily token budget of user {match_session.user_id} exhausted; stopping.")
+                return generated
+
+            # Attaches to (skips) a generation the user already started for this job
+            task, claimed = document_generation_service.claim_document_generation(user_profile.user, job, kind)
+            if claimed:
+                document_generation_service.run_document_generation(task.id, pregenerated=True)
+                generated += 1
+    print(f"INFO: [pre-generation] Generated {generated} document(s) for session {match_session_id}.")
+    return generated
@@ -0,0 +1,100 @@
+"""
+Structured user profile cache.
+
+extract_user_profile is a full Gemini call, so its result is stored on UserProfile together
+with a fingerprint of its inputs. The LLM is only called again when the CV, the preferences
+or the profile prompt version change. Simulated profiles are never stored, so a real model
+extracts the profile as soon as one is available.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+from django.utils import timezone
+
+from .. import gemini_utils
+from ..models import UserProfile
+from . import background, llm_metrics
+
+# Only profiles that really came from the model are worth storing
+STORABLE_OUTCOMES = (llm_metrics.OUTCOME_SUCCESS, llm_metrics.OUTCOME_CACHED)
+
+_inflight_lock = threading.Lock()
+_inflight_extractions = {}
+
+
+def compute_profile_input_fingerprint(user_cv_text, user_preferences_text):
+    payload = json.dumps(
+        [user_cv_text or '', user_preferences_text or '', gemini_utils.USER_PROFILE_PROMPT_VERSION],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _extract_and_store(user_pk, user_cv_text, user_preferences_text, fingerprint):
+    structured_profile, outcome = gemini_utils.extract_user_profile(
+        user_cv_text or '', user_preferences_text or '', return_outcome=True
+    )
+    if outcome not in STORABLE_OUTCOMES:
+        # A simulated profile (simulation mode, no model, or a fallback) must not be cached as if it were the real one
+        return structured_profile
+    # Only store if the profile still has the inputs we extracted from
+    UserProfile.objects.filter(
+        pk=user_pk,
+        user_cv_text=user_cv_text,
+        user_preferences_text=user_preferences_text
+    ).update(
+        structured_profile_json=structured_profile,
+        structured_profile_fingerprint=fingerprint,
+        structured_profile_updated_at=timezone.now()
+    )
+    return structured_profile
+
+
+def _extract_once(user_profile, fingerprint, run_in_background):
+    """Starts (or joins) the extraction for this user and fingerprint, returning its Future."""
+    key = (user_profile.pk, fingerprint)
+    with _inflight_lock:
+        future = _inflight_extractions.get(key)
+        if future is not None:
+            return future
+        args = (_extract_and_store, user_profile.pk, user_profile.user_cv_text, user_profile.user_preferences_text, fingerprint)
+        if run_in_background:
+            future = background.submit(*args)
+        else:
+            future = Future()
+        _inflight_extractions[key] = future
+
+    if not run_in_background:
+        try:
+            future.set_result(args[0](*args[1:]))
+        except Exception as e:
+            future.set_exception(e)
+    future.add_done_callback(lambda _: _forget_extraction(key))
+    return future
+
+
+def _forget_extraction(key):
+    with _inflight_lock:
+        _inflight_extractions.pop(key, None)
+
+
+def get_structured_profile(user_profile):
+    """
+    Returns the structured profile for user_profile, calling the LLM only when the
+    stored one is missing or its fingerprint no longer matches the CV and preferences.
+    """
+    fingerprint = compute_profile_input_fingerprint(user_profile.user_cv_text, user_profile.user_preferences_text)
+    if user_profile.structured_profile_json and user_profile.structured_profile_fingerprint == fingerprint:
+        print(f"INFO: Reusing stored structured profile for user {user_profile.pk}.")
+        return user_profile.structured_profile_json
+    return _extract_once(user_profile, fingerprint, run_in_background=False).result()
+
+
+def refresh_structured_profile_in_background(user_profile):
+    """Re-extracts the structured profile off the request path if its inputs changed."""
+    fingerprint = compute_profile_input_fingerprint(user_profile.user_cv_text, user_profile.user_preferences_text)
+    if user_profile.structured_profile_fingerprint == fingerprint or not user_profile.user_cv_text:
+        return None
+    return _extract_once(user_profile, fingerprint, run_in_background=True)
@@ -0,0 +1,138 @@
+"""
+Per-request time breakdown by category (SQL, Supabase, auth, LLM, templates).
+
+PerformanceTimingMiddleware starts a breakdown for the request thread; code that talks to a
+slow dependency wraps the call in measure(category) or reports it with add(). Outside a
+request (background threads, management commands) both are no-ops. Finished requests feed
+rolling per-view samples, from which view_percentiles() computes percentiles per category.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+CATEGORY_DB = 'db'
+CATEGORY_SUPABASE = 'supabase'
+CATEGORY_AUTH = 'auth'
+CATEGORY_LLM = 'llm'
+CATEGORY_TEMPLATE = 'template'
+CATEGORIES = (CATEGORY_DB, CATEGORY_SUPABASE, CATEGORY_AUTH, CATEGORY_LLM, CATEGORY_TEMPLATE)
+CATEGORY_DESCRIPTIONS = {
+    CATEGORY_DB: 'SQL',
+    CATEGORY_SUPABASE: 'Supabase REST',
+    CATEGORY_AUTH: 'Supabase auth',
+    CATEGORY_LLM: 'Gemini',
+    CATEGORY_TEMPLATE: 'Templates',
+}
+
+_local = threading.local()
+_samples_lock = threading.Lock()
+_view_samples = defaultdict(deque)  # view name -> deque of {category: seconds, 'total': seconds}
+
+
+class RequestBreakdown:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._depth = defaultdict(int)
+
+    def add(self, category, seconds, count=1):
+        self.seconds[category] += seconds
+        self.counts[category] += count
+
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    _local.breakdown = RequestBreakdown()
+    return _local.breakdown
+
+
+def stop():
+    breakdown = getattr(_local, 'breakdown', None)
+    _local.breakdown = None
+    return breakdown
+
+
+def current():
+    return getattr(_local, 'breakdown', None)
+
+
+def add(category, seconds, count=1):
+    breakdown = current()
+    if breakdown is not None:
+        breakdown.add(category, seconds, count)
+
+
+@contextmanager
+def measure(category):
+    """Adds the time spent in the block to category. Nested blocks of one category count once."""
+    breakdown = current()
+    if breakdown is None or breakdown._depth[category]:
+        yield
+        return
+    breakdown._depth[category] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        breakdown._depth[category] -= 1
+        breakdown.add(category, time.perf_counter() - started)
+
+
+def record_view_sample(view_name, breakdown, total_seconds):
+    sample = {category: breakdown.seconds.get(category, 0.0) for category in CATEGORIES}
+    sample['total'] = total_seconds
+    with _samples_lock:
+        samples = _view_samples[view_name]
+        samples.append(sample)
+        while len(samples) > settings.REQUEST_TIMING_WINDOW:
+            samples.popleft()
+
+
+def reset_view_samples():
+    with _samples_lock:
+        _view_samples.clear()
+
+
+def _percentile(sorted_values, quantile):
+    index = min(len(sorted_values) - 1, max(0, int(round(quantile * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def view_percentiles(quantiles=(0.5, 0.9, 0.99)):
+    """{view name: {'count': n, category or 'total': {'p50': ms, ...}}} over the rolling window."""
+    with _samples_lock:
+        snapshot = {view_name: list(samples) for view_name, samples in _view_samples.items()}
+    result = {}
+    for view_name, samples in sorted(snapshot.items()):
+        view_stats = {'count': len(samples)}
+        for category in CATEGORIES + ('total',):
+            values = sorted(sample[category] for sample in samples)
+            view_stats[category] = {
+                f"p{int(quantile * 100)}": round(_percentile(values, quantile) * 1000, 1) for quantile in quantiles
+            }
+        result[view_name] = view_stats
+    return result
+
+
+def server_timing_header(breakdown, total_seconds):
+    """Server-Timing header value, e.g. 'db;dur=12.3;desc="SQL (4)", total;dur=80.0'."""
+    entries = []
+    for category in CATEGORIES:
+        if category in breakdown.seconds:
+            description = f"{CATEGORY_DESCRIPTIONS[category]} ({breakdown.counts[category]})"
+            entries.append(f'{category};dur={breakdown.seconds[category] * 1000:.1f};desc="{description}"')
+    entries.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ", ".join(entries)
+
+
+def format_breakdown(breakdown, total_seconds):
+    parts = [f"{category}={breakdown.seconds[category] * 1000:.0f}ms/{breakdown.counts[category]}" for category in CATEGORIES if category in breakdown.seconds]
+    accounted = sum(breakdown.seconds.values())
+    parts.append(f"other={max(0.0, total_seconds - accounted) * 1000:.0f}ms")
+    return " ".join(parts)
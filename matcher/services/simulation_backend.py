@@ -0,0 +1,142 @@
+"""
+Configurable simulation backend for the simulate_* functions in gemini_utils.
+
+With AI_SIMULATION_SEED set, simulated outputs are reproducible: each call draws from a random
+generator seeded by (seed, task name, prompt), so results do not depend on thread scheduling.
+For load testing, simulated calls can also behave like the real API:
+
+- latency drawn from a lognormal distribution fitted to AI_SIMULATION_LATENCY_P50_MS and
+  AI_SIMULATION_LATENCY_P99_MS, plus generation time for the simulated response size,
+- response sizes that scale with the prompt (AI_SIMULATION_RESPONSE_TOKENS_PER_PROMPT_TOKEN),
+- injected errors (ServiceUnavailable) and timeouts (DeadlineExceeded after
+  AI_SIMULATION_TIMEOUT_SECONDS) at configurable rates.
+
+Injected failures are raised inside gemini_resilience.call_gemini, so retries, backoff and the
+circuit breaker behave as they would against the real model.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    SimulatedError = google_exceptions.ServiceUnavailable
+    SimulatedTimeout = google_exceptions.DeadlineExceeded
+except ImportError:  # pragma: no cover - google-api-core ships with google-generativeai
+    SimulatedError = ConnectionError
+    SimulatedTimeout = TimeoutError
+
+# z-score of the 99th percentile of the standard normal distribution
+Z_99 = 2.3263
+FILLER_WORDS = (
+    "experience team project delivered improved built designed led customers results "
+    "python django data cloud platform services quality reliable scalable growth"
+).split()
+
+_local = threading.local()
+_call_counts = {}
+_call_counts_lock = threading.Lock()
+
+
+def is_active():
+    """True if simulated calls should take time or fail, i.e. the load-testing knobs are in use."""
+    return bool(
+        settings.AI_SIMULATION_LATENCY_P50_MS > 0
+        or settings.AI_SIMULATION_ERROR_RATE > 0
+        or settings.AI_SIMULATION_TIMEOUT_RATE > 0
+    )
+
+
+def _seed_for(*parts):
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _new_rng(*parts):
+    if settings.AI_SIMULATION_SEED is None:
+        return random.Random()
+    return random.Random(_seed_for(settings.AI_SIMULATION_SEED, *parts))
+
+
+def get_rng():
+    """Random generator for the simulation running on this thread (reproducible with a seed)."""
+    rng = getattr(_local, 'rng', None)
+    if rng is None:
+        rng = _new_rng('unscoped', threading.current_thread().name)
+        _local.rng = rng
+    return rng
+
+
+def estimate_response_tokens(prompt):
+    """Simulated response size for a prompt, in tokens (chars / 4, like gemini_utils)."""
+    return int(len(prompt or '') / 4 * settings.AI_SIMULATION_RESPONSE_TOKENS_PER_PROMPT_TOKEN)
+
+
+@contextmanager
+def seeded(task_name, prompt):
+    """Makes get_rng() and current_response_tokens() refer to this (task, prompt) inside the block."""
+    previous = (getattr(_local, 'rng', None), getattr(_local, 'response_tokens', 0))
+    _local.rng = _new_rng(task_name, prompt or '')
+    _local.response_tokens = estimate_response_tokens(prompt)
+    try:
+        yield _local.rng
+    finally:
+        _local.rng, _local.response_tokens = previous
+
+
+def current_response_tokens():
+    return getattr(_local, 'response_tokens', 0)
+
+
+def filler_text(token_count):
+    """Deterministic (given the current rng) filler of roughly token_count tokens."""
+    if token_count <= 0:
+        return ""
+    rng = get_rng()
+    # Words average a little over one token
+    return " ".join(rng.choice(FILLER_WORDS) for _ in range(token_count))
+
+
+def sample_latency_seconds(rng, response_tokens=0):
+    p50_ms = settings.AI_SIMULATION_LATENCY_P50_MS
+    latency = 0.0
+    if p50_ms > 0:
+        p99_ms = max(settings.AI_SIMULATION_LATENCY_P99_MS, p50_ms)
+        sigma = (math.log(p99_ms) - math.log(p50_ms)) / Z_99
+        latency = rng.lognormvariate(math.log(p50_ms), sigma) / 1000.0
+    if response_tokens and settings.AI_SIMULATION_OUTPUT_TOKENS_PER_SECOND > 0:
+        latency += response_tokens / settings.AI_SIMULATION_OUTPUT_TOKENS_PER_SECOND
+    return latency
+
+
+def _next_call_number(task_name, prompt):
+    key = _seed_for(task_name, prompt or '')
+    with _call_counts_lock:
+        if len(_call_counts) > 10000:
+            _call_counts.clear()
+        _call_counts[key] = _call_counts.get(key, 0) + 1
+        return _call_counts[key]
+
+
+def simulate_call(task_name, prompt):
+    """
+    Stands in for model.generate_content: sleeps for a sampled latency and may raise an
+    injected error or timeout. Repeated calls for the same prompt (retries) draw fresh
+    outcomes, in a reproducible sequence when a seed is set.
+    """
+    rng = _new_rng('call', task_name, prompt or '', _next_call_number(task_name, prompt))
+    roll = rng.random()
+    if roll < settings.AI_SIMULATION_TIMEOUT_RATE:
+        time.sleep(settings.AI_SIMULATION_TIMEOUT_SECONDS)
+        raise SimulatedTimeout(f"Simulated timeout for {task_name}")
+    latency = sample_latency_seconds(rng, estimate_response_tokens(prompt))
+    if roll < settings.AI_SIMULATION_TIMEOUT_RATE + settings.AI_SIMULATION_ERROR_RATE:
+        # Errors usually come back faster than full responses
+        time.sleep(latency / 2)
+        raise SimulatedError(f"Simulated error for {task_name}")
+    time.sleep(latency)
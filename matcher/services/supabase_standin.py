@@ -0,0 +1,384 @@
+"""
+Local stand-in for the parts of Supabase the app uses, for offline benchmarks and tests:
+
+- PostgREST table reads (GET /rest/v1/<table>) with select, eq/neq/gt/gte/lt/lte/in filters,
+  or/and groups, order, limit and offset, which covers job_listing_service's job_listings
+  (including keyset pagination) and job_anomaly_analysis queries,
+- GoTrue auth: anonymous sign-in (POST /auth/v1/signup) and token validation
+  (GET /auth/v1/user), as used by SupabaseAuthMiddleware. Tokens are HS256 JWTs signed
+  with the server's secret, so supabase-py's set_session accepts them.
+
+Tables are seeded from CSV or JSON files (or generated), and every response can be delayed by
+a fixed latency plus a per-row cost, to measure how the middleware and services scale with
+data size. Run it with `python manage.py supabase_standin`, or in-process with running_standin().
+"""
+import base64
+import csv
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_JWT_SECRET = 'supabase-standin-secret'
+TOKEN_LIFETIME_SECONDS = 3600
+COMPARISON_OPERATORS = {
+    'eq': lambda value, arg: value == arg,
+    'neq': lambda value, arg: value != arg,
+    'gt': lambda value, arg: value > arg,
+    'gte': lambda value, arg: value >= arg,
+    'lt': lambda value, arg: value < arg,
+    'lte': lambda value, arg: value <= arg,
+}
+RESERVED_QUERY_PARAMS = {'select', 'order', 'limit', 'offset'}
+LOGICAL_OPERATORS = {'or': any, 'and': all}
+ANALYSIS_ROLES = ['backend_developer', 'data_scientist', 'devops_engineer', 'operations_manager', 'hr_specialist']
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64url_decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def encode_jwt(payload, secret):
+    header = _b64url(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode('utf-8'))
+    body = _b64url(json.dumps(payload).encode('utf-8'))
+    signature = hmac.new(secret.encode('utf-8'), f"{header}.{body}".encode('ascii'), hashlib.sha256).digest()
+    return f"{header}.{body}.{_b64url(signature)}"
+
+
+def decode_jwt(token, secret):
+    """Returns the payload of a valid, unexpired token signed with secret, else None."""
+    try:
+        header, body, signature = token.split('.')
+        expected = hmac.new(secret.encode('utf-8'), f"{header}.{body}".encode('ascii'), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
+            return None
+        payload = json.loads(_b64url_decode(body))
+    except (ValueError, TypeError):
+        return None
+    if payload.get('exp') and payload['exp'] <= time.time():
+        return None
+    return payload
+
+
+def load_rows(path):
+    """Rows from a JSON file (a list of objects) or a CSV file with a header line."""
+    with open(path, encoding='utf-8', newline='') as rows_file:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            return [dict(row) for row in csv.DictReader(rows_file)]
+        rows = json.load(rows_file)
+    if not isinstance(rows, list):
+        raise ValueError(f"{path} must contain a JSON array of rows")
+    return rows
+
+
+def generate_job_rows(count, seed=0, created_at=None):
+    """
+    count synthetic job_listings rows (created today unless created_at is given), each with
+    a job_anomaly_analysis row, for scaling experiments. Returns (job_rows, anomaly_rows).
+    """
+    rng = random.Random(seed)
+    created_at = (created_at or datetime.now()).isoformat()
+    titles = ['Backend Developer', 'Data Scientist', 'Product Manager', 'DevOps Engineer', 'UX Designer', 'Sales Manager']
+    cities = ['Berlin', 'Munich', 'Hamburg', 'Cologne', 'Frankfurt', 'Remote']
+    job_rows, anomaly_rows = [], []
+    for index in range(count):
+        job_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        title = rng.choice(titles)
+        job_rows.append({
+            'id': job_id,
+            'job_title': title,
+            'company_name': f"Company {index % 97}",
+            'description': f"We are hiring a {title} to join our team. Python, SQL and teamwork are a plus.",
+            'application_url': f"https://example.com/jobs/{job_id}",
+            'location': rng.choice(cities),
+            'industry': 'Technology',
+            'level': rng.choice(['Junior', 'Mid', 'Senior']),
+            'created_at': created_at,
+        })
+        role_similarity = {role: round(rng.random(), 3) for role in ANALYSIS_ROLES}
+        anomaly_rows.append({
+            'job_listing_id': job_id,
+            'anomaly_score': round(rng.random(), 3),
+            # Shaped like the production rows, including the JSON-encoded nested fields
+            'analysis_data': {
+                'job_id': job_id,
+                'role': max(role_similarity, key=role_similarity.get),
+                'industry': 'Technology',
+                'job_title': title,
+                'company_name': f"Company {index % 97}",
+                'role_similarity_analysis': json.dumps(role_similarity),
+                'semantic_anomalies': json.dumps([
+                    {
+                        'chunk': f"Requirement {chunk_index} of the {title} role.",
+                        'type': rng.choice(['Cross-Role', 'Unusual Requirement']),
+                        'similarity_to_primary_role': round(rng.random(), 3),
+                        'related_to_role': rng.choice(ANALYSIS_ROLES),
+                        'related_role_similarity': round(rng.random(), 3),
+                    }
+                    for chunk_index in range(4)
+                ]),
+                'baseline_composition': json.dumps({role: round(1 / len(ANALYSIS_ROLES), 3) for role in ANALYSIS_ROLES}),
+            },
+            'created_at': created_at,
+        })
+    return job_rows, anomaly_rows
+
+
+def _parse_filter(raw):
+    """'gte.2024-01-01' -> predicate; 'in.(a,"b,c")' -> membership test."""
+    operator, _, argument = raw.partition('.')
+    if operator == 'in':
+        values = next(csv.reader([argument.strip()[1:-1]], skipinitialspace=True), [])
+        allowed = set(values)
+        return lambda value: value is not None and str(value) in allowed
+    compare = COMPARISON_OPERATORS.get(operator)
+    if compare is None:
+        raise ValueError(f"Unsupported filter operator '{operator}'")
+
+    def predicate(value):
+        if value is None:
+            return False
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            try:
+                return compare(value, float(argument))
+            except ValueError:
+                return False
+        return compare(str(value), argument)
+    return predicate
+
+
+def _split_logical_terms(text):
+    """'a.eq.1,and(b.gt."x,y",c.lt.2)' -> ['a.eq.1', 'and(b.gt."x,y",c.lt.2)']"""
+    terms, current, depth, quoted = [], '', 0, False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            terms.append(current)
+            current = ''
+            continue
+        current += char
+    if current:
+        terms.append(current)
+    return terms
+
+
+def _parse_logical_filter(operator, group):
+    """'or', '(a.eq.1,and(b.gt.2,c.lt.3))' -> row predicate."""
+    row_predicates = []
+    for term in _split_logical_terms(group.strip()[1:-1]):
+        nested_operator, _, nested_group = term.partition('(')
+        if nested_operator in LOGICAL_OPERATORS and term.endswith(')'):
+            row_predicates.append(_parse_logical_filter(nested_operator, f"({nested_group}"))
+            continue
+        column, _, raw = term.partition('.')
+        filter_operator, _, argument = raw.partition('.')
+        if len(argument) >= 2 and argument[0] == argument[-1] == '"':
+            argument = argument[1:-1]
+        value_predicate = _parse_filter(f"{filter_operator}.{argument}")
+        row_predicates.append(lambda row, column=column, value_predicate=value_predicate: value_predicate(row.get(column)))
+    combine = LOGICAL_OPERATORS[operator]
+    return lambda row: combine(predicate(row) for predicate in row_predicates)
+
+
+def query_rows(rows, params):
+    """Applies PostgREST-style query parameters (a list of (name, value) pairs) to rows."""
+    predicates = []
+    for name, value in params:
+        if name in LOGICAL_OPERATORS:
+            predicates.append(_parse_logical_filter(name, value))
+        elif name not in RESERVED_QUERY_PARAMS:
+            predicates.append(lambda row, column=name, value_predicate=_parse_filter(value): value_predicate(row.get(column)))
+    options = dict(params)
+    result = [row for row in rows if all(predicate(row) for predicate in predicates)]
+    for term in reversed([term for term in options.get('order', '').split(',') if term]):
+        column, _, direction = term.partition('.')
+        result.sort(key=lambda row: (row.get(column) is None, str(row.get(column))), reverse=direction.startswith('desc'))
+    offset = int(options.get('offset', 0))
+    result = result[offset:]
+    if 'limit' in options:
+        result = result[:int(options['limit'])]
+    columns = [column.strip() for column in options.get('select', '*').split(',')]
+    if '*' not in columns:
+        result = [{column: row.get(column) for column in columns} for row in result]
+    return result
+
+
+class SupabaseStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tables=None, latency_ms=0, latency_per_row_us=0, jwt_secret=DEFAULT_JWT_SECRET, quiet=False):
+        super().__init__(address, SupabaseStandInHandler)
+        self.tables = tables if tables is not None else {}
+        self.latency_ms = latency_ms
+        self.latency_per_row_us = latency_per_row_us
+        self.jwt_secret = jwt_secret
+        self.quiet = quiet
+        self.users = {}
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def anon_key(self):
+        """API key for SUPABASE_KEY; never expires."""
+        return encode_jwt({'iss': 'supabase-standin', 'role': 'anon'}, self.jwt_secret)
+
+    def count_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def sleep_latency(self, row_count=0):
+        delay = self.latency_ms / 1000.0 + row_count * self.latency_per_row_us / 1_000_000.0
+        if delay > 0:
+            time.sleep(delay)
+
+    def create_anonymous_user(self):
+        now = datetime.now(timezone.utc).isoformat()
+        user = {
+            'id': str(uuid.uuid4()),
+            'aud': 'authenticated',
+            'role': 'authenticated',
+            'email': '',
+            'phone': '',
+            'app_metadata': {'provider': 'anonymous', 'providers': []},
+            'user_metadata': {},
+            'identities': [],
+            'created_at': now,
+            'updated_at': now,
+            'last_sign_in_at': now,
+            'is_anonymous': True,
+        }
+        with self._lock:
+            self.users[user['id']] = user
+        return user
+
+    def issue_session(self, user):
+        expires_at = int(time.time()) + TOKEN_LIFETIME_SECONDS
+        access_token = encode_jwt({
+            'sub': user['id'],
+            'aud': 'authenticated',
+            'role': 'authenticated',
+            'is_anonymous': user.get('is_anonymous', False),
+            'exp': expires_at,
+            'iat': int(time.time()),
+        }, self.jwt_secret)
+        return {
+            'access_token': access_token,
+            'token_type': 'bearer',
+            'expires_in': TOKEN_LIFETIME_SECONDS,
+            'expires_at': expires_at,
+            'refresh_token': uuid.uuid4().hex,
+            'user': user,
+        }
+
+    def user_for_token(self, token):
+        payload = decode_jwt(token or '', self.jwt_secret)
+        if not payload:
+            return None
+        with self._lock:
+            return self.users.get(payload.get('sub'))
+
+
+class SupabaseStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_auth_error(self, status, message):
+        self._send_json(status, {'code': status, 'error_code': 'bad_jwt', 'msg': message})
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _bearer_token(self):
+        authorization = self.headers.get('Authorization', '')
+        return authorization[7:] if authorization.lower().startswith('bearer ') else None
+
+    def do_GET(self):
+        self.server.count_request()
+        url = urlsplit(self.path)
+        if url.path.startswith('/rest/v1/'):
+            table = url.path[len('/rest/v1/'):]
+            if table not in self.server.tables:
+                self._send_json(404, {'code': '42P01', 'message': f'relation "public.{table}" does not exist', 'details': None, 'hint': None})
+                return
+            try:
+                rows = query_rows(self.server.tables[table], parse_qsl(url.query, keep_blank_values=True))
+            except ValueError as e:
+                self._send_json(400, {'code': 'PGRST100', 'message': str(e), 'details': None, 'hint': None})
+                return
+            self.server.sleep_latency(len(self.server.tables[table]))
+            content_range = f"0-{len(rows) - 1}/*" if rows else "*/*"
+            self._send_json(200, rows, headers={'Content-Range': content_range})
+            return
+        if url.path == '/auth/v1/user':
+            self.server.sleep_latency()
+            user = self.server.user_for_token(self._bearer_token())
+            if user is None:
+                self._send_auth_error(401, 'invalid JWT: unable to parse or verify signature, token is expired or user does not exist')
+                return
+            self._send_json(200, user)
+            return
+        self._send_json(404, {'code': 404, 'msg': f'Unknown path {url.path}'})
+
+    def do_POST(self):
+        self.server.count_request()
+        url = urlsplit(self.path)
+        self._read_body()
+        if url.path == '/auth/v1/signup':
+            self.server.sleep_latency()
+            self._send_json(200, self.server.issue_session(self.server.create_anonymous_user()))
+            return
+        if url.path == '/auth/v1/logout':
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_json(404, {'code': 404, 'msg': f'Unknown path {url.path}'})
+
+
+@contextmanager
+def running_standin(**server_kwargs):
+    """Runs a stand-in on a free local port in a background thread, e.g. as a test fixture."""
+    server = SupabaseStandInServer(('127.0.0.1', 0), **server_kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,8 +1,8 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from unittest.mock import patch, MagicMock
-from .models import UserProfile, JobListing, MatchSession, MatchedJob, SavedJob, CustomResume, CoverLetter
+from .models import UserProfile, JobListing, MatchSession, MatchedJob, SavedJob, CustomResume, CoverLetter, AIResponseCacheEntry
 
 User = get_user_model()
 
@@ -115,3 +115,1392 @@ class MatcherViewsTestCase(TestCase):
         mock_generate_resume.assert_called_once()
         self.assertTrue(CustomResume.objects.filter(job_listing=self.job1, user=self.user).exists())
         self.assertIn('Generated Custom Resume', response.context['custom_resume_content'])
+
+
+class GeminiMatchJobsTestCase(TestCase):
+    """Tests for the chunked, concurrent job matching in gemini_utils."""
+
+    def _make_jobs(self, count, description='A job description.'):
+        return [
+            {'id': f'job{i}', 'job_title': f'Developer {i}', 'company_name': 'TestCorp', 'description': description}
+            for i in range(count)
+        ]
+
+    def test_chunk_job_listings_respects_job_cap_and_token_budget(self):
+        from . import gemini_utils
+        jobs = self._make_jobs(10)
+        chunks = gemini_utils._chunk_job_listings(jobs, token_budget=100000, max_jobs_per_chunk=4)
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+        big_jobs = self._make_jobs(3, description='x' * 4000)
+        chunks = gemini_utils._chunk_job_listings(big_jobs, token_budget=500, max_jobs_per_chunk=30)
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1, 1])
+
+    @override_settings(USE_AI_SIMULATION=True, GEMINI_MATCH_MAX_JOBS_PER_CHUNK=7, GEMINI_MATCH_MAX_CONCURRENCY=4)
+    def test_match_jobs_scores_every_job_across_chunks(self):
+        from . import gemini_utils
+        jobs = self._make_jobs(50)
+        results = gemini_utils.match_jobs({'summary': 'Test'}, jobs)
+        self.assertEqual(sorted(r['job']['id'] for r in results), sorted(j['id'] for j in jobs))
+        scores = [r['score'] for r in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+
+@override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_TASK_TTLS={'user profile extraction': 3600})
+class AIResponseCacheTestCase(TestCase):
+    """Tests for the persistent Gemini response cache used by _execute_ai_task."""
+
+    def test_identical_prompt_is_served_from_cache(self):
+        from . import gemini_utils
+        from .services import ai_response_cache
+        fake_model = MagicMock()
+        fake_model.generate_content.return_value = MagicMock(text='{"summary": "Cached profile"}')
+        with patch.object(gemini_utils, 'model', fake_model):
+            first = gemini_utils.extract_user_profile('CV text', 'Prefs')
+            second = gemini_utils.extract_user_profile('CV text', 'Prefs')
+        self.assertEqual(first, second)
+        self.assertEqual(fake_model.generate_content.call_count, 1)
+        self.assertEqual(AIResponseCacheEntry.objects.get().hit_count, 1)
+        self.assertGreaterEqual(ai_response_cache.get_cache_stats()['user profile extraction']['hits'], 1)
+
+    @override_settings(AI_RESPONSE_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted(self):
+        from .services import ai_response_cache
+        for prompt in ('a', 'b', 'c'):
+            ai_response_cache.store_response('user profile extraction', 'model', prompt, f'response {prompt}')
+        self.assertEqual(AIResponseCacheEntry.objects.count(), 2)
+        self.assertIsNone(ai_response_cache.get_cached_response('user profile extraction', 'model', 'a'))
+        self.assertEqual(ai_response_cache.get_cached_response('user profile extraction', 'model', 'c'), 'response c')
+
+    def test_tasks_without_ttl_are_not_cached(self):
+        from .services import ai_response_cache
+        ai_response_cache.store_response('cover letter generation', 'model', 'prompt', 'text')
+        self.assertFalse(AIResponseCacheEntry.objects.exists())
+
+
+class IncrementalMatchingTestCase(TestCase):
+    """Tests that re-matching only sends new or changed jobs to the matcher."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='incremental', password='password123')
+        self.job = JobListing.objects.create(id='job1', company_name='TestCorp', job_title='Python Developer', description='Python.')
+        self.listings = [
+            {'id': 'job1', 'company_name': 'TestCorp', 'job_title': 'Python Developer', 'description': 'Python.'},
+            {'id': 'job2', 'company_name': 'OtherCorp', 'job_title': 'Go Developer', 'description': 'Go.'},
+        ]
+
+    @patch('matcher.services.match_session_service.gemini_utils.match_jobs')
+    def test_only_unscored_jobs_are_sent_to_match_jobs(self, mock_match_jobs):
+        from .utils import compute_job_content_hash
+        from .services.match_session_service import match_jobs_incrementally
+        session = MatchSession.objects.create(user=self.user, skills_text='cv', profile_fingerprint='fp')
+        MatchedJob.objects.create(
+            match_session=session, job_listing=self.job, score=80, reason='Reused',
+            job_content_hash=compute_job_content_hash(self.listings[0])
+        )
+        mock_match_jobs.return_value = [{'job': self.listings[1], 'score': 90, 'reason': 'New', 'insights': '', 'tips': ''}]
+
+        matches = match_jobs_incrementally(self.user, {'summary': 'x'}, 'fp', self.listings)
+
+        mock_match_jobs.assert_called_once_with({'summary': 'x'}, [self.listings[1]])
+        self.assertEqual([(m['job']['id'], m['score']) for m in matches], [('job2', 90), ('job1', 80)])
+
+    @patch('matcher.services.match_session_service.gemini_utils.match_jobs', return_value=[])
+    def test_changed_job_content_is_rescored(self, mock_match_jobs):
+        from .services.match_session_service import match_jobs_incrementally
+        session = MatchSession.objects.create(user=self.user, skills_text='cv', profile_fingerprint='fp')
+        MatchedJob.objects.create(match_session=session, job_listing=self.job, score=80, job_content_hash='outdated')
+
+        match_jobs_incrementally(self.user, {'summary': 'x'}, 'fp', self.listings[:1])
+
+        mock_match_jobs.assert_called_once_with({'summary': 'x'}, self.listings[:1])
+
+    def test_saving_matches_refreshes_changed_job_listings(self):
+        from .services.match_session_service import save_job_matches_to_db
+        session = MatchSession.objects.create(user=self.user, skills_text='cv')
+        changed_job = dict(self.listings[0], description='Python and Django.')
+        save_job_matches_to_db([
+            {'job': changed_job, 'score': 80, 'reason': '', 'insights': '', 'tips': ''},
+            {'job': self.listings[1], 'score': 60, 'reason': '', 'insights': '', 'tips': ''},
+        ], session)
+        self.assertEqual(JobListing.objects.get(id='job1').description, 'Python and Django.')
+        self.assertEqual(JobListing.objects.get(id='job2').job_title, 'Go Developer')
+        self.assertEqual(session.matched_jobs.count(), 2)
+
+    @patch('matcher.services.match_session_service.gemini_utils.match_jobs', return_value=[])
+    def test_simulated_scores_are_not_reused(self, mock_match_jobs):
+        from .utils import compute_job_content_hash
+        from .services.match_session_service import match_jobs_incrementally, save_job_matches_to_db
+        from .gemini_utils import simulate_match_jobs
+        session = MatchSession.objects.create(user=self.user, skills_text='cv', profile_fingerprint='fp')
+        save_job_matches_to_db(simulate_match_jobs({'summary': 'x'}, self.listings[:1]), session)
+        matched_job = MatchedJob.objects.get(match_session=session)
+        self.assertTrue(matched_job.is_simulated)
+        self.assertEqual(matched_job.job_content_hash, compute_job_content_hash(self.listings[0]))
+
+        match_jobs_incrementally(self.user, {'summary': 'x'}, 'fp', self.listings[:1])
+
+        mock_match_jobs.assert_called_once_with({'summary': 'x'}, self.listings[:1])
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class StructuredProfileCacheTestCase(TestCase):
+    """Tests for the fingerprinted structured profile stored on UserProfile."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='profiled', password='password123')
+        self.user_profile = UserProfile.objects.create(user=self.user, user_cv_text='Python developer', user_preferences_text='Berlin')
+
+    @patch('matcher.services.profile_service.gemini_utils.extract_user_profile', return_value=({'summary': 'Extracted'}, 'success'))
+    def test_profile_is_only_extracted_when_inputs_change(self, mock_extract):
+        from .services.profile_service import get_structured_profile
+        self.assertEqual(get_structured_profile(self.user_profile), {'summary': 'Extracted'})
+        self.user_profile.refresh_from_db()
+        self.assertEqual(get_structured_profile(self.user_profile), {'summary': 'Extracted'})
+        self.assertEqual(mock_extract.call_count, 1)
+
+        self.user_profile.user_preferences_text = 'Munich'
+        self.user_profile.save()
+        get_structured_profile(self.user_profile)
+        self.assertEqual(mock_extract.call_count, 2)
+
+    @patch('matcher.services.profile_service.gemini_utils.extract_user_profile', return_value=({'summary': 'Sim', 'error_during_api_call': 'quota'}, 'fallback'))
+    def test_simulated_fallback_is_not_stored(self, mock_extract):
+        from .services.profile_service import refresh_structured_profile_in_background
+        refresh_structured_profile_in_background(self.user_profile).result()
+        self.user_profile.refresh_from_db()
+        self.assertIsNone(self.user_profile.structured_profile_json)
+
+    @override_settings(AI_RESPONSE_CACHE_ENABLED=False)
+    def test_simulated_profile_is_extracted_again_once_the_model_is_available(self):
+        from . import gemini_utils
+        from .services.profile_service import get_structured_profile
+        with override_settings(USE_AI_SIMULATION=True):
+            simulated = get_structured_profile(self.user_profile)
+        self.user_profile.refresh_from_db()
+        self.assertIsNone(self.user_profile.structured_profile_json)
+
+        fake_model = MagicMock()
+        fake_model.generate_content.return_value = MagicMock(text='{"summary": "Real profile"}', usage_metadata=None)
+        with override_settings(USE_AI_SIMULATION=False), patch.object(gemini_utils, 'model', fake_model):
+            real = get_structured_profile(self.user_profile)
+        self.assertNotEqual(simulated, real)
+        self.assertEqual(real['summary'], 'Real profile')
+        fake_model.generate_content.assert_called_once()
+        self.user_profile.refresh_from_db()
+        self.assertEqual(self.user_profile.structured_profile_json['summary'], 'Real profile')
+
+
+class JobPreRankingTestCase(TestCase):
+    """Tests for the local BM25 pre-ranking stage."""
+
+    profile = {
+        'key_skills': ['Python', 'Django'],
+        'preferences': {'desired_roles': ['Backend Engineer'], 'location_preferences': ['Berlin']},
+    }
+
+    def _job(self, job_id, title, description='', location=None):
+        return {'id': job_id, 'job_title': title, 'description': description, 'industry': 'Software', 'location': location}
+
+    def test_top_k_prefers_relevant_jobs_over_list_position(self):
+        from .services.job_ranking import BM25JobIndex
+        jobs = [self._job(f'filler{i}', 'Sales Manager', 'Selling things.') for i in range(20)]
+        jobs.append(self._job('match', 'Backend Engineer', 'Python and Django services.', 'Berlin'))
+        shortlist = BM25JobIndex().top_k(self.profile, jobs, 3)
+        self.assertEqual(shortlist[0]['id'], 'match')
+        self.assertEqual(len(shortlist), 3)
+
+    def test_index_is_updated_incrementally(self):
+        from .services.job_ranking import BM25JobIndex
+        index = BM25JobIndex()
+        jobs = [self._job('a', 'Backend Engineer'), self._job('b', 'Designer')]
+        self.assertEqual(index.add_jobs(jobs), 2)
+        self.assertEqual(index.add_jobs(jobs), 0)
+        jobs[1] = self._job('b', 'Python Backend Engineer')
+        self.assertEqual(index.add_jobs(jobs), 1)
+        self.assertEqual(len(index), 2)
+        self.assertIn('b', index.score({'python': 1.0}))
+
+
+@override_settings(USE_AI_SIMULATION=True, BACKGROUND_TASKS_EAGER=True)
+class BackgroundMatchSessionTestCase(TestCase):
+    """Tests for the background match session lifecycle."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matcher', password='password123')
+        UserProfile.objects.create(user=self.user, user_cv_text='Python developer', user_preferences_text='Berlin')
+        self.session = MatchSession.objects.create(user=self.user, skills_text='Python developer')
+
+    @patch('matcher.services.match_session_service.get_todays_job_listings')
+    def test_run_match_session_saves_matches_and_marks_done(self, mock_fetch):
+        from .services.match_session_service import run_match_session
+        mock_fetch.return_value = [
+            {'id': 'job1', 'job_title': 'Python Developer', 'company_name': 'TestCorp', 'description': 'Python.'},
+            {'id': 'job2', 'job_title': 'Go Developer', 'company_name': 'OtherCorp', 'description': 'Go.'},
+        ]
+        run_match_session(self.session.id, supabase=None)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, MatchSession.STATUS_DONE)
+        self.assertEqual(self.session.jobs_total, 2)
+        self.assertIsNotNone(self.session.completed_at)
+        self.assertEqual(self.session.matched_jobs.count(), 2)
+
+    @patch('matcher.services.match_session_service.get_todays_job_listings', return_value=[])
+    def test_run_match_session_without_listings_fails_with_reason(self, mock_fetch):
+        from .services.match_session_service import run_match_session, NO_LISTINGS_MESSAGE
+        run_match_session(self.session.id, supabase=None)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, MatchSession.STATUS_FAILED)
+        self.assertEqual(self.session.error_message, NO_LISTINGS_MESSAGE)
+
+    @patch('matcher.views.main_views.enqueue_match_session')
+    def test_start_new_match_session_is_debounced_and_enqueued_without_request_client(self, mock_enqueue):
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.test import RequestFactory
+        from .views.main_views import start_new_match_session
+
+        def submit():
+            request = RequestFactory().post(reverse('matcher:start_new_match_session'))
+            request.user = self.user
+            request.session = SessionStore()
+            request._messages = FallbackStorage(request)
+            return start_new_match_session(request)
+
+        MatchSession.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = submit()
+            second = submit()
+        session = MatchSession.objects.get(user=self.user)
+        self.assertEqual(first.url, second.url)
+        self.assertIn(str(session.id), first.url)
+        mock_enqueue.assert_called_once_with(session)
+
+    @override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_ENABLED=False)
+    @patch('matcher.services.match_session_service.get_todays_job_listings')
+    def test_run_match_session_fails_when_gemini_is_unavailable(self, mock_fetch):
+        from . import gemini_utils
+        from .services.gemini_resilience import GeminiUnavailableError
+        from .services.match_session_service import run_match_session
+        mock_fetch.return_value = [{'id': 'job1', 'job_title': 'Python Developer', 'company_name': 'TestCorp', 'description': 'Python.'}]
+        fake_model = MagicMock()
+        fake_model.generate_content.side_effect = ValueError('upstream error')
+        with patch.object(gemini_utils, 'model', fake_model), \
+             patch('matcher.services.match_session_service.get_structured_profile', return_value={'summary': 'Python developer'}):
+            run_match_session(self.session.id, supabase=None)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, MatchSession.STATUS_FAILED)
+        self.assertEqual(self.session.error_message, GeminiUnavailableError.user_message)
+        self.assertEqual(self.session.matched_jobs.count(), 0)
+
+
+@override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_TASK_TTLS={})
+class StreamingMatchTestCase(TestCase):
+    """Tests for streamed match responses."""
+
+    def test_stream_parser_emits_objects_as_they_complete(self):
+        from .gemini_utils import JsonArrayStreamParser
+        parser = JsonArrayStreamParser()
+        self.assertEqual(parser.feed('```json\n[{"id": "1", "match_reason": "uses [brackets] and \\"quotes\\" {'), [])
+        self.assertEqual(parser.feed('"}, {"id": "2", "nested": {"a": [1]}'), [{'id': '1', 'match_reason': 'uses [brackets] and "quotes" {'}])
+        self.assertEqual(parser.feed('}, {"id": broken}, {"id": "3"}]\n```'), [{'id': '2', 'nested': {'a': [1]}}, {'id': '3'}])
+        self.assertEqual(parser.malformed_count, 1)
+
+    def test_match_jobs_reports_matches_while_streaming(self):
+        from . import gemini_utils
+        jobs = [{'id': 'job1', 'job_title': 'Dev'}, {'id': 'job2', 'job_title': 'Ops'}]
+        seen_before_end = []
+        reported = []
+        chunks = ['[{"id": "job1", "match_score": 70}', ', {"id": "job2", "match_score": 90}]']
+
+        def stream_chunks():
+            for text in chunks:
+                yield MagicMock(text=text)
+                seen_before_end.append(len(reported))
+
+        fake_model = MagicMock()
+        fake_model.generate_content.side_effect = lambda prompt, stream=False: stream_chunks()
+        with patch.object(gemini_utils, 'model', fake_model):
+            results = gemini_utils.match_jobs({'summary': 'x'}, jobs, on_match=reported.append)
+
+        self.assertEqual(seen_before_end[0], 1)
+        self.assertEqual([m['job']['id'] for m in reported], ['job1', 'job2'])
+        self.assertEqual([m['score'] for m in results], [90, 70])
+
+
+class PromptCompactionTestCase(TestCase):
+    """Tests for the token-saving compaction of job listings in the match prompt."""
+
+    def test_description_is_normalized_and_capped(self):
+        from .gemini_utils import _compact_description
+        description = (
+            "We build   data platforms.\n\n\nYou know Python and SQL.\n"
+            "We are an equal opportunity employer. Read our Datenschutz notice at example.com."
+        )
+        self.assertEqual(_compact_description(description, 1000), "We build data platforms. You know Python and SQL.")
+        self.assertEqual(_compact_description("word " * 50, 20), "word word word word…")
+
+    def test_job_payload_uses_effective_description_and_minified_json(self):
+        from .gemini_utils import _prepare_job_data_for_prompt, dumps_compact_json
+        job = {
+            'id': 7, 'job_title': 'Dev', 'description': 'Raw text with noise.',
+            'anomaly_analysis': {'effective_description': 'Clean text.'},
+        }
+        payload = _prepare_job_data_for_prompt([job])
+        self.assertEqual(payload[0]['description'], 'Clean text.')
+        self.assertNotIn('\n', dumps_compact_json(payload))
+        self.assertNotIn('": ', dumps_compact_json(payload))
+
+
+@override_settings(
+    GEMINI_MAX_RETRIES=2,
+    GEMINI_RETRY_BASE_DELAY_SECONDS=0,
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD=3,
+    GEMINI_CIRCUIT_RESET_SECONDS=60,
+    GEMINI_RATE_LIMIT_PER_MINUTE=6000,
+    GEMINI_RATE_LIMIT_BURST=100,
+)
+class GeminiResilienceTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        from .services import gemini_resilience
+        self.resilience = gemini_resilience
+        caches['shared'].clear()
+        gemini_resilience._components.clear()
+
+    def test_retries_retryable_errors_then_succeeds(self):
+        from google.api_core import exceptions as google_exceptions
+        api_call = MagicMock(side_effect=[google_exceptions.ServiceUnavailable('busy'), 'ok'])
+        self.assertEqual(self.resilience.call_gemini(api_call), 'ok')
+        self.assertEqual(api_call.call_count, 2)
+        self.assertFalse(self.resilience.get_circuit_breaker().is_open())
+
+    def test_non_retryable_errors_are_raised_immediately(self):
+        from google.api_core import exceptions as google_exceptions
+        api_call = MagicMock(side_effect=google_exceptions.InvalidArgument('bad prompt'))
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            self.resilience.call_gemini(api_call)
+        self.assertEqual(api_call.call_count, 1)
+
+    def test_circuit_opens_after_repeated_failures_and_fails_fast(self):
+        from google.api_core import exceptions as google_exceptions
+        api_call = MagicMock(side_effect=google_exceptions.ResourceExhausted('quota'))
+        with self.assertRaises(google_exceptions.ResourceExhausted):
+            self.resilience.call_gemini(api_call)
+        self.assertEqual(api_call.call_count, 3)
+        self.assertTrue(self.resilience.get_circuit_breaker().is_open())
+
+        with self.assertRaises(self.resilience.CircuitOpenError):
+            self.resilience.call_gemini(api_call)
+        self.assertEqual(api_call.call_count, 3)
+
+    def test_half_open_circuit_lets_a_single_trial_call_through(self):
+        import time
+        breaker = self.resilience.get_circuit_breaker()
+        breaker._set_state({'failures': 3, 'opened_until': time.time() - 1})
+        self.assertTrue(breaker.before_call())
+        with self.assertRaises(self.resilience.CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+
+        breaker._set_state({'failures': 4, 'opened_until': time.time() - 1})
+        self.assertEqual(self.resilience.call_gemini(MagicMock(return_value='ok')), 'ok')
+        self.assertFalse(breaker.before_call())
+        self.assertFalse(breaker.before_call())
+
+    def test_token_bucket_refuses_when_wait_exceeds_limit(self):
+        bucket = self.resilience.SharedTokenBucket('test', rate_per_second=0.01, capacity=2)
+        self.assertTrue(bucket.acquire(max_wait_seconds=0))
+        self.assertTrue(bucket.acquire(max_wait_seconds=0))
+        self.assertFalse(bucket.acquire(max_wait_seconds=1))
+
+    def test_shared_lock_only_releases_its_own_key(self):
+        from django.core.cache import caches
+        cache = caches['shared']
+        cache.set('test:lock', 'other holder', timeout=60)
+        lock = self.resilience._SharedLock(cache, 'test:lock', timeout=0.05)
+        with self.assertRaises(self.resilience.SharedLockTimeout):
+            with lock:
+                pass
+        self.assertEqual(cache.get('test:lock'), 'other holder')
+
+        cache.delete('test:lock')
+        with self.resilience._SharedLock(cache, 'test:lock'):
+            # Our lease expired and another process took the lock
+            cache.set('test:lock', 'other holder', timeout=60)
+        self.assertEqual(cache.get('test:lock'), 'other holder')
+
+    def test_token_bucket_does_not_update_its_state_without_the_lock(self):
+        from django.core.cache import caches
+        bucket = self.resilience.SharedTokenBucket('test', rate_per_second=100, capacity=2)
+        with patch.object(self.resilience._SharedLock, '__enter__', side_effect=self.resilience.SharedLockTimeout('held')):
+            self.assertFalse(bucket.acquire(max_wait_seconds=0))
+        self.assertIsNone(caches['shared'].get('token_bucket:test'))
+
+    def test_slot_pool_caps_leases_across_callers(self):
+        pool = self.resilience.SharedSlotPool('test', slots=2, lease_seconds=60)
+        # A second pool object stands in for another worker process sharing the cache
+        other_process_pool = self.resilience.SharedSlotPool('test', slots=2, lease_seconds=60)
+        first = pool.acquire(max_wait_seconds=0)
+        second = other_process_pool.acquire(max_wait_seconds=0)
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(pool.acquire(max_wait_seconds=0.05))
+
+        other_process_pool.release(second)
+        self.assertIsNotNone(pool.acquire(max_wait_seconds=0))
+
+    @override_settings(GEMINI_MAX_IN_FLIGHT=1, GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS=0)
+    def test_call_gemini_times_out_without_a_free_in_flight_slot(self):
+        in_flight = self.resilience._get_components()['in_flight']
+        lease = in_flight.acquire(max_wait_seconds=0)
+        api_call = MagicMock(return_value='ok')
+        with self.assertRaises(self.resilience.RateLimitTimeout):
+            self.resilience.call_gemini(api_call)
+        api_call.assert_not_called()
+
+        in_flight.release(lease)
+        self.assertEqual(self.resilience.call_gemini(api_call), 'ok')
+
+    def test_execute_ai_task_raises_when_circuit_is_open(self):
+        from . import gemini_utils
+        with patch.object(gemini_utils, 'model', MagicMock()) as mock_model, \
+             patch.object(self.resilience.SharedCircuitBreaker, 'before_call', side_effect=self.resilience.CircuitOpenError('open')), \
+             override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_ENABLED=False):
+            simulation = MagicMock(return_value='simulated')
+            with self.assertRaises(self.resilience.GeminiUnavailableError):
+                gemini_utils._execute_ai_task('test task', lambda: 'hi', (), MagicMock(), (), simulation, ())
+        mock_model.generate_content.assert_not_called()
+        simulation.assert_not_called()
+
+    def test_execute_ai_task_requests_an_unparseable_response_once_more(self):
+        from . import gemini_utils
+        fake_model = MagicMock()
+        fake_model.generate_content.return_value = MagicMock(text='not json', usage_metadata=None)
+        parser = MagicMock(side_effect=[ValueError('bad'), 'parsed'])
+        with patch.object(gemini_utils, 'model', fake_model), \
+             override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_ENABLED=False):
+            result = gemini_utils._execute_ai_task('test task', lambda: 'hi', (), parser, (), MagicMock(), ())
+        self.assertEqual(result, 'parsed')
+        self.assertEqual(fake_model.generate_content.call_count, 2)
+
+    def test_execute_ai_task_does_not_repeat_failed_api_calls(self):
+        from google.api_core import exceptions as google_exceptions
+        from . import gemini_utils
+        fake_model = MagicMock()
+        fake_model.generate_content.side_effect = google_exceptions.InvalidArgument('bad request')
+        with patch.object(gemini_utils, 'model', fake_model), \
+             override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_ENABLED=False):
+            with self.assertRaises(self.resilience.GeminiUnavailableError):
+                gemini_utils._execute_ai_task('test task', lambda: 'hi', (), MagicMock(), (), MagicMock(), ())
+        self.assertEqual(fake_model.generate_content.call_count, 1)
+
+
+class JsonSalvageTestCase(TestCase):
+    def test_recovers_elements_around_a_malformed_one(self):
+        from .gemini_utils import salvage_json_array
+        text = '```json\n[{"id": "a", "match_score": 80}, {"id": "b", "match_score": }, {"id": "c", "match_score": 70,},]\n```'
+        result = salvage_json_array(text, expected_ids=['a', 'b', 'c'])
+        self.assertEqual([item['id'] for item in result.items], ['a', 'c'])
+        self.assertEqual(result.malformed_count, 1)
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.missing_ids, ['b'])
+
+    def test_recovers_complete_elements_of_a_truncated_array(self):
+        from .gemini_utils import parse_gemini_batch_json_response
+        text = '[{"id": 1, "match_score": 90}, {"id": 2, "match_score": 60}, {"id": 3, "match_rea'
+        self.assertEqual([item['id'] for item in parse_gemini_batch_json_response(text)], [1, 2])
+
+    def test_raises_when_nothing_is_recoverable(self):
+        import json
+        from .gemini_utils import parse_gemini_batch_json_response
+        with self.assertRaises(json.JSONDecodeError):
+            parse_gemini_batch_json_response('[{"id": 1, "match_sc')
+        with self.assertRaises(json.JSONDecodeError):
+            parse_gemini_batch_json_response('Sorry, I cannot help with that.')
+        self.assertEqual(parse_gemini_batch_json_response('[]'), [])
+
+    def test_match_parser_keeps_salvaged_matches(self):
+        from .gemini_utils import _parse_match_jobs_response
+        jobs = [{'id': 'a', 'job_title': 'A'}, {'id': 'b', 'job_title': 'B'}]
+        text = '[{"id": "a", "match_score": 75, "match_reason": "ok"}, {"id": "b", "match_score": 8'
+        matches = _parse_match_jobs_response(text, None, jobs)
+        self.assertEqual([match['job']['id'] for match in matches], ['a'])
+
+
+@override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_ENABLED=False, GEMINI_STREAM_MATCH_RESULTS=False)
+class MatchGapFillTestCase(TestCase):
+    """Tests for re-requesting jobs the model skipped in its match response."""
+
+    def setUp(self):
+        self.jobs = [{'id': f'job{i}', 'job_title': f'Developer {i}'} for i in range(3)]
+
+    def test_skipped_jobs_are_re_requested_on_their_own(self):
+        from . import gemini_utils
+        fake_model = MagicMock()
+        fake_model.generate_content.side_effect = [
+            MagicMock(text='[{"id": "job0", "match_score": 80}, {"id": "job2", "match_score": 60}]'),
+            MagicMock(text='[{"id": "job1", "match_score": 70}]'),
+        ]
+        coverage = gemini_utils.MatchCoverage()
+        with patch.object(gemini_utils, 'model', fake_model):
+            results = gemini_utils.match_jobs({'summary': 'x'}, self.jobs, coverage=coverage)
+
+        self.assertEqual([r['job']['id'] for r in results], ['job0', 'job1', 'job2'])
+        gap_fill_prompt = fake_model.generate_content.call_args_list[1][0][0]
+        self.assertIn('"job1"', gap_fill_prompt)
+        self.assertNotIn('"job0"', gap_fill_prompt)
+        self.assertEqual(coverage.as_dict(), {
+            'jobs_requested': 3, 'first_pass_returned': 2, 'gap_fill_requests': 1,
+            'gap_filled': 1, 'simulated': 0, 'missing': 0
+        })
+
+    @override_settings(GEMINI_MATCH_GAP_FILL_ROUNDS=2)
+    def test_gap_fill_rounds_are_bounded(self):
+        from . import gemini_utils
+        fake_model = MagicMock()
+        fake_model.generate_content.return_value = MagicMock(text='[{"id": "job0", "match_score": 80}]')
+        coverage = gemini_utils.MatchCoverage()
+        with patch.object(gemini_utils, 'model', fake_model):
+            results = gemini_utils.match_jobs({'summary': 'x'}, self.jobs, coverage=coverage)
+
+        self.assertEqual([r['job']['id'] for r in results], ['job0'])
+        self.assertEqual(fake_model.generate_content.call_count, 3)
+        self.assertEqual(coverage.as_dict()['missing'], 2)
+
+    @override_settings(USE_AI_SIMULATION=True)
+    def test_simulated_matches_are_counted_as_simulated(self):
+        from . import gemini_utils
+        coverage = gemini_utils.MatchCoverage()
+        results = gemini_utils.match_jobs({'summary': 'x'}, self.jobs, coverage=coverage)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(coverage.as_dict(), {
+            'jobs_requested': 3, 'first_pass_returned': 0, 'gap_fill_requests': 0,
+            'gap_filled': 0, 'simulated': 3, 'missing': 0
+        })
+
+    @override_settings(GEMINI_MATCH_MAX_JOBS_PER_CHUNK=2, AI_RESPONSE_CACHE_ENABLED=False)
+    def test_a_failed_chunk_is_reported_as_missing_and_the_others_are_kept(self):
+        from . import gemini_utils
+        jobs = self.jobs + [{'id': 'job3', 'job_title': 'Developer 3'}]
+
+        def generate_content(prompt, **kwargs):
+            if '"job2"' in prompt:
+                raise ValueError('400 Request contains an invalid argument')
+            return MagicMock(text='[{"id": "job0", "match_score": 80}, {"id": "job1", "match_score": 70}]')
+
+        fake_model = MagicMock()
+        fake_model.generate_content.side_effect = generate_content
+        coverage = gemini_utils.MatchCoverage()
+        with patch.object(gemini_utils, 'model', fake_model):
+            results = gemini_utils.match_jobs({'summary': 'x'}, jobs, coverage=coverage)
+
+        self.assertEqual([r['job']['id'] for r in results], ['job0', 'job1'])
+        self.assertEqual(coverage.as_dict(), {
+            'jobs_requested': 4, 'first_pass_returned': 2, 'gap_fill_requests': 0,
+            'gap_filled': 0, 'simulated': 0, 'missing': 2
+        })
+
+    def test_duplicate_and_unknown_ids_are_ignored(self):
+        from .gemini_utils import _parse_match_jobs_response
+        text = '[{"id": "job0", "match_score": 80}, {"id": "job0", "match_score": 10}, {"id": "other", "match_score": 50}]'
+        matches = _parse_match_jobs_response(text, None, self.jobs)
+        self.assertEqual([(m['job']['id'], m['score']) for m in matches], [('job0', 80)])
+
+
+class JobVectorStoreTestCase(TestCase):
+    """Tests for the memory-mapped job-vector store used for semantic pre-ranking."""
+
+    profile = {'key_skills': ['Python', 'Django'], 'preferences': {'desired_roles': ['Backend Engineer']}}
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from .services import job_vectors
+        self.job_vectors = job_vectors
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.store = job_vectors.JobVectorStore(self.directory, job_vectors.HashingEmbedder(dimensions=256))
+
+    def _job(self, job_id, title, description=''):
+        return {'id': job_id, 'job_title': title, 'description': description, 'industry': 'Software'}
+
+    def test_only_new_or_changed_jobs_are_embedded(self):
+        jobs = [self._job('a', 'Backend Engineer'), self._job('b', 'Designer')]
+        self.assertEqual(self.store.upsert(jobs), 2)
+        self.assertEqual(self.store.upsert(jobs), 0)
+        jobs[1] = self._job('b', 'Senior Designer')
+        self.assertEqual(self.store.upsert(jobs), 1)
+        self.assertEqual(self.store.remove(['a']), 1)
+        self.assertEqual(self.store.job_ids(), ['b'])
+
+    def test_search_ranks_by_cosine_similarity_and_survives_reload(self):
+        jobs = [self._job(f'filler{i}', 'Sales Manager', 'Selling things to customers.') for i in range(30)]
+        jobs.append(self._job('match', 'Python Backend Engineer', 'Django services.'))
+        self.store.upsert(jobs)
+        query = self.store.embedder.embed_query(self.job_vectors.profile_embedding_text(self.profile))
+        self.assertEqual(self.store.search(query, 3)[0][0], 'match')
+
+        reopened = self.job_vectors.JobVectorStore(self.directory, self.job_vectors.HashingEmbedder(dimensions=256))
+        self.assertEqual(len(reopened), 31)
+        results = reopened.search(query, 2, candidate_ids=['filler1', 'match'])
+        self.assertEqual([job_id for job_id, _ in results], ['match', 'filler1'])
+
+    def test_shortlist_uses_vector_store(self):
+        from .services.job_ranking import shortlist_jobs
+        jobs = [self._job(f'filler{i}', 'Sales Manager', 'Selling things.') for i in range(10)]
+        jobs.append(self._job('match', 'Backend Engineer', 'Python and Django.'))
+        with override_settings(MATCH_PRERANK_METHOD='vectors'), \
+             patch.object(self.job_vectors, 'get_shared_store', return_value=self.store):
+            shortlist = shortlist_jobs(self.profile, jobs, 3)
+        self.assertEqual(len(shortlist), 3)
+        self.assertEqual(shortlist[0]['id'], 'match')
+
+    def test_top_k_only_embeds_jobs_missing_from_the_store(self):
+        jobs = [self._job('a', 'Backend Engineer'), self._job('b', 'Designer')]
+        self.store.upsert(jobs[:1])
+        with patch.object(self.job_vectors, 'get_shared_store', return_value=self.store), \
+             patch.object(self.store, 'upsert', wraps=self.store.upsert) as upsert:
+            self.job_vectors.top_k_jobs(self.profile, jobs, 1)
+            self.job_vectors.top_k_jobs(self.profile, jobs, 1)
+        upsert.assert_called_once_with([jobs[1]])
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class DocumentGenerationTestCase(TestCase):
+    """Tests for background cover letter and custom resume generation."""
+
+    def setUp(self):
+        from .models import DocumentGenerationTask
+        self.DocumentGenerationTask = DocumentGenerationTask
+        self.user = User.objects.create_user(username='writer', password='password123')
+        UserProfile.objects.create(user=self.user, user_cv_text='Python developer with Django experience.')
+        self.job = JobListing.objects.create(id='job1', company_name='TestCorp', job_title='Python Developer', description='Python.')
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_cover_letter', return_value='Dear TestCorp, ...')
+    def test_generation_runs_in_background_and_stores_the_document(self, mock_generate):
+        from .services import document_generation_service
+        with self.captureOnCommitCallbacks(execute=True):
+            task = document_generation_service.request_document_generation(self.user, self.job, self.DocumentGenerationTask.KIND_COVER_LETTER)
+        task.refresh_from_db()
+        self.assertEqual(task.status, self.DocumentGenerationTask.STATUS_DONE)
+        self.assertEqual(CoverLetter.objects.get(saved_job__user=self.user).content, 'Dear TestCorp, ...')
+        mock_generate.assert_called_once()
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_custom_resume')
+    def test_concurrent_requests_attach_to_the_in_flight_task(self, mock_generate):
+        from .services import document_generation_service
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            first = document_generation_service.request_document_generation(self.user, self.job, self.DocumentGenerationTask.KIND_CUSTOM_RESUME)
+            second = document_generation_service.request_document_generation(self.user, self.job, self.DocumentGenerationTask.KIND_CUSTOM_RESUME)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(document_generation_service.is_task_active(second))
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_custom_resume', return_value='(Error generating resume)')
+    def test_failed_generation_is_recorded_and_not_retried_on_page_load(self, mock_generate):
+        import json
+        from django.test import RequestFactory
+        from .views.application_views import document_generation_status, generate_custom_resume_page
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.captureOnCommitCallbacks(execute=True):
+            response = generate_custom_resume_page(request, self.job.id)
+        self.assertContains(response, 'This page updates automatically')
+        task = self.DocumentGenerationTask.objects.get(user=self.user)
+        self.assertEqual(task.status, self.DocumentGenerationTask.STATUS_FAILED)
+
+        status = json.loads(document_generation_status(request, self.job.id, 'custom_resume').content)
+        self.assertEqual(status['status'], 'failed')
+        self.assertFalse(status['in_progress'])
+        response = generate_custom_resume_page(request, self.job.id)
+        self.assertContains(response, '(Error generating resume)')
+        self.assertNotContains(response, 'This page updates automatically')
+        mock_generate.assert_called_once()
+
+    def test_unavailable_gemini_marks_the_task_failed(self):
+        from .services import document_generation_service
+        from .services.gemini_resilience import GeminiUnavailableError
+        with patch('matcher.services.document_generation_service.gemini_utils.generate_cover_letter',
+                   side_effect=GeminiUnavailableError('down')), \
+             self.captureOnCommitCallbacks(execute=True):
+            task = document_generation_service.request_document_generation(self.user, self.job, self.DocumentGenerationTask.KIND_COVER_LETTER)
+        task.refresh_from_db()
+        self.assertEqual(task.status, self.DocumentGenerationTask.STATUS_FAILED)
+        self.assertEqual(task.error_message, GeminiUnavailableError.user_message)
+        self.assertFalse(CoverLetter.objects.exists())
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    DOCUMENT_PREGENERATION_ENABLED=True,
+    DOCUMENT_PREGENERATION_TOP_N=2,
+    DOCUMENT_PREGENERATION_MIN_SCORE=70,
+    DOCUMENT_PREGENERATION_KINDS=['cover_letter'],
+    DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET=100000,
+)
+class DocumentPregenerationTestCase(TestCase):
+    """Tests for speculative cover letter pre-generation after a match session."""
+
+    def setUp(self):
+        from django.core.cache import caches
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='planner', password='password123')
+        UserProfile.objects.create(user=self.user, user_cv_text='Python developer with Django experience.')
+        self.session = MatchSession.objects.create(user=self.user, skills_text='Python', status=MatchSession.STATUS_DONE)
+        for job_id, score in (('top', 95), ('second', 80), ('third', 75), ('low', 40)):
+            job = JobListing.objects.create(id=job_id, company_name='Corp', job_title=f'{job_id} developer', description='Python.')
+            MatchedJob.objects.create(match_session=self.session, job_listing=job, score=score)
+
+    def _letters(self):
+        from .services.document_generation_service import get_document_content
+        return sorted(
+            job.id for job in JobListing.objects.all()
+            if get_document_content(self.user, job, 'cover_letter') is not None
+        )
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_cover_letter', return_value='Dear Corp, ...')
+    def test_generates_cover_letters_for_top_matches_above_threshold(self, mock_generate):
+        from .services import pregeneration_service
+        pregeneration_service.schedule_pregeneration(self.session)
+        self.assertEqual(self._letters(), ['second', 'top'])
+        self.assertGreater(pregeneration_service.get_tokens_spent_today(self.user.id), 0)
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_cover_letter', return_value='Dear Corp, ...')
+    def test_pregenerated_letters_attach_when_the_job_is_opened(self, mock_generate):
+        from .services import document_generation_service, pregeneration_service
+        pregeneration_service.run_pregeneration(self.session.id)
+        self.assertFalse(SavedJob.objects.filter(user=self.user).exists())
+        self.assertFalse(CoverLetter.objects.exists())
+
+        saved_job = SavedJob.objects.create(user=self.user, job_listing_id='top', status='viewed')
+        self.assertTrue(document_generation_service.attach_pregenerated_documents(saved_job))
+        self.assertEqual(CoverLetter.objects.get(saved_job=saved_job).content, 'Dear Corp, ...')
+        self.assertEqual(self._letters(), ['second', 'top'])
+        self.assertFalse(document_generation_service.attach_pregenerated_documents(saved_job))
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_cover_letter', return_value='Dear Corp, ...')
+    def test_stops_when_daily_budget_is_exhausted(self, mock_generate):
+        from .services import pregeneration_service
+        with override_settings(DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET=10):
+            pregeneration_service.run_pregeneration(self.session.id)
+        mock_generate.assert_not_called()
+
+    @override_settings(DOCUMENT_PREGENERATION_DAILY_TOKEN_BUDGET=100)
+    def test_token_reservations_never_exceed_the_budget(self):
+        from .services import pregeneration_service
+        self.assertTrue(pregeneration_service._reserve_tokens(self.user.id, 60))
+        self.assertFalse(pregeneration_service._reserve_tokens(self.user.id, 60))
+        self.assertTrue(pregeneration_service._reserve_tokens(self.user.id, 40))
+        self.assertEqual(pregeneration_service.get_tokens_spent_today(self.user.id), 100)
+
+    @patch('matcher.services.document_generation_service.gemini_utils.generate_cover_letter', return_value='Dear Corp, ...')
+    def test_is_cancelled_by_a_newer_session(self, mock_generate):
+        from .services import pregeneration_service
+        MatchSession.objects.create(user=self.user, skills_text='Python')
+        self.assertEqual(pregeneration_service.run_pregeneration(self.session.id), 0)
+        mock_generate.assert_not_called()
+
+
+@override_settings(USE_AI_SIMULATION=True, AI_SIMULATION_SEED='load-test')
+class SimulationBackendTestCase(TestCase):
+    """Tests for the seeded, latency-injecting simulation backend."""
+
+    jobs = [{'id': f'job{i}', 'job_title': f'Developer {i}', 'company_name': 'Corp'} for i in range(5)]
+
+    def test_seeded_simulation_is_reproducible(self):
+        from . import gemini_utils
+        first = gemini_utils.match_jobs({'summary': 'x'}, self.jobs)
+        second = gemini_utils.match_jobs({'summary': 'x'}, self.jobs)
+        self.assertEqual([(m['job']['id'], m['score']) for m in first], [(m['job']['id'], m['score']) for m in second])
+        with override_settings(AI_SIMULATION_SEED='other-seed'):
+            third = gemini_utils.match_jobs({'summary': 'x'}, self.jobs)
+        self.assertNotEqual([m['score'] for m in first], [m['score'] for m in third])
+
+    def test_latency_follows_configured_percentiles(self):
+        import random
+        from .services import simulation_backend
+        rng = random.Random(1)
+        with override_settings(AI_SIMULATION_LATENCY_P50_MS=1000, AI_SIMULATION_LATENCY_P99_MS=5000):
+            samples = sorted(simulation_backend.sample_latency_seconds(rng) for _ in range(4000))
+        self.assertAlmostEqual(samples[2000], 1.0, delta=0.1)
+        self.assertAlmostEqual(samples[3960], 5.0, delta=1.0)
+
+    @override_settings(AI_SIMULATION_RESPONSE_TOKENS_PER_PROMPT_TOKEN=0.5)
+    def test_response_size_scales_with_prompt(self):
+        from . import gemini_utils
+        job = {'job_title': 'Dev', 'company_name': 'Corp', 'description': 'Python.'}
+        short = gemini_utils.generate_cover_letter('Python', job)
+        long = gemini_utils.generate_cover_letter('Python ' * 2000, job)
+        self.assertGreater(len(long), len(short) + 2000)
+
+    @override_settings(
+        AI_SIMULATION_ERROR_RATE=1.0, AI_SIMULATION_LATENCY_P50_MS=1, AI_SIMULATION_LATENCY_P99_MS=2,
+        GEMINI_MAX_RETRIES=1, GEMINI_RETRY_BASE_DELAY_SECONDS=0, GEMINI_CIRCUIT_FAILURE_THRESHOLD=100
+    )
+    def test_injected_errors_go_through_retries_and_fallback(self):
+        from django.core.cache import caches
+        from . import gemini_utils
+        from .services import gemini_resilience, simulation_backend
+        caches['shared'].clear()
+        gemini_resilience._components.clear()
+        self.addCleanup(gemini_resilience._components.clear)
+        with patch.object(simulation_backend.time, 'sleep'), \
+             patch.object(simulation_backend, 'simulate_call', wraps=simulation_backend.simulate_call) as simulate_call:
+            profile = gemini_utils.extract_user_profile('CV', 'Prefs')
+        self.assertEqual(simulate_call.call_count, 2)
+        self.assertIn('Simulated error', profile['error_during_api_call'])
+
+
+class GeminiStandInTestCase(TestCase):
+    """Tests for the local Gemini stand-in server used by end-to-end benchmarks."""
+
+    def setUp(self):
+        import threading
+        from .services.gemini_standin import GeminiStandInServer
+        self.server = GeminiStandInServer(('127.0.0.1', 0), stream_chunks=3, quiet=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _post(self, connection, method, prompt):
+        import json
+        body = json.dumps({'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]})
+        connection.request('POST', f'/v1beta/models/gemini-1.5-flash-latest:{method}?$alt=json', body=body,
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_match_prompt_round_trip_over_keep_alive_connection(self):
+        import http.client
+        from . import gemini_utils
+        jobs = [{'id': 'job1', 'job_title': 'Developer', 'company_name': 'Corp'},
+                {'id': 'job2', 'job_title': 'Analyst', 'company_name': 'Corp'}]
+        prompt = gemini_utils._generate_match_jobs_prompt(
+            {'summary': 'x'}, gemini_utils.dumps_compact_json(gemini_utils._prepare_job_data_for_prompt(jobs))
+        )
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+        self.addCleanup(connection.close)
+        for _ in range(2):
+            status, payload = self._post(connection, 'generateContent', prompt)
+            self.assertEqual(status, 200)
+        text = payload['candidates'][0]['content']['parts'][0]['text']
+        items = gemini_utils.parse_gemini_batch_json_response(text, expected_ids=['job1', 'job2'])
+        self.assertEqual([item['id'] for item in items], ['job1', 'job2'])
+        self.assertEqual(self.server.request_count, 2)
+
+    def test_streamed_response_is_split_into_chunks(self):
+        import http.client
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+        self.addCleanup(connection.close)
+        status, payload = self._post(connection, 'streamGenerateContent', 'Write a cover letter.')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(payload), 3)
+        text = ''.join(chunk['candidates'][0]['content']['parts'][0]['text'] for chunk in payload)
+        self.assertIn('stand-in', text)
+
+    def test_canned_rules_and_unknown_paths(self):
+        import http.client
+        self.server.canned_rules = [{'match': 'ping', 'response': 'pong'}]
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+        self.addCleanup(connection.close)
+        status, payload = self._post(connection, 'generateContent', 'say ping')
+        self.assertEqual(payload['candidates'][0]['content']['parts'][0]['text'], 'pong')
+        connection.request('POST', '/v1beta/models/x:embedContent', body='{}')
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 404)
+
+
+class SupabaseStandInTestCase(TestCase):
+    """Tests for the local Supabase stand-in, driven through the real supabase client."""
+
+    def setUp(self):
+        from .services.supabase_standin import generate_job_rows, running_standin
+        job_rows, anomaly_rows = generate_job_rows(20)
+        old_job = dict(job_rows[0], id='old-job', created_at='2000-01-01T09:00:00')
+        standin = running_standin(tables={'job_listings': job_rows + [old_job], 'job_anomaly_analysis': anomaly_rows}, quiet=True)
+        self.server = standin.__enter__()
+        self.addCleanup(standin.__exit__, None, None, None)
+        self.job_rows = job_rows
+
+    def test_job_listing_service_queries(self):
+        from supabase import create_client
+        from .services import job_listing_service
+        client = create_client(self.server.url, self.server.anon_key)
+        todays_jobs = job_listing_service.fetch_todays_job_listings_from_supabase(client)
+        self.assertEqual(len(todays_jobs), 20)
+        self.assertNotIn('old-job', [job['id'] for job in todays_jobs])
+        job_ids = [job['id'] for job in self.job_rows[:3]]
+        anomalies = job_listing_service.fetch_anomaly_analysis_for_jobs_from_supabase(client, job_ids)
+        self.assertEqual(sorted(anomalies), sorted(job_ids))
+
+    def test_keyset_pages_project_columns_and_retry_failed_pages(self):
+        from supabase import create_client
+        from .services import job_listing_service
+        client = create_client(self.server.url, self.server.anon_key)
+        pages = list(job_listing_service.iter_job_listing_pages(client, columns=('id', 'job_title'), page_size=6))
+        self.assertEqual([len(page) for page in pages], [6, 6, 6, 3])
+        rows = [row for page in pages for row in page]
+        self.assertEqual(len({row['id'] for row in rows}), 21)
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row['created_at'], row['id'])))
+        self.assertEqual(set(rows[0]), {'id', 'job_title', 'created_at'})
+
+        query = MagicMock()
+        query.execute.side_effect = [ConnectionError('connection reset'), MagicMock(data=[{'id': 'job1'}])]
+        with patch.object(job_listing_service, 'sleep') as mock_sleep:
+            self.assertEqual(job_listing_service._execute_page_with_retry(query, retries=2, backoff_seconds=0.5), [{'id': 'job1'}])
+        mock_sleep.assert_called_once_with(0.5)
+        query.execute.side_effect = ConnectionError('connection reset')
+        with patch.object(job_listing_service, 'sleep'), self.assertRaises(ConnectionError):
+            job_listing_service._execute_page_with_retry(query, retries=2, backoff_seconds=0.5)
+        self.assertEqual(query.execute.call_count, 5)
+
+    def test_auth_middleware_signs_in_anonymously_and_reuses_token(self):
+        import os
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from job_hunting_project.auth_middleware import SupabaseAuthMiddleware
+        env = {'SUPABASE_URL': self.server.url, 'SUPABASE_KEY': self.server.anon_key}
+        with patch.dict(os.environ, env):
+            middleware = SupabaseAuthMiddleware(lambda request: HttpResponse('ok'))
+            first_request = RequestFactory().get('/')
+            response = middleware(first_request)
+            token = response.cookies['supabase-auth-token'].value
+            self.assertTrue(first_request.user.is_authenticated)
+
+            second_request = RequestFactory().get('/')
+            second_request.COOKIES['supabase-auth-token'] = token
+            middleware(second_request)
+        self.assertEqual(second_request.user, first_request.user)
+        self.assertEqual(len(self.server.users), 1)
+
+    def test_invalid_token_is_rejected(self):
+        from .services.supabase_standin import decode_jwt, encode_jwt
+        forged = encode_jwt({'sub': 'someone', 'exp': 9999999999}, 'other-secret')
+        self.assertIsNone(decode_jwt(forged, self.server.jwt_secret))
+        self.assertIsNone(self.server.user_for_token(forged))
+
+
+@override_settings(USE_AI_SIMULATION=False, AI_RESPONSE_CACHE_TASK_TTLS={'user profile extraction': 3600})
+class LLMMetricsTestCase(TestCase):
+    """Tests for the per-task LLM call metrics recorded by _execute_ai_task."""
+
+    def setUp(self):
+        from .services import llm_metrics
+        llm_metrics.reset_metrics()
+
+    def test_success_cache_hit_and_parse_failure_are_recorded(self):
+        from . import gemini_utils
+        from .services import llm_metrics
+        from .services.gemini_resilience import GeminiUnavailableError
+        fake_model = MagicMock()
+        fake_model.generate_content.return_value = MagicMock(text='{"summary": "Profile"}', usage_metadata=None)
+        with patch.object(gemini_utils, 'model', fake_model):
+            gemini_utils.extract_user_profile('CV text', 'Prefs')
+            gemini_utils.extract_user_profile('CV text', 'Prefs')
+            fake_model.generate_content.return_value = MagicMock(text='not json', usage_metadata=None)
+            with self.assertRaises(GeminiUnavailableError):
+                gemini_utils.extract_user_profile('Other CV', 'Prefs')
+
+        task_metrics = llm_metrics.get_metrics()['user profile extraction']
+        self.assertEqual(task_metrics['calls'], {'success': 1, 'cached': 1, 'unavailable': 1})
+        self.assertEqual(task_metrics['fallbacks'], {'parse_error': 1})
+        self.assertEqual(task_metrics['api_calls'], 3)
+        self.assertEqual(task_metrics['latency_count'], 3)
+        self.assertEqual(task_metrics['parse_failures'], 2)
+        self.assertEqual(task_metrics['cache_hits'], 1)
+        self.assertGreater(task_metrics['prompt_tokens'], 0)
+        self.assertEqual(task_metrics['response_chars'], len('{"summary": "Profile"}') + 2 * len('not json'))
+
+    def test_prometheus_rendering_and_endpoint(self):
+        from django.test import RequestFactory
+        from .services import llm_metrics
+        from .views.metrics_views import llm_metrics as llm_metrics_view
+        llm_metrics.record_api_call('cover letter generation', 0.3, 'prompt', 'response', 10, 20)
+        llm_metrics.record_api_call('cover letter generation', 3.0, 'prompt', 'response', 10, 20)
+        llm_metrics.record_call('cover letter generation', llm_metrics.OUTCOME_SUCCESS)
+        text = llm_metrics.render_prometheus()
+        self.assertIn('llm_api_call_duration_seconds_bucket{task="cover letter generation",le="0.5"} 1', text)
+        self.assertIn('llm_api_call_duration_seconds_bucket{task="cover letter generation",le="+Inf"} 2', text)
+        self.assertIn('llm_task_response_tokens_total{task="cover letter generation"} 40', text)
+        self.assertIn('cover letter generation', llm_metrics.format_summary())
+
+        request = RequestFactory().get('/metrics/llm', HTTP_AUTHORIZATION='Bearer secret')
+        with override_settings(METRICS_AUTH_TOKEN='secret'):
+            self.assertEqual(llm_metrics_view(request).status_code, 200)
+            self.assertEqual(llm_metrics_view(RequestFactory().get('/metrics/llm')).status_code, 403)
+
+
+class PerformanceTimingMiddlewareTestCase(TestCase):
+    """Tests for the per-request time breakdown and Server-Timing header."""
+
+    def setUp(self):
+        from .services import request_timing
+        request_timing.reset_view_samples()
+
+    def _view(self, request):
+        from django.shortcuts import render
+        from .services import request_timing
+        list(JobListing.objects.all())
+        with request_timing.measure(request_timing.CATEGORY_SUPABASE):
+            with request_timing.measure(request_timing.CATEGORY_SUPABASE):  # Nested: counted once
+                pass
+        return render(request, 'matcher/login.html', {})
+
+    def test_server_timing_header_and_view_percentiles(self):
+        from django.test import RequestFactory
+        from django.urls import ResolverMatch
+        from job_hunting_project.performance_middleware import PerformanceTimingMiddleware
+        from .services import request_timing
+        middleware = PerformanceTimingMiddleware(self._view)
+        for _ in range(3):
+            request = RequestFactory().get('/login/')
+            request.resolver_match = ResolverMatch(self._view, (), {}, url_name='login')
+            response = middleware(request)
+
+        header = response['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn('template;dur=', header)
+        self.assertIn('desc="Supabase REST (1)"', header)
+        self.assertIn('total;dur=', header)
+        percentiles = request_timing.view_percentiles()['login']
+        self.assertEqual(percentiles['count'], 3)
+        self.assertGreater(percentiles['total']['p50'], 0)
+        self.assertLessEqual(percentiles['db']['p50'], percentiles['total']['p99'])
+
+    def test_middleware_does_not_patch_the_template_backend(self):
+        from django.template.backends.django import Template as DjangoBackendTemplate
+        from job_hunting_project.performance_middleware import PerformanceTimingMiddleware
+        original_render = DjangoBackendTemplate.render
+        PerformanceTimingMiddleware(self._view)
+        PerformanceTimingMiddleware(self._view)
+        self.assertIs(DjangoBackendTemplate.render, original_render)
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_requests_are_logged_with_breakdown(self):
+        from django.test import RequestFactory
+        from job_hunting_project.performance_middleware import PerformanceTimingMiddleware
+        middleware = PerformanceTimingMiddleware(self._view)
+        with patch('builtins.print') as mock_print:
+            middleware(RequestFactory().get('/login/'))
+        logged = " ".join(str(call.args[0]) for call in mock_print.call_args_list)
+        self.assertIn('Slow request GET /login/', logged)
+        self.assertIn('db=', logged)
+
+
+class BenchmarkSuiteTestCase(TestCase):
+    """Tests for the building blocks of `manage.py bench`."""
+
+    def test_percentile_is_nearest_rank(self):
+        from .benchmarks import percentile
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile([7], 0.95), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_import_jobs_csv_and_user_dataset(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from .benchmarks import build_user_dataset, write_jobs_csv
+        from .services.supabase_standin import generate_job_rows
+        job_rows, _ = generate_job_rows(30)
+        with tempfile.TemporaryDirectory() as work_dir, override_settings(JOB_VECTOR_STORE_DIR=os.path.join(work_dir, 'vectors')):
+            csv_path = os.path.join(work_dir, 'jobs.csv')
+            write_jobs_csv(csv_path, job_rows)
+            call_command('import_jobs', csv=csv_path, stdout=StringIO())
+        self.assertEqual(JobListing.objects.count(), 30)
+
+        job_ids = list(JobListing.objects.values_list('id', flat=True))
+        user, latest_session = build_user_dataset(job_ids, sessions=3, matches_per_session=10, saved_jobs=5)
+        self.assertEqual(MatchSession.objects.filter(user=user).count(), 3)
+        self.assertEqual(MatchedJob.objects.filter(match_session=latest_session).count(), 10)
+        self.assertEqual(CoverLetter.objects.filter(saved_job__user=user).count(), 5)
+        self.assertEqual(CustomResume.objects.filter(user=user).count(), 5)
+
+
+class JobSyncTestCase(TestCase):
+    """Tests for the local job_listings mirror and its watermark-based sync."""
+
+    def setUp(self):
+        import tempfile
+        from datetime import timedelta
+        from django.utils import timezone
+        from supabase import create_client
+        from .services.supabase_standin import generate_job_rows, running_standin
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        settings_override = override_settings(JOB_VECTOR_STORE_DIR=work_dir.name, JOB_SYNC_PAGE_SIZE=4, BACKGROUND_TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.now = timezone.now().replace(microsecond=0)
+        self.job_rows, anomaly_rows = generate_job_rows(10, created_at=self.now - timedelta(seconds=30))
+        old_job = dict(self.job_rows[0], id='old-job', created_at=(self.now - timedelta(days=3)).isoformat())
+        standin = running_standin(tables={'job_listings': self.job_rows + [old_job], 'job_anomaly_analysis': anomaly_rows}, quiet=True)
+        self.server = standin.__enter__()
+        self.addCleanup(standin.__exit__, None, None, None)
+        self.client_ = create_client(self.server.url, self.server.anon_key)
+
+    def _sync(self, full=False):
+        from .services.job_sync_service import sync_job_listings
+        return sync_job_listings(self.client_, full=full)
+
+    def test_initial_sync_mirrors_todays_rows_and_sets_watermark(self):
+        from .models import SyncState
+        result = self._sync()
+        self.assertEqual(result['mode'], 'reconcile')
+        self.assertEqual(result['created'], 10)
+        self.assertEqual(result['anomaly_view_models'], 10)
+        self.assertEqual(JobListing.objects.filter(is_active=True).count(), 10)
+        self.assertFalse(JobListing.objects.filter(id='old-job').exists())
+        state = SyncState.objects.get(name='job_listings')
+        self.assertEqual(state.watermark, max(JobListing.objects.values_list('source_created_at', flat=True)))
+
+    def test_incremental_sync_upserts_only_new_and_changed_rows(self):
+        self._sync()
+        self.job_rows[1]['job_title'] = 'Staff Engineer'
+        new_row = dict(self.job_rows[2], id='new-job', created_at=self.now.isoformat())
+        self.server.tables['job_listings'].append(new_row)
+        result = self._sync()
+        self.assertEqual(result['mode'], 'incremental')
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (1, 1, 9))
+        self.assertEqual(JobListing.objects.get(id=self.job_rows[1]['id']).job_title, 'Staff Engineer')
+        self.assertEqual(JobListing.objects.get(id='new-job').source_created_at, self.now)
+
+        # Rows older than watermark minus overlap are not fetched again
+        with override_settings(JOB_SYNC_OVERLAP_SECONDS=0):
+            self.assertEqual(self._sync()['fetched'], 1)
+
+    def test_reconcile_deactivates_rows_deleted_upstream(self):
+        self._sync()
+        deleted_id = self.job_rows[3]['id']
+        self.server.tables['job_listings'].remove(self.job_rows[3])
+        self.assertEqual(self._sync()['deactivated'], 0)
+        result = self._sync(full=True)
+        self.assertEqual(result['deactivated'], 1)
+        self.assertFalse(JobListing.objects.get(id=deleted_id).is_active)
+
+    def test_match_sessions_read_the_mirror_without_network(self):
+        from .services.job_sync_service import get_todays_job_listings
+        self.assertEqual(len(get_todays_job_listings(self.client_)), 10)  # falls back to Supabase before the first sync
+        self._sync()
+        requests_before = self.server.request_count
+        todays_jobs = get_todays_job_listings(self.client_)
+        self.assertEqual(self.server.request_count, requests_before)
+        self.assertEqual(sorted(job['id'] for job in todays_jobs), sorted(row['id'] for row in self.job_rows))
+        self.assertEqual(todays_jobs[0]['industry'], 'Technology')
+
+
+class AnomalyCacheTestCase(TestCase):
+    """Tests for the per-job anomaly analysis cache."""
+
+    def setUp(self):
+        from supabase import create_client
+        from .services import anomaly_cache
+        from .services.supabase_standin import generate_job_rows, running_standin
+        anomaly_cache.clear_local_cache()
+        self.addCleanup(anomaly_cache.clear_local_cache)
+        job_rows, self.anomaly_rows = generate_job_rows(40)
+        self.job_ids = [row['id'] for row in job_rows]
+        standin = running_standin(tables={'job_anomaly_analysis': self.anomaly_rows[:36]}, quiet=True)
+        self.server = standin.__enter__()
+        self.addCleanup(standin.__exit__, None, None, None)
+        self.client_ = create_client(self.server.url, self.server.anon_key)
+
+    def test_batch_lookup_fetches_only_misses_and_caches_negatives(self):
+        from .services import job_listing_service
+        from .services.anomaly_cache import get_anomaly_analysis_for_jobs
+        first = get_anomaly_analysis_for_jobs(self.client_, self.job_ids[:10])
+        self.assertEqual(sorted(first), sorted(self.job_ids[:10]))
+        self.assertEqual(self.server.request_count, 1)
+
+        with patch('matcher.services.anomaly_cache.query_anomaly_analysis_for_jobs',
+                   wraps=job_listing_service.query_anomaly_analysis_for_jobs) as mock_query:
+            result = get_anomaly_analysis_for_jobs(self.client_, self.job_ids)
+        mock_query.assert_called_once_with(self.client_, self.job_ids[10:])
+        self.assertEqual(sorted(result), sorted(self.job_ids[:36]))
+
+        # Everything, including the four jobs without an analysis, is now served from the cache
+        get_anomaly_analysis_for_jobs(self.client_, self.job_ids)
+        self.assertEqual(self.server.request_count, 2)
+
+    def test_rows_are_kept_out_of_the_shared_cache(self):
+        from django.core.cache import caches
+        from .services.anomaly_cache import CACHE_KEY_PREFIX, get_anomaly_analysis_for_jobs
+        get_anomaly_analysis_for_jobs(self.client_, self.job_ids[:3])
+        key = f"{CACHE_KEY_PREFIX}{self.job_ids[0]}"
+        self.assertIsNotNone(caches['anomaly'].get(key))
+        self.assertIsNone(caches['shared'].get(key))
+
+    def test_shared_cache_serves_other_workers_and_errors_are_not_cached(self):
+        from .services import anomaly_cache
+        anomaly_cache.get_anomaly_analysis_for_jobs(self.client_, self.job_ids[:5])
+        anomaly_cache.clear_local_cache()  # as seen from another worker process
+        self.assertEqual(len(anomaly_cache.get_anomaly_analysis_for_jobs(self.client_, self.job_ids[:5])), 5)
+        self.assertEqual(self.server.request_count, 1)
+
+        with patch('matcher.services.anomaly_cache.query_anomaly_analysis_for_jobs', side_effect=ConnectionError('down')):
+            self.assertEqual(anomaly_cache.get_anomaly_analysis_for_jobs(self.client_, self.job_ids[5:8]), {})
+        self.assertEqual(len(anomaly_cache.get_anomaly_analysis_for_jobs(self.client_, self.job_ids[5:8])), 3)
+
+    def test_local_cache_is_bounded_lru_with_ttl(self):
+        from .services.anomaly_cache import LocalTTLCache
+        local_cache = LocalTTLCache(max_entries=2)
+        local_cache.set_many({'a': 1, 'b': 2}, timeout=60)
+        local_cache.get_many(['a'])
+        local_cache.set_many({'c': 3}, timeout=60)
+        self.assertEqual(local_cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+        local_cache.set_many({'d': 4}, timeout=0)
+        self.assertEqual(local_cache.get_many(['d']), {})
+
+
+class AnomalyViewModelTestCase(TestCase):
+    """Tests for the precompiled, locally stored anomaly analysis."""
+
+    def setUp(self):
+        from supabase import create_client
+        from .services import anomaly_cache
+        from .services.supabase_standin import generate_job_rows, running_standin
+        anomaly_cache.clear_local_cache()
+        self.addCleanup(anomaly_cache.clear_local_cache)
+        job_rows, self.anomaly_rows = generate_job_rows(5)
+        self.job_ids = [row['id'] for row in job_rows]
+        standin = running_standin(tables={'job_anomaly_analysis': self.anomaly_rows}, quiet=True)
+        self.server = standin.__enter__()
+        self.addCleanup(standin.__exit__, None, None, None)
+        self.client_ = create_client(self.server.url, self.server.anon_key)
+
+    def test_view_models_are_compiled_once_and_read_without_parsing(self):
+        from .models import AnomalyViewModel
+        from .services import anomaly_cache
+        from .services.anomaly_view_models import get_anomaly_view_models
+        from .utils import parse_anomaly_analysis
+        view_models = get_anomaly_view_models(self.client_, self.job_ids + ['no-analysis'])
+        self.assertEqual(sorted(view_models), sorted(self.job_ids))
+        expected = parse_anomaly_analysis(self.anomaly_rows[0]['analysis_data'])
+        self.assertEqual(view_models[self.job_ids[0]], expected)
+        self.assertEqual(len(expected['top_similar_roles']), 3)
+        self.assertEqual(AnomalyViewModel.objects.count(), 5)
+
+        anomaly_cache.clear_local_cache()
+        with patch('matcher.services.anomaly_view_models.compile_anomaly_analysis') as mock_compile:
+            self.assertEqual(get_anomaly_view_models(self.client_, self.job_ids), view_models)
+        mock_compile.assert_not_called()
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_outdated_schema_or_stale_rows_are_refreshed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import AnomalyViewModel
+        from .services import anomaly_cache
+        from .services.anomaly_view_models import get_anomaly_view_models
+        get_anomaly_view_models(self.client_, self.job_ids)
+        AnomalyViewModel.objects.filter(job_id=self.job_ids[0]).update(schema_version=0, data={'old': True})
+        AnomalyViewModel.objects.filter(job_id=self.job_ids[1]).update(compiled_at=timezone.now() - timedelta(days=30))
+        anomaly_cache.clear_local_cache()
+        with patch('matcher.services.anomaly_view_models.compile_anomaly_analysis', wraps=lambda data: {'recompiled': True}) as mock_compile:
+            view_models = get_anomaly_view_models(self.client_, self.job_ids)
+        # The stale row's source is unchanged, so only the outdated schema is recompiled
+        self.assertEqual(mock_compile.call_count, 1)
+        self.assertEqual(view_models[self.job_ids[0]], {'recompiled': True})
+        self.assertIn('top_anomalies', view_models[self.job_ids[1]])
+        self.assertGreater(AnomalyViewModel.objects.get(job_id=self.job_ids[1]).compiled_at, timezone.now() - timedelta(minutes=1))
+
+
+class SingleFlightTestCase(TestCase):
+    """Tests for the coalescing of identical Supabase queries."""
+
+    @override_settings(SINGLE_FLIGHT_SHARED=False)
+    def test_concurrent_identical_queries_share_one_upstream_call(self):
+        import threading
+        from supabase import create_client
+        from .services import job_listing_service
+        from .services.supabase_standin import generate_job_rows, running_standin
+        job_rows, _ = generate_job_rows(15)
+        with running_standin(tables={'job_listings': job_rows}, latency_ms=300, quiet=True) as server:
+            client = create_client(server.url, server.anon_key)
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(job_listing_service.fetch_todays_job_listings_from_supabase(client)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(server.request_count, 1)
+        self.assertEqual([len(result) for result in results], [15] * 8)
+
+    @override_settings(SINGLE_FLIGHT_SHARED=False)
+    def test_waiters_receive_the_leaders_exception(self):
+        import threading
+        import time
+        from .services.job_listing_service import single_flight
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def failing_query():
+            started.set()
+            release.wait(5)
+            raise ConnectionError('upstream down')
+
+        def call():
+            try:
+                single_flight('failing', failing_query)
+            except ConnectionError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call)
+        follower.start()
+        time.sleep(0.2)  # let the follower start waiting on the leader
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+    @override_settings(
+        SINGLE_FLIGHT_SHARED=True, SINGLE_FLIGHT_WAIT_SECONDS=0.2,
+        SINGLE_FLIGHT_POLL_SECONDS=0.01, SINGLE_FLIGHT_MAX_POLL_SECONDS=0.04
+    )
+    def test_workers_coordinate_through_the_shared_cache(self):
+        import hashlib
+        from django.core.cache import caches
+        from .services import job_listing_service
+        from .services.job_listing_service import single_flight
+        query = MagicMock(return_value={'rows': 3})
+        self.assertEqual(single_flight('shared-query', query, shared=True), {'rows': 3})
+        # Another worker asking within the result TTL gets the handed-over result
+        self.assertEqual(single_flight('shared-query', query, shared=True), {'rows': 3})
+        self.assertEqual(query.call_count, 1)
+
+        # While another worker holds the lock, wait for its result with backoff, then give up and query directly
+        digest = hashlib.sha256('locked-query'.encode('utf-8')).hexdigest()
+        caches['shared'].add(f"single_flight_lock:{digest}", 'other-worker', timeout=60)
+        with patch.object(job_listing_service, 'sleep', wraps=job_listing_service.sleep) as mock_sleep:
+            self.assertEqual(single_flight('locked-query', query, shared=True), {'rows': 3})
+        self.assertEqual(query.call_count, 2)
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(delays[:3], [0.01, 0.02, 0.04])
+        self.assertLessEqual(max(delays), 0.04)
+
+    @override_settings(SINGLE_FLIGHT_SHARED=True)
+    def test_todays_listings_are_not_handed_over_through_the_shared_cache(self):
+        from supabase import create_client
+        from .services import job_listing_service
+        from .services.supabase_standin import generate_job_rows, running_standin
+        job_rows, _ = generate_job_rows(5)
+        with running_standin(tables={'job_listings': job_rows}, quiet=True) as server, \
+             patch.object(job_listing_service, '_shared_single_flight') as shared_single_flight:
+            client = create_client(server.url, server.anon_key)
+            self.assertEqual(len(job_listing_service.fetch_todays_job_listings_from_supabase(client)), 5)
+        shared_single_flight.assert_not_called()
@@ -5,6 +5,7 @@ from matcher.views.main_views import (
     main_page,  
     upload_cv_and_match, 
     start_new_match_session,
+    match_session_status,
     all_matches_page
 )
 from matcher.views.job_views import job_detail_page
@@ -24,9 +25,11 @@ urlpatterns = [
 
     # Actions
     path('match/new/', start_new_match_session, name='start_new_match_session'),
+    path('match/<uuid:match_session_id>/status/', match_session_status, name='match_session_status'),
     path('upload_cv_and_match/', upload_cv_and_match, name='upload_cv_and_match'),
     path('job/<str:job_id>/generate-cover-letter/', views.generate_cover_letter_page, name='generate_cover_letter_page'),
     path('job/<str:job_id>/generate-custom-resume/', views.generate_custom_resume_page, name='generate_custom_resume_page'),
+    path('job/<str:job_id>/generate/<str:kind>/status/', views.document_generation_status, name='document_generation_status'),
     path('my-applications/', views.my_applications_page, name='my_applications_page'),
     path('job/<str:job_id>/update_status/', views.update_job_application_status, name='update_job_application_status'),
     path('profile/', views.profile_page, name='profile_page'),
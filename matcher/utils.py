@@ -1,6 +1,30 @@
 import json
+import hashlib
 import itertools
 
+# Job fields whose content determines a match score
+JOB_CONTENT_HASH_FIELDS = ('job_title', 'company_name', 'description', 'level', 'location', 'industry')
+
+
+def compute_job_content_hash(job):
+    """
+    Returns a stable hash of the job fields sent to the matcher.
+    Accepts a job dict (from Supabase) or a JobListing instance.
+    """
+    if not isinstance(job, dict):
+        job = {field: getattr(job, field, None) for field in JOB_CONTENT_HASH_FIELDS}
+    content = [job.get(field) or '' for field in JOB_CONTENT_HASH_FIELDS]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def compute_structured_profile_fingerprint(structured_profile):
+    """Returns a stable hash of a structured user profile dict."""
+    if not structured_profile:
+        return ''
+    canonical = json.dumps(structured_profile, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
 def parse_and_prepare_insights_for_template(insights_str):
     if not insights_str or insights_str == 'N/A':
         return [] 
@@ -6,6 +6,7 @@ from .job_views import job_detail_page
 from .application_views import (
     generate_cover_letter_page, 
     generate_custom_resume_page,
+    document_generation_status,
     download_custom_resume,
     download_cover_letter,
     my_applications_page,
@@ -23,6 +24,7 @@ __all__ = [
     'job_detail_page',
     'generate_cover_letter_page',
     'generate_custom_resume_page', 
+    'document_generation_status',
     'download_custom_resume',
     'download_cover_letter',
     'my_applications_page',
@@ -5,7 +5,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, FileResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, Http404
 from django.conf import settings
 
 from io import BytesIO
@@ -15,94 +15,61 @@ from reportlab.lib.units import mm
 import json
 import textwrap
 
-from ..models import JobListing, SavedJob, CoverLetter, CustomResume, UserProfile
-from .. import gemini_utils
+from ..models import JobListing, SavedJob, CustomResume, UserProfile, DocumentGenerationTask
+from ..services import document_generation_service
 
 
-@login_required
-def generate_cover_letter_page(request, job_id):
-    job = get_object_or_404(JobListing, id=job_id)
+def _document_page_state(request, job, kind):
+    """
+    Shared GET/POST handling of the cover letter and custom resume pages. Generation runs in
+    the background (see document_generation_service); the page shows a pending state meanwhile.
+    Returns (content, generation_error, generation_pending, has_existing_document, user_cv_text)
+    or an HttpResponse to return as is.
+    """
     user = request.user
     user_profile, _ = UserProfile.objects.get_or_create(user=user)
     user_cv_text = user_profile.user_cv_text or ""
-    cover_letter_content = ""
-    generation_error = False
-    has_existing_cover_letter = False
-
-    job_dict = {
-        'id': job.id,
-        'company_name': job.company_name,
-        'job_title': job.job_title,
-        'description': job.description,
-        'application_url': job.application_url,
-        'location': job.location,
-        'industry': job.industry,
-        'flexibility': job.flexibility,
-        'salary_range': job.salary_range,
-        'level': job.level,
-    }
+    missing_cv_message = f"Please complete your CV in your profile before generating a {'cover letter' if kind == DocumentGenerationTask.KIND_COVER_LETTER else 'custom resume'}."
 
     if request.method == 'POST':
-        if not user_cv_text:
-            cover_letter_content = "Please complete your CV in your profile before generating a cover letter."
-            generation_error = True
-        else:
-            cover_letter_content = gemini_utils.generate_cover_letter(user_cv_text, job_dict)
-            if cover_letter_content.startswith("(Error generating") or \
-               cover_letter_content.startswith("Could not generate") or \
-               cover_letter_content.startswith("Please enter your skills"):
-                generation_error = True
-            else:
-                # First ensure we have a SavedJob for this user and job
-                saved_job, created = SavedJob.objects.get_or_create(
-                    user=user,
-                    job_listing=job,
-                    defaults={'status': 'viewed'}
-                )
-                
-                # Then create or update the cover letter
-                cover_letter, cl_created = CoverLetter.objects.update_or_create(
-                    saved_job=saved_job,
-                    defaults={"content": cover_letter_content}
-                )
-                has_existing_cover_letter = True
-    else:
-        # GET: prefer existing cover letter
-        try:
-            saved_job = SavedJob.objects.get(user=user, job_listing=job)
-            cover_letter_obj = CoverLetter.objects.get(saved_job=saved_job)
-            cover_letter_content = cover_letter_obj.content
-            has_existing_cover_letter = True
-        except (SavedJob.DoesNotExist, CoverLetter.DoesNotExist):
-            if not user_cv_text:
-                cover_letter_content = "Please complete your CV in your profile before generating a cover letter."
-                generation_error = True
-            else:
-                # If no existing letter, generate one on GET request
-                cover_letter_content = gemini_utils.generate_cover_letter(user_cv_text, job_dict)
-                if not (cover_letter_content.startswith("(Error generating") or \
-                   cover_letter_content.startswith("Could not generate") or \
-                   cover_letter_content.startswith("Please enter your skills")):
-                    # Save the newly generated letter
-                    # First ensure we have a SavedJob
-                    saved_job, created = SavedJob.objects.get_or_create(
-                        user=user,
-                        job_listing=job,
-                        defaults={'status': 'viewed'}
-                    )
-                    
-                    # Then create the cover letter
-                    CoverLetter.objects.create(saved_job=saved_job, content=cover_letter_content)
-                    has_existing_cover_letter = True # It exists now
-                else:
-                    generation_error = True
+        # Regenerate: start (or attach to) a background generation and show its progress
+        if user_cv_text:
+            document_generation_service.request_document_generation(user, job, kind)
+            return redirect(request.path)
+        return missing_cv_message, True, False, False, user_cv_text
+
+    task = document_generation_service.get_task(user, job, kind)
+    existing_content = document_generation_service.get_document_content(user, job, kind)
+    if document_generation_service.is_task_active(task):
+        return existing_content or "", False, True, existing_content is not None, user_cv_text
+    if existing_content is not None:
+        return existing_content, False, False, True, user_cv_text
+    if task is not None and task.status == DocumentGenerationTask.STATUS_FAILED:
+        # Do not retry on every page load; the user can regenerate explicitly
+        return task.error_message or document_generation_service.GENERATION_FAILED_MESSAGE, True, False, False, user_cv_text
+    if not user_cv_text:
+        return missing_cv_message, True, False, False, user_cv_text
+
+    document_generation_service.request_document_generation(user, job, kind)
+    return "", False, True, False, user_cv_text
+
+
+@login_required
+def generate_cover_letter_page(request, job_id):
+    job = get_object_or_404(JobListing, id=job_id)
+    state = _document_page_state(request, job, DocumentGenerationTask.KIND_COVER_LETTER)
+    if isinstance(state, HttpResponse):
+        return state
+    cover_letter_content, generation_error, generation_pending, has_existing_cover_letter, user_cv_text = state
 
     context = {
         'job': job,
         'cover_letter_content': cover_letter_content,
         'generation_error': generation_error,
+        'generation_pending': generation_pending,
         'has_existing_cover_letter': has_existing_cover_letter,
         'user_cv_text': user_cv_text, # Pass CV text for display
+        'kind': DocumentGenerationTask.KIND_COVER_LETTER,
     }
     return render(request, 'matcher/cover_letter_page.html', context)
 
@@ -110,82 +77,39 @@ def generate_cover_letter_page(request, job_id):
 @login_required
 def generate_custom_resume_page(request, job_id):
     job = get_object_or_404(JobListing, id=job_id)
-    user = request.user
-    user_profile, _ = UserProfile.objects.get_or_create(user=user)
-    user_cv_text = user_profile.user_cv_text or ""
-    custom_resume_content = ""
-    generation_error = False
-    has_existing_resume = False # Initialize flag
-
-    job_dict = {
-        'id': job.id,
-        'company_name': job.company_name,
-        'job_title': job.job_title,
-        'description': job.description,
-        'application_url': job.application_url,
-        'location': job.location,
-        'industry': job.industry,
-        'flexibility': job.flexibility,
-        'salary_range': job.salary_range,
-        'level': job.level,
-    }
-
-    if request.method == 'POST':
-        if not user_cv_text:
-            custom_resume_content = "Please complete your CV in your profile before generating a custom resume."
-            generation_error = True
-        else:
-            custom_resume_content = gemini_utils.generate_custom_resume(user_cv_text, job_dict)
-            if custom_resume_content.startswith("(Error generating"):
-                generation_error = True
-            else:
-                SavedJob.objects.get_or_create(
-                    job_listing=job,
-                    user=user,
-                    defaults={"status": "viewed"}
-                )
-
-                # Save the generated resume
-                CustomResume.objects.update_or_create(
-                    user=user,
-                    job_listing=job,
-                    defaults={'content': custom_resume_content}
-                )
-                has_existing_resume = True # It exists now
-    else:
-        # GET request: check for existing custom resume
-        try:
-            existing_resume = CustomResume.objects.get(user=user, job_listing=job)
-            custom_resume_content = existing_resume.content
-            has_existing_resume = True # It exists
-        except CustomResume.DoesNotExist:
-            # No existing resume, generate and save
-            if not user_cv_text:
-                custom_resume_content = "Please complete your CV in your profile before generating a custom resume."
-                generation_error = True
-            else:
-                custom_resume_content = gemini_utils.generate_custom_resume(user_cv_text, job_dict)
-                if not custom_resume_content.startswith("(Error generating"):
-                    # Save the newly generated resume
-                    CustomResume.objects.create(
-                        user=user,
-                        job_listing=job,
-                        content=custom_resume_content
-                    )
-                    has_existing_resume = True
-                else:
-                    generation_error = True
+    state = _document_page_state(request, job, DocumentGenerationTask.KIND_CUSTOM_RESUME)
+    if isinstance(state, HttpResponse):
+        return state
+    custom_resume_content, generation_error, generation_pending, has_existing_resume, user_cv_text = state
 
     context = {
         'job': job,
         'custom_resume_content': custom_resume_content,
         'generation_error': generation_error,
+        'generation_pending': generation_pending,
         'user_cv_text': user_cv_text, # Pass CV text for display
         'has_existing_resume': has_existing_resume, # Pass flag to template
+        'kind': DocumentGenerationTask.KIND_CUSTOM_RESUME,
     }
     return render(request, 'matcher/custom_resume_page.html', context)
 
 
+@login_required
+def document_generation_status(request, job_id, kind):
+    """Lightweight JSON status endpoint polled while a cover letter or custom resume is generated."""
+    if kind not in dict(DocumentGenerationTask.KIND_CHOICES):
+        return JsonResponse({'error': 'Unknown document kind.'}, status=404)
+    job = get_object_or_404(JobListing, id=job_id)
+    task = document_generation_service.get_task(request.user, job, kind)
+    if task is None:
+        return JsonResponse({'status': None, 'in_progress': False, 'error_message': None})
+    return JsonResponse({
+        'status': task.status,
+        'in_progress': document_generation_service.is_task_active(task),
+        'error_message': task.error_message,
+    })
+
+
 @login_required
 def download_custom_resume(request, job_id):
     job = get_object_or_404(JobListing, id=job_id)
@@ -229,11 +153,10 @@ def download_cover_letter(request, job_id):
     job = get_object_or_404(JobListing, id=job_id)
     user = request.user
     
-    # CoverLetter is linked via SavedJob
-    saved_job = get_object_or_404(SavedJob, job_listing=job, user=user)
-    cover_letter = get_object_or_404(CoverLetter, saved_job=saved_job)
-    
-    cover_letter_content = cover_letter.content
+    # Stored on the SavedJob's CoverLetter, or still pending attachment if it was pre-generated
+    cover_letter_content = document_generation_service.get_document_content(user, job, DocumentGenerationTask.KIND_COVER_LETTER)
+    if cover_letter_content is None:
+        raise Http404("No cover letter for this job.")
 
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
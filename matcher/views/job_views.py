@@ -8,8 +8,9 @@ from django.conf import settings
 from uuid import UUID
 
 from ..models import JobListing, MatchSession, MatchedJob, SavedJob, UserProfile
-from ..utils import parse_and_prepare_insights_for_template, parse_anomaly_analysis, parse_tips_string
-from ..services.job_listing_service import fetch_anomaly_analysis_for_jobs_from_supabase
+from ..utils import parse_and_prepare_insights_for_template, parse_tips_string
+from ..services import document_generation_service
+from ..services.anomaly_view_models import get_anomaly_view_models
 
 
 def job_detail_page(request, job_id, match_session_id=None):
@@ -36,6 +37,10 @@ def job_detail_page(request, job_id, match_session_id=None):
             defaults={'status': 'viewed'}
         )
         
+        if created:
+            # A cover letter may have been pre-generated before the user opened the job
+            document_generation_service.attach_pregenerated_documents(saved_job)
+
         # If the job was already saved and its status was 'not_applied', update it to 'viewed'.
         if not created and saved_job.status == 'not_applied':
             saved_job.status = 'viewed'
@@ -64,13 +69,8 @@ def job_detail_page(request, job_id, match_session_id=None):
     # Parse tips for display
     parsed_tips_for_match = parse_tips_string(tips_for_match) if tips_for_match else []
     
-    # Fetch and parse anomaly data - available to all users
-    job_anomalies = []
-    anomaly_data_map = fetch_anomaly_analysis_for_jobs_from_supabase(request.supabase, [job.id])
-    analysis_row = anomaly_data_map.get(str(job.id))
-    if analysis_row and 'analysis_data' in analysis_row:
-        analysis_data = analysis_row['analysis_data']
-        job_anomalies = parse_anomaly_analysis(analysis_data)
+    # Precompiled anomaly data - available to all users
+    job_anomalies = get_anomaly_view_models(request.supabase, [job.id]).get(str(job.id), [])
 
     if request.method == 'POST':
         if not user.is_authenticated:
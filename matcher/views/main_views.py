@@ -13,9 +13,9 @@ from django.conf import settings
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.core.cache import cache
+from django.http import JsonResponse
 
-from datetime import date
+from datetime import date, timedelta
 from uuid import UUID
 import json
 
@@ -25,12 +25,9 @@ from ..models import (
     JobListing, MatchSession, MatchedJob, SavedJob, 
     UserProfile
 )
-from .. import gemini_utils
-from ..utils import parse_and_prepare_insights_for_template, parse_anomaly_analysis, parse_tips_string
-from ..services.job_listing_service import (
-    fetch_todays_job_listings_from_supabase,
-    fetch_anomaly_analysis_for_jobs_from_supabase
-)
+from ..utils import parse_and_prepare_insights_for_template, parse_tips_string
+from ..services.anomaly_view_models import get_anomaly_view_models
+from ..services.match_session_service import enqueue_match_session
 from .auth_views import get_current_user_info
 
 
@@ -119,60 +116,63 @@ def main_page(request):
 @require_POST
 def start_new_match_session(request):
     """
-    Creates a new match session for the logged-in user.
-    This view handles the core job matching logic.
-    Implements 30-second debounce to prevent duplicate requests.
+    Queues a new match session for the logged-in user and redirects to it right away.
+    The matching itself runs on the background executor (see match_session_service);
+    the session page polls match_session_status until it is done.
+    Only one session per user may be in progress at a time.
     """
-    user_profile = get_object_or_404(UserProfile, user=request.user)
-
-    if not user_profile.user_cv_text:
-        messages.info(request, "Please complete your profile with a CV before starting a match.")
-        return redirect('matcher:profile_page')
-
-    # Debounce logic: only allow one request within 30 seconds
-    cache_key = f"matching_in_progress_{request.user.id}"
-    existing_session_id = cache.get(cache_key)
-    if existing_session_id:
-        # Check if the session still exists (if it has been processed, allow new session)
-        try:
-            session_obj = MatchSession.objects.get(id=existing_session_id, user=request.user)
-            # Redirect directly to the session
-            messages.info(request, "A matching request is already in progress. Please do not submit again.")
-            return redirect(f"{reverse('matcher:main_page')}?session_id={session_obj.id}&in_progress=1")
-        except MatchSession.DoesNotExist:
-            # session has been processed, allow new session
-            pass
-    # Set debounce flag, valid for 30 seconds
-    # First create session object, then clean up if there's an exception
-    # Use the CV and preferences stored in the user's profile
-    user_cv_text = user_profile.user_cv_text
-    user_preferences_text = user_profile.user_preferences_text
-    structured_profile_dict = gemini_utils.extract_user_profile(user_cv_text, user_preferences_text)
-    job_listings_for_api = fetch_todays_job_listings_from_supabase(request.supabase)
-    if not job_listings_for_api:
-        messages.warning(request, "There are no new job listings to match against today. Please try again later.")
-        return redirect('matcher:main_page')
-    no_match_reason = None
-    job_matches_from_api = gemini_utils.match_jobs(
-        structured_profile_dict, 
-        job_listings_for_api,
-        max_jobs_to_process=36  # Keeping this low for testing
-    )
     with transaction.atomic():
+        # Locking the profile row serialises concurrent submissions of the same user,
+        # so the in-progress check below cannot be passed by two requests at once
+        user_profile = get_object_or_404(UserProfile.objects.select_for_update(), user=request.user)
+
+        if not user_profile.user_cv_text:
+            messages.info(request, "Please complete your profile with a CV before starting a match.")
+            return redirect('matcher:profile_page')
+
+        # Debounce logic: do not start a second session while one is still in progress
+        stale_before = timezone.now() - timedelta(seconds=settings.MATCH_SESSION_STALE_AFTER_SECONDS)
+        in_progress_session = MatchSession.objects.filter(
+            user=request.user,
+            status__in=MatchSession.IN_PROGRESS_STATUSES,
+            matched_at__gte=stale_before
+        ).order_by('-matched_at').first()
+        if in_progress_session:
+            messages.info(request, "A matching request is already in progress. Please do not submit again.")
+            return redirect(f"{reverse('matcher:main_page')}?session_id={in_progress_session.id}")
+
+        # Use the CV and preferences stored in the user's profile
         new_match_session = MatchSession.objects.create(
             user=request.user,
-            skills_text=user_cv_text,
-            user_preferences_text=user_preferences_text,
-            structured_user_profile_json=structured_profile_dict
+            skills_text=user_profile.user_cv_text,
+            user_preferences_text=user_profile.user_preferences_text,
+            status=MatchSession.STATUS_QUEUED,
+            progress_message="Waiting for a free matcher..."
         )
-        _save_job_matches_to_db(request, job_matches_from_api, new_match_session)
-        # Set debounce cache, valid for 30 seconds
-        cache.set(cache_key, str(new_match_session.id), timeout=30)
-    if no_match_reason:
-        messages.warning(request, no_match_reason)
+        # Start the background work only once the session row is committed
+        transaction.on_commit(lambda: enqueue_match_session(new_match_session))
     return redirect(f"{reverse('matcher:main_page')}?session_id={new_match_session.id}")
 
 
+@login_required
+def match_session_status(request, match_session_id):
+    """Lightweight JSON status/progress endpoint polled while a session is being matched."""
+    match_session = get_object_or_404(
+        MatchSession.objects.only('id', 'status', 'progress_message', 'jobs_total', 'error_message', 'coverage_stats'),
+        id=match_session_id,
+        user=request.user
+    )
+    return JsonResponse({
+        'status': match_session.status,
+        'in_progress': match_session.is_in_progress,
+        'progress_message': match_session.progress_message,
+        'jobs_total': match_session.jobs_total,
+        'matched_count': MatchedJob.objects.filter(match_session_id=match_session.id).count(),
+        'error_message': match_session.error_message,
+        'coverage': match_session.coverage_stats,
+    })
+
+
 def _handle_oauth_callback_on_main_page(request):
     """Handle OAuth callback on main page"""
     oauth_code = request.GET.get('code')
@@ -331,49 +331,6 @@ def _handle_oauth_code_exchange(request, oauth_code):
         return redirect(reverse('matcher:main_page'))
 
 
-def _save_job_matches_to_db(request, job_matches_from_api, new_match_session):
-    """Save job matches to database"""
-    with transaction.atomic():
-        for match_item in job_matches_from_api:
-            job_data_from_api = match_item['job']
-
-            if not job_data_from_api or 'id' not in job_data_from_api:
-                print(f"Skipping match item due to missing job data or ID: {match_item}")
-                continue
-
-            if 'anomaly_analysis' in job_data_from_api:
-                if not hasattr(request, '_temp_anomaly_data'):
-                    request._temp_anomaly_data = {}
-                request._temp_anomaly_data[job_data_from_api['id']] = job_data_from_api['anomaly_analysis']
-
-            job_listing_obj, created = JobListing.objects.update_or_create(
-                id=job_data_from_api['id'],
-                defaults={
-                    'company_name': job_data_from_api.get('company_name', 'N/A'),
-                    'job_title': job_data_from_api.get('job_title', 'N/A'),
-                    'description': job_data_from_api.get('description'),
-                    'translated_description': job_data_from_api.get('translated_description'),
-                    'application_url': job_data_from_api.get('application_url'),
-                    'location': job_data_from_api.get('location'),
-                    'industry': job_data_from_api.get('industry', 'Unknown'),
-                    'flexibility': job_data_from_api.get('flexibility'),
-                    'salary_range': job_data_from_api.get('salary_range'),
-                    'level': job_data_from_api.get('level'),
-                }
-            )
-            if created:
-                print(f"Created local JobListing stub for ID: {job_listing_obj.id} from Supabase data.")
-
-            MatchedJob.objects.create(
-                match_session=new_match_session,
-                job_listing=job_listing_obj,
-                score=match_item['score'], 
-                reason=match_item['reason'],
-                insights=match_item.get('insights'), 
-                tips=match_item.get('tips')    
-            )
-
-
 def _handle_session_view_get(request, current_match_session_id_str, user, user_profile, saved_job_map):
     """Handle GET request to view a specific match session"""
     if not user.is_authenticated:
@@ -405,6 +362,8 @@ def _handle_session_view_get(request, current_match_session_id_str, user, user_p
             print(f"--- [GET] UserProfile updated from MatchSession. New CV: '{cv_preview[:70]}' ---")
         
         processed_job_matches, no_match_reason = _process_matched_jobs_for_session(request, selected_session_object, saved_job_map)
+        if selected_session_object.status == MatchSession.STATUS_FAILED and selected_session_object.error_message:
+            no_match_reason = selected_session_object.error_message
         
         # Fetch all job listings (this might be redundant if only showing matched jobs)
         all_jobs_annotated = []
@@ -432,6 +391,7 @@ def _handle_session_view_get(request, current_match_session_id_str, user, user_p
             'match_history': match_history,
             'today_date_str': date.today().isoformat(),
             'no_match_reason': no_match_reason,
+            'session_in_progress': selected_session_object.is_in_progress,
             'user': request.user,
         }
         return render(request, 'matcher/main_page.html', context)
@@ -459,20 +419,15 @@ def _process_matched_jobs_for_session(request, current_match_session, saved_job_
 
     job_ids = [mj.job_listing.id for mj in matched_jobs_query]
     
-    # Fetch anomaly analysis for all matched jobs in one go
-    anomaly_data_map = fetch_anomaly_analysis_for_jobs_from_supabase(request.supabase, job_ids)
+    # Precompiled anomaly analysis for all matched jobs in one go
+    anomaly_view_models = get_anomaly_view_models(request.supabase, job_ids)
 
     for job_match in matched_jobs_query:
         job = job_match.job_listing
         parsed_insights = parse_and_prepare_insights_for_template(job_match.insights)
         
-        # Parse anomaly data if available
-        job_anomalies = []
-        analysis_row = anomaly_data_map.get(str(job.id))
-        if analysis_row and 'analysis_data' in analysis_row:
-            analysis_data = analysis_row['analysis_data']
-            job_anomalies = parse_anomaly_analysis(analysis_data)
-            
+        job_anomalies = anomaly_view_models.get(str(job.id), [])
+
         # Parse tips into a list
         parsed_tips = parse_tips_string(job_match.tips) if job_match.tips else []
         
@@ -0,0 +1,33 @@
+"""
+运维指标视图
+Prometheus text exposition of the in-process LLM call metrics (see services/llm_metrics.py)
+"""
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+
+from ..services import llm_metrics as llm_metrics_registry
+from ..services import request_timing
+
+
+def _metrics_access_allowed(request):
+    token = settings.METRICS_AUTH_TOKEN
+    if token:
+        return request.headers.get('Authorization') == f"Bearer {token}"
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or bool(user and user.is_staff)
+
+
+def llm_metrics(request):
+    """LLM metrics of this worker process. Add ?format=json for the raw registry."""
+    if not _metrics_access_allowed(request):
+        return HttpResponseForbidden("Metrics require METRICS_AUTH_TOKEN (or a staff user / DEBUG when it is unset).")
+    if request.GET.get('format') == 'json':
+        return JsonResponse(llm_metrics_registry.get_metrics())
+    return HttpResponse(llm_metrics_registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def request_timings(request):
+    """Rolling per-view percentiles (ms) of the request time breakdown of this worker process."""
+    if not _metrics_access_allowed(request):
+        return HttpResponseForbidden("Metrics require METRICS_AUTH_TOKEN (or a staff user / DEBUG when it is unset).")
+    return JsonResponse({'window': settings.REQUEST_TIMING_WINDOW, 'views': request_timing.view_percentiles()})
@@ -10,6 +10,7 @@ import fitz  # PyMuPDF
 
 from ..models import UserProfile, SavedJob, MatchedJob, MatchSession
 from ..utils import parse_tips_string
+from ..services.profile_service import refresh_structured_profile_in_background
 
 
 @login_required
@@ -53,6 +54,9 @@ def profile_page(request):
             messages.success(request, 'Your email has been updated.')
 
         user_profile.save()
+        if form_type in ('cv_form', 'preferences_form'):
+            # Re-extract the structured profile now, so the next match session does not wait for it
+            refresh_structured_profile_in_background(user_profile)
         return redirect('matcher:profile_page')
 
     # Fetch work experiences from Supabase for the current user